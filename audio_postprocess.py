@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Audio Post-Processing for Read Aloud TTS
+Vectorized NumPy operations on raw 16-bit PCM: silence trimming, loudness
+normalization and resampling of whole WAV files. The server processes each
+rendered segment whole (/synthesize and /stream alike); StreamProcessor is a
+chunk-at-a-time variant for PCM that arrives incrementally, measured by
+benchmark.py but not used by the server, whose engines return whole files
+"""
+
+import io
+import wave
+
+import numpy as np
+
+# Analysis window for silence detection
+WINDOW_MS = 10
+
+DEFAULT_OPTIONS = {
+    'trim': False,           # Trim leading/trailing silence
+    'trim_threshold_db': -45,
+    'trim_keep_ms': 40,      # Silence kept at each end so words aren't clipped
+    'loudness_db': None,     # Target RMS level in dBFS, e.g. -20
+    'peak_db': -1.0,         # Gain is limited so peaks stay below this
+    'sample_rate': None,     # Output rate, e.g. 24000 or 48000
+}
+
+# Accepted range of each numeric option (None is allowed where the default is None)
+OPTION_RANGES = {
+    'trim_threshold_db': (-120, 0),
+    'trim_keep_ms': (0, 2000),
+    'loudness_db': (-70, 0),
+    'peak_db': (-60, 0),
+    'sample_rate': (8000, 192000),
+}
+
+def parse_options(options):
+    """Merge request options over the defaults, rejecting unknown keys and bad values"""
+    if options is not None and not isinstance(options, dict):
+        raise ValueError('Post-processing options must be an object')
+    opts = dict(DEFAULT_OPTIONS)
+    for key, value in (options or {}).items():
+        if key not in DEFAULT_OPTIONS:
+            raise ValueError(f'Unknown post-processing option: {key}')
+        if key == 'trim':
+            if not isinstance(value, bool):
+                raise ValueError('Post-processing option trim must be true or false')
+        elif value is not None or DEFAULT_OPTIONS[key] is not None:
+            low, high = OPTION_RANGES[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                    or not low <= value <= high:
+                raise ValueError(f'Post-processing option {key} must be a number '
+                                 f'from {low} to {high}')
+        opts[key] = value
+    return opts
+
+# ============================================================================
+# WAV I/O
+# ============================================================================
+
+def read_wav(data):
+    """Decode WAV bytes to (int16 samples shaped [frames, channels], sample_rate)"""
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError('Only 16-bit PCM WAV is supported')
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    samples = np.frombuffer(frames, dtype='<i2').reshape(-1, channels)
+    return samples, rate
+
+def write_wav(samples, rate):
+    """Encode int16 samples shaped [frames, channels] as WAV bytes"""
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.ascontiguousarray(samples, dtype='<i2').tobytes())
+    return out.getvalue()
+
+# ============================================================================
+# OPERATIONS
+# ============================================================================
+
+def to_float(samples):
+    return samples.astype(np.float32) * (1.0 / 32768.0)
+
+def to_int16(samples):
+    return np.clip(np.rint(samples * 32768.0), -32768, 32767).astype(np.int16)
+
+def window_levels_db(samples, rate):
+    """RMS level in dBFS of each WINDOW_MS window (all channels mixed)"""
+    window = max(1, rate * WINDOW_MS // 1000)
+    count = len(samples) // window
+    if count == 0:
+        return np.full(1, -np.inf if not len(samples) else _rms_db(samples)), window
+    mono = samples[:count * window].mean(axis=1) if samples.ndim == 2 else samples[:count * window]
+    power = np.square(mono.reshape(count, window)).mean(axis=1)
+    with np.errstate(divide='ignore'):
+        return 10.0 * np.log10(power), window
+
+def _rms_db(samples):
+    power = float(np.square(samples).mean())
+    return 10.0 * np.log10(power) if power > 0 else -np.inf
+
+def trim_silence(samples, rate, threshold_db=-45, keep_ms=40):
+    """Cut leading and trailing audio quieter than threshold_db (float samples)"""
+    levels, window = window_levels_db(samples, rate)
+    loud = np.flatnonzero(levels > threshold_db)
+    if not len(loud):
+        return samples[:0]
+    keep = rate * keep_ms // 1000
+    start = max(0, loud[0] * window - keep)
+    end = min(len(samples), (loud[-1] + 1) * window + keep)
+    return samples[start:end]
+
+def loudness_gain(samples, target_db, peak_db=-1.0):
+    """Linear gain that brings the RMS level to target_db without clipping peaks"""
+    level = _rms_db(samples)
+    if not np.isfinite(level):
+        return 1.0
+    gain = 10.0 ** ((target_db - level) / 20.0)
+    peak = float(np.abs(samples).max())
+    if peak > 0:
+        gain = min(gain, 10.0 ** (peak_db / 20.0) / peak)
+    return gain
+
+def resample(samples, src_rate, dst_rate):
+    """Linear-interpolation resampling of float samples shaped [frames, channels]"""
+    if src_rate == dst_rate or not len(samples):
+        return samples
+    count = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(count) * (src_rate / dst_rate)
+    return _interpolate(samples, positions)
+
+def _interpolate(samples, positions):
+    """Sample `samples` at fractional frame positions"""
+    index = np.minimum(positions.astype(np.int64), len(samples) - 1)
+    following = np.minimum(index + 1, len(samples) - 1)
+    fraction = (positions - index).astype(np.float32)[:, None]
+    return samples[index] * (1.0 - fraction) + samples[following] * fraction
+
+def process_wav(data, options):
+    """Apply the enabled operations to a whole WAV file, returning WAV bytes"""
+    opts = parse_options(options)
+    samples, rate = read_wav(data)
+    audio = to_float(samples)
+    if opts['trim']:
+        audio = trim_silence(audio, rate, opts['trim_threshold_db'], opts['trim_keep_ms'])
+    if opts['loudness_db'] is not None and len(audio):
+        audio = audio * loudness_gain(audio, opts['loudness_db'], opts['peak_db'])
+    out_rate = int(opts['sample_rate'] or rate)
+    audio = resample(audio, rate, out_rate)
+    return write_wav(to_int16(audio), out_rate)
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+
+class StreamProcessor:
+    """
+    Chunk-at-a-time version of process_wav for raw PCM streams.
+    Leading silence is dropped until the first loud window; audio after the
+    last loud window is held back and only released if louder audio follows,
+    or up to trim_keep_ms of it by finish(), as process_wav keeps it.
+    Loudness uses a running RMS.
+    """
+
+    def __init__(self, rate, channels=1, options=None):
+        self.opts = parse_options(options)
+        self.rate = rate
+        self.channels = channels
+        self.out_rate = int(self.opts['sample_rate'] or rate)
+        self.started = not self.opts['trim']
+        self.held = np.zeros((0, channels), dtype=np.float32)  # Possibly-trailing silence
+        self.energy = 0.0
+        self.frames_seen = 0
+        self.gain = 1.0
+        self.position = 0.0  # Next output position, in input frames since last_sample
+        self.last_sample = None
+
+    def feed(self, pcm):
+        """Process a chunk of raw int16 PCM bytes, returning processed PCM bytes"""
+        audio = to_float(np.frombuffer(pcm, dtype='<i2').reshape(-1, self.channels))
+        if self.opts['trim']:
+            audio = self._trim(audio)
+        return self._emit(audio)
+
+    def finish(self):
+        """End the stream, returning the trailing margin still held back"""
+        keep = self.rate * self.opts['trim_keep_ms'] // 1000 if self.started else 0
+        tail, self.held = self.held[:keep], self.held[:0]
+        return self._emit(tail)
+
+    def _trim(self, audio):
+        audio = np.concatenate([self.held, audio])
+        levels, window = window_levels_db(audio, self.rate)
+        loud = np.flatnonzero(levels > self.opts['trim_threshold_db'])
+        keep = self.rate * self.opts['trim_keep_ms'] // 1000
+        if not len(loud):
+            if not self.started:
+                # Only keep the tail that may become lead-in to the first word
+                self.held = audio[-keep:] if keep else audio[:0]
+            else:
+                self.held = audio
+            return audio[:0]
+        start = 0 if self.started else max(0, loud[0] * window - keep)
+        # The margin after the last loud window may still run into the next
+        # chunk, so it stays held with the rest until finish() or more speech
+        end = min(len(audio), (loud[-1] + 1) * window)
+        self.started = True
+        self.held = audio[end:]
+        return audio[start:end]
+
+    def _emit(self, audio):
+        if not len(audio):
+            return b''
+        if self.opts['loudness_db'] is not None:
+            # Running RMS over everything seen so far settles within a sentence
+            self.energy += float(np.square(audio).sum())
+            self.frames_seen += audio.size
+            level = 10.0 * np.log10(self.energy / self.frames_seen) if self.energy else -np.inf
+            if np.isfinite(level):
+                target = 10.0 ** ((self.opts['loudness_db'] - level) / 20.0)
+                peak_limit = 10.0 ** (self.opts['peak_db'] / 20.0)
+                peak = float(np.abs(audio).max())
+                self.gain = min(target, peak_limit / peak) if peak else target
+            audio = audio * self.gain
+        if self.out_rate != self.rate:
+            audio = self._resample(audio)
+        return to_int16(audio).tobytes()
+
+    def _resample(self, audio):
+        # Prepend the previous chunk's last frame so interpolation is seamless
+        if self.last_sample is not None:
+            audio = np.concatenate([self.last_sample, audio])
+        step = self.rate / self.out_rate
+        last_index = len(audio) - 1
+        count = int((last_index - self.position) // step) + 1 if last_index >= self.position else 0
+        positions = self.position + np.arange(count) * step
+        out = _interpolate(audio, positions)
+        # Carry the fractional position relative to the frame we keep
+        self.position = self.position + count * step - last_index
+        self.last_sample = audio[-1:]
+        return out
@@ -1,6 +1,13 @@
 // Background service worker for Read Aloud extension
 
 const TTS_SERVER_URL = "http://localhost:5000";
+const STREAM_URL = "ws://localhost:5000/stream";
+
+// After the stream fails to open, use plain /synthesize for this long
+const STREAM_RETRY_MS = 30000;
+
+// Longest a cast status long-poll waits for a change (seconds)
+const CAST_STATUS_WAIT_S = 10;
 
 // Handle messages from content script
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
@@ -9,14 +16,50 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     return true; // Keep channel open for async response
   }
 
+  // Over the /stream WebSocket when possible, else one request per chunk
   if (request.action === "synthesize") {
-    synthesizeSpeech(request.text, request.rate).then(sendResponse);
+    streamSpeech(
+      request.text,
+      request.rate,
+      request.docInfo,
+      request.requestId,
+      request.cast,
+      request.playback
+    )
+      .catch(() =>
+        synthesizeSpeech(
+          request.text,
+          request.rate,
+          request.docInfo,
+          request.requestId,
+          request.playback
+        )
+      )
+      .then(sendResponse);
+    return true;
+  }
+
+  // Recommended chunk sizes for the default engine
+  if (request.action === "segmentSizes") {
+    getSegmentSizes(request.rate).then(sendResponse);
+    return true;
+  }
+
+  // Abandon an in-flight synthesis when the reader stops or skips
+  if (request.action === "cancelSynthesis") {
+    cancelSynthesis(request.requestId).then(sendResponse);
+    return true;
+  }
+
+  // Drop server-side speculative synthesis on stop
+  if (request.action === "cancelSpeculation") {
+    cancelSpeculation(request.docId).then(sendResponse);
     return true;
   }
 
   // Add cast status check
   if (request.action === "castStatus") {
-    checkCastStatus().then(sendResponse);
+    checkCastStatus(request.since).then(sendResponse);
     return true;
   }
 
@@ -58,20 +101,62 @@ async function checkTTSServer() {
   }
 }
 
-async function synthesizeSpeech(text, rate = 1.0) {
+// W3C trace context for one request, so server-side traces (--trace) can be
+// matched to what the extension saw
+function makeTraceparent() {
+  const hex = (bytes) =>
+    Array.from(crypto.getRandomValues(new Uint8Array(bytes)), (b) =>
+      b.toString(16).padStart(2, "0")
+    ).join("");
+  return `00-${hex(16)}-${hex(8)}-01`;
+}
+
+// In-flight synthesis requests: requestId -> AbortController
+const pendingSyntheses = new Map();
+
+// docInfo: { docId, position, upcoming } lets the server synthesize the
+// following segments speculatively; requestId lets cancelSynthesis stop it.
+// playback: { first, fastStart } for the chunk that starts playback; with
+// fastStart the server may cover only the first sentence (spokenWords)
+async function synthesizeSpeech(text, rate = 1.0, docInfo = null, requestId = null, playback = null) {
+  const controller = new AbortController();
+  if (requestId) {
+    pendingSyntheses.set(requestId, controller);
+  }
   try {
+    const body = {
+      text: text,
+      rate: rate,
+      engine: "auto",
+    };
+    if (requestId) {
+      body.request_id = requestId;
+    }
+    if (docInfo) {
+      body.doc_id = docInfo.docId;
+      body.position = docInfo.position;
+      body.upcoming = docInfo.upcoming;
+    }
+    if (playback) {
+      body.first = playback.first;
+      body.fast_start = playback.fastStart;
+    }
+
     const response = await fetch(`${TTS_SERVER_URL}/synthesize`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        traceparent: makeTraceparent(),
       },
-      body: JSON.stringify({
-        text: text,
-        rate: rate,
-        engine: "auto",
-      }),
+      body: JSON.stringify(body),
+      signal: controller.signal,
     });
 
+    // 499: cancelled on the server
+    if (response.status === 499) {
+      return { success: false, cancelled: true };
+    }
+
     if (!response.ok) {
       return {
         success: false,
@@ -79,22 +164,217 @@ async function synthesizeSpeech(text, rate = 1.0) {
       };
     }
 
+    const spokenWords = Number(response.headers.get("X-Spoken-Words")) || null;
+    const sizes = response.headers.get("X-Segment-Sizes");
+    const segmentSizes = sizes ? sizes.split(",").map(Number) : null;
     const audioBlob = await response.blob();
     const reader = new FileReader();
 
     return new Promise((resolve) => {
       reader.onloadend = () => {
-        resolve({ success: true, audioData: reader.result });
+        resolve({
+          success: true,
+          audioData: reader.result,
+          spokenWords,
+          segmentSizes,
+        });
       };
       reader.readAsDataURL(audioBlob);
     });
+  } catch (error) {
+    if (error.name === "AbortError") {
+      return { success: false, cancelled: true };
+    }
+    return { success: false, error: error.message };
+  } finally {
+    if (requestId) {
+      pendingSyntheses.delete(requestId);
+    }
+  }
+}
+
+// Sizes measured by the server: { sizes: [words, ...] }, or null
+async function getSegmentSizes(rate = 1.0) {
+  try {
+    const response = await fetch(
+      `${TTS_SERVER_URL}/segment-size?engine=auto&rate=${rate}`
+    );
+    return response.ok ? await response.json() : null;
+  } catch (error) {
+    return null;
+  }
+}
+
+// Streaming synthesis (/stream): one WebSocket carries every chunk, the
+// audio comes back as binary frames and cancel/seek are plain messages
+let stream = null; // Promise of the open WebSocket
+let streamRetryAt = 0;
+let streamSegmentCount = 0;
+const streamRequests = new Map(); // segment id -> { resolve, reject, start, chunks }
+
+function openStream() {
+  if (stream) {
+    return stream;
+  }
+  if (Date.now() < streamRetryAt) {
+    return Promise.reject(new Error("Stream unavailable"));
+  }
+  stream = new Promise((resolve, reject) => {
+    const ws = new WebSocket(STREAM_URL);
+    ws.binaryType = "arraybuffer";
+    let receiving = null; // Segment whose audio frames are arriving
+
+    ws.onopen = () => {
+      // The extension plays WAV files, so ask for those instead of raw PCM
+      ws.send(JSON.stringify({ type: "config", engine: "auto", format: "wav" }));
+      resolve(ws);
+    };
+    ws.onclose = () => {
+      stream = null;
+      streamRetryAt = Date.now() + STREAM_RETRY_MS;
+      reject(new Error("Stream unavailable"));
+      // Unfinished chunks are retried over /synthesize
+      for (const pending of streamRequests.values()) {
+        pending.reject(new Error("Stream closed"));
+      }
+      streamRequests.clear();
+    };
+    ws.onmessage = (message) => {
+      if (typeof message.data !== "string") {
+        if (receiving) {
+          receiving.chunks.push(message.data);
+        }
+        return;
+      }
+      const event = JSON.parse(message.data);
+      const pending = streamRequests.get(event.id);
+      if (event.type === "start") {
+        receiving = pending || null;
+        if (pending) {
+          pending.start = event;
+        }
+        return;
+      }
+      if (!pending) {
+        return; // hello, or a chunk this side already gave up on
+      }
+      streamRequests.delete(event.id);
+      if (event.type === "end") {
+        receiving = null;
+        pending.resolve({
+          success: true,
+          audioData: wavDataUrl(pending.chunks),
+          durationMs: pending.start.duration_ms,
+          spokenWords: pending.start.spoken_words || null,
+          segmentSizes: pending.start.segment_sizes || null,
+        });
+      } else if (event.type === "cast") {
+        pending.resolve({
+          success: true,
+          casted: true,
+          durationMs: event.duration_ms,
+          spokenWords: event.spoken_words || null,
+          segmentSizes: event.segment_sizes || null,
+        });
+      } else if (event.type === "cancelled") {
+        pending.resolve({ success: false, cancelled: true });
+      } else {
+        pending.resolve({ success: false, error: event.error });
+      }
+    };
+  });
+  return stream;
+}
+
+// Rejects only if the stream cannot be used, so the caller can fall back
+async function streamSpeech(
+  text,
+  rate = 1.0,
+  docInfo = null,
+  requestId = null,
+  cast = false,
+  playback = null
+) {
+  const ws = await openStream();
+  const id = requestId || `segment-${++streamSegmentCount}`;
+  const segment = { type: "segment", id, text, rate, cast: Boolean(cast) };
+  if (docInfo) {
+    segment.doc_id = docInfo.docId;
+    segment.position = docInfo.position;
+    segment.upcoming = docInfo.upcoming;
+  }
+  if (playback) {
+    segment.first = playback.first;
+    segment.fast_start = playback.fastStart;
+  }
+  return new Promise((resolve, reject) => {
+    streamRequests.set(id, { resolve, reject, start: null, chunks: [] });
+    ws.send(JSON.stringify(segment));
+  });
+}
+
+// Runtime messages carry JSON only, so the audio still reaches the page as
+// a data: URL; this is the one encoding step left per chunk
+function wavDataUrl(chunks) {
+  let binary = "";
+  for (const chunk of chunks) {
+    const bytes = new Uint8Array(chunk);
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+      binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+  }
+  return "data:audio/wav;base64," + btoa(binary);
+}
+
+async function cancelSynthesis(requestId) {
+  const pending = streamRequests.get(requestId);
+  if (pending) {
+    streamRequests.delete(requestId);
+    pending.resolve({ success: false, cancelled: true });
+    const ws = await stream;
+    ws.send(JSON.stringify({ type: "cancel", id: requestId }));
+    return { success: true };
+  }
+
+  const controller = pendingSyntheses.get(requestId);
+  if (controller) {
+    controller.abort();
+  }
+  // The server also notices the closed connection; this makes it immediate
+  try {
+    const response = await fetch(`${TTS_SERVER_URL}/synthesize/cancel`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ request_id: requestId }),
+    });
+    return { success: response.ok };
+  } catch (error) {
+    return { success: false, error: error.message };
+  }
+}
+
+async function cancelSpeculation(docId) {
+  try {
+    const response = await fetch(`${TTS_SERVER_URL}/speculation/cancel`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ doc_id: docId }),
+    });
+    return { success: response.ok };
   } catch (error) {
     return { success: false, error: error.message };
   }
 }
-async function checkCastStatus() {
+
+// With `since` (a status version) the server answers once the status has
+// changed from it, or after CAST_STATUS_WAIT_S
+async function checkCastStatus(since = null) {
+  const query =
+    since === null || since === undefined
+      ? ""
+      : `?since=${since}&timeout=${CAST_STATUS_WAIT_S}`;
   try {
-    const response = await fetch("http://localhost:5000/api/cast/status");
+    const response = await fetch(`http://localhost:5000/api/cast/status${query}`);
     if (response.ok) {
       return await response.json();
     }
@@ -116,6 +396,7 @@ async function castAudioData(audioDataArray) {
 
     const response = await fetch("http://localhost:5000/api/cast/cast_data", {
       method: "POST",
+      headers: { traceparent: makeTraceparent() },
       body: formData,
     });
 
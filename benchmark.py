@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Read Aloud TTS server
+Usage: python3 benchmark.py <name> [options]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from text_normalizer import normalize_text
+
+SAMPLE_PARAGRAPH = (
+    "The quick brown fox jumps over the lazy dog [12]. Dr. Smith wrote    "
+    "about it at https://example.com/articles/fox?id=42 on the 3rd of May, "
+    "citing 1,250 sources!!! See also www.example.org ----- or mail "
+    "editor@example.com for 99.5% of cases... Next section ==========\n\n"
+)
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+def make_document(size_bytes, seed=0):
+    """Build a synthetic web-like document of roughly size_bytes"""
+    rng = random.Random(seed)
+    words = SAMPLE_PARAGRAPH.split(' ')
+    parts = []
+    total = 0
+    while total < size_bytes:
+        rng.shuffle(words)
+        paragraph = ' '.join(words)
+        parts.append(paragraph)
+        total += len(paragraph) + 1
+    return ' '.join(parts)
+
+def bench_normalize(args):
+    """Measure normalization throughput on large documents"""
+    print(f"{'size':>10} {'options':>10} {'seconds':>10} {'MB/s':>10}")
+    for size_mb in args.sizes:
+        document = make_document(int(size_mb * 1024 * 1024))
+        for label, options in [('default', None),
+                               ('expand', {'expand_abbreviations': True,
+                                           'expand_numbers': True})]:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                normalize_text(document, options)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{size_mb:>8}MB {label:>10} {best:>10.3f} {size_mb / best:>10.2f}")
+
+# ============================================================================
+# AUDIO POST-PROCESSING
+# ============================================================================
+
+def make_speech_like_wav(seconds, rate=22050):
+    """Tone bursts separated by pauses, with Piper-style leading/trailing silence"""
+    import numpy as np
+    import audio_postprocess
+    t = np.arange(int(seconds * rate)) / rate
+    burst = ((t % 1.0) < 0.7) & (t > 0.3) & (t < seconds - 0.3)
+    samples = (6000 * np.sin(2 * np.pi * 180 * t) * burst).astype(np.int16)
+    return audio_postprocess.write_wav(samples.reshape(-1, 1), rate)
+
+def bench_postprocess(args):
+    """Measure the cost of each post-processing operation"""
+    import audio_postprocess
+    wav = make_speech_like_wav(args.seconds)
+    operations = [
+        ('decode+encode', {}),
+        ('trim', {'trim': True}),
+        ('loudness', {'loudness_db': -20}),
+        ('resample 24k', {'sample_rate': 24000}),
+        ('resample 48k', {'sample_rate': 48000}),
+        ('all (48k)', {'trim': True, 'loudness_db': -20, 'sample_rate': 48000}),
+    ]
+    print(f"{args.seconds}s of 22050 Hz mono audio")
+    print(f"{'operation':>16} {'ms':>10} {'x realtime':>12}")
+    for label, options in operations:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            audio_postprocess.process_wav(wav, options)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:>16} {best * 1000:>10.2f} {args.seconds / best:>12.0f}")
+
+    # Streaming in 20ms chunks, as a live engine would produce them
+    samples, rate = audio_postprocess.read_wav(wav)
+    pcm = samples.tobytes()
+    chunk = rate * 2 // 50
+    start = time.perf_counter()
+    processor = audio_postprocess.StreamProcessor(rate, 1, operations[-1][1])
+    for offset in range(0, len(pcm), chunk):
+        processor.feed(pcm[offset:offset + chunk])
+    processor.finish()
+    elapsed = time.perf_counter() - start
+    print(f"{'stream (20ms)':>16} {elapsed * 1000:>10.2f} {args.seconds / elapsed:>12.0f}")
+
+# ============================================================================
+# SERVER STARTUP
+# ============================================================================
+
+# combined_server.py listens here
+HEALTH_URL = 'http://127.0.0.1:5000/health'
+
+def time_to_health(server_dir, timeout=30):
+    """Seconds from spawning combined_server.py until /health answers"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'combined_server.py'], cwd=server_dir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise Exception(f'Server exited with code {process.returncode}')
+            try:
+                with urllib.request.urlopen(HEALTH_URL, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        raise Exception('Server did not answer /health in time')
+    finally:
+        process.terminate()
+        process.wait()
+
+def time_import(server_dir):
+    """Seconds to import combined_server in a fresh interpreter"""
+    code = ('import time; t = time.perf_counter(); import combined_server; '
+            'print(time.perf_counter() - t)')
+    result = subprocess.run([sys.executable, '-c', code], cwd=server_dir,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def checkout(revision):
+    """Extract a git revision of the repository into a temporary directory"""
+    target = tempfile.mkdtemp(prefix='read-aloud-')
+    archive = subprocess.run(['git', 'archive', revision], capture_output=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(['tar', '-x', '-C', target], input=archive.stdout, check=True)
+    return target
+
+def bench_startup(args):
+    """Measure cold start: module import time and time until /health answers"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    targets = [('current', here)]
+    if args.compare:
+        targets.insert(0, (args.compare, checkout(args.compare)))
+    print(f"{'version':>12} {'import ms':>10} {'health ms':>10} {'(min)':>8}")
+    try:
+        for label, server_dir in targets:
+            imports = [time_import(server_dir) for _ in range(args.repeat)]
+            health = [time_to_health(server_dir) for _ in range(args.repeat)]
+            print(f"{label:>12} {statistics.median(imports) * 1000:>10.1f} "
+                  f"{statistics.median(health) * 1000:>10.1f} {min(health) * 1000:>8.1f}")
+    finally:
+        for label, server_dir in targets:
+            if server_dir != here:
+                shutil.rmtree(server_dir, ignore_errors=True)
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    normalize_parser = subparsers.add_parser('normalize', help='text normalization throughput')
+    normalize_parser.add_argument('--sizes', type=float, nargs='+', default=[0.1, 1, 10],
+                                  help='document sizes in MB')
+    normalize_parser.add_argument('--repeat', type=int, default=3)
+    normalize_parser.set_defaults(func=bench_normalize)
+
+    postprocess_parser = subparsers.add_parser('postprocess', help='audio post-processing cost per operation')
+    postprocess_parser.add_argument('--seconds', type=float, default=30)
+    postprocess_parser.add_argument('--repeat', type=int, default=5)
+    postprocess_parser.set_defaults(func=bench_postprocess)
+
+    startup_parser = subparsers.add_parser('startup', help='server cold start time')
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.add_argument('--compare', metavar='REVISION',
+                                help='also measure a git revision, e.g. HEAD~1')
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
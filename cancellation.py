@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Cancellation of In-Flight Synthesis for Read Aloud TTS
+Engine processes are watched while they run and killed as soon as every
+request waiting on them has been cancelled or its client has disconnected
+"""
+
+import os
+import select
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import tracing
+
+# How often a running engine checks for cancellation
+POLL_INTERVAL = 0.05
+
+class SynthesisCancelled(Exception):
+    """Raised when synthesis is abandoned before it finished"""
+
+    def __init__(self, reason='cancelled', cpu_seconds=0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.cpu_seconds = cpu_seconds
+
+class CancelToken:
+    """Cancellation state of one request (or one background job)"""
+
+    def __init__(self, request_id=None, check=None):
+        self.request_id = request_id
+        self.check = check  # Extra predicate, e.g. "client disconnected"
+        self.event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason='cancelled'):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    def is_cancelled(self):
+        if not self.event.is_set() and self.check is not None and self.check():
+            self.cancel('disconnected')
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise SynthesisCancelled(self.reason)
+
+def client_disconnected(environ):
+    """
+    Return a predicate telling whether the HTTP client behind a WSGI environ
+    has closed its connection (werkzeug's dev server exposes the socket)
+    """
+    sock = environ.get('werkzeug.socket')
+    if sock is None:
+        return None
+
+    def check():
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # A closed connection is readable with nothing left to read
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+        except (OSError, ValueError):
+            return True
+    return check
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class CancellationRegistry:
+    """Tokens of in-flight requests by id, plus CPU accounting"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.cpu_per_char = {}  # engine -> EWMA of CPU seconds per character
+        self.stats = {
+            'requests_cancelled': 0,
+            'disconnects': 0,
+            'processes_killed': 0,
+            'cpu_seconds_used': 0.0,
+            'cpu_seconds_spent_on_cancelled': 0.0,
+            'cpu_seconds_saved': 0.0,
+        }
+
+    def register(self, request_id, check=None):
+        token = CancelToken(request_id, check)
+        if request_id is not None:
+            with self.lock:
+                self.tokens[request_id] = token
+        return token
+
+    def unregister(self, token):
+        with self.lock:
+            if self.tokens.get(token.request_id) is token:
+                del self.tokens[token.request_id]
+            if token.is_cancelled():
+                key = 'disconnects' if token.reason == 'disconnected' else 'requests_cancelled'
+                self.stats[key] += 1
+
+    def cancel(self, request_id):
+        """Cancel the request with this id; returns False if it isn't running"""
+        with self.lock:
+            token = self.tokens.get(request_id)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def record_run(self, engine, chars, cpu_seconds):
+        """Learn CPU cost per character from a completed engine run"""
+        with self.lock:
+            self.stats['cpu_seconds_used'] += cpu_seconds
+            if chars:
+                sample = cpu_seconds / chars
+                previous = self.cpu_per_char.get(engine)
+                self.cpu_per_char[engine] = sample if previous is None else 0.8 * previous + 0.2 * sample
+
+    def record_killed(self, engine, chars, cpu_seconds):
+        """Account a killed engine run: CPU it used and an estimate of what it would have used"""
+        with self.lock:
+            self.stats['processes_killed'] += 1
+            self.stats['cpu_seconds_used'] += cpu_seconds
+            self.stats['cpu_seconds_spent_on_cancelled'] += cpu_seconds
+            expected = self.cpu_per_char.get(engine, 0.0) * chars
+            self.stats['cpu_seconds_saved'] += max(0.0, expected - cpu_seconds)
+
+    def get_stats(self):
+        with self.lock:
+            stats = {k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()}
+            stats['in_flight'] = len(self.tokens)
+        return stats
+
+# ============================================================================
+# PROCESS EXECUTION
+# ============================================================================
+
+def run_engine(cmd, input_text=None, abort=None):
+    """
+    Run an engine command to completion unless abort() becomes true.
+    Returns (returncode, stderr_bytes, cpu_seconds); raises SynthesisCancelled
+    (carrying the CPU used so far) after killing the process.
+    stdin/stderr go through temp files so no pipe threads are needed while
+    the process is polled.
+    """
+    with tempfile.TemporaryFile() as stdin_file, tempfile.TemporaryFile() as stderr_file:
+        if input_text is not None:
+            stdin_file.write(input_text.encode('utf-8'))
+            stdin_file.seek(0)
+        with tracing.span('engine.spawn'):
+            process = subprocess.Popen(cmd, stdin=stdin_file, stdout=subprocess.DEVNULL,
+                                       stderr=stderr_file)
+
+        if not hasattr(os, 'wait4'):
+            # No rusage on this platform: poll without CPU accounting
+            while True:
+                try:
+                    returncode = process.wait(POLL_INTERVAL if abort else None)
+                    break
+                except subprocess.TimeoutExpired:
+                    if abort():
+                        process.kill()
+                        process.wait()
+                        raise SynthesisCancelled()
+            stderr_file.seek(0)
+            return returncode, stderr_file.read(), 0.0
+
+        cancelled = False
+        exit_wait = _exit_waiter(process.pid)
+        try:
+            while True:
+                pid, status, usage = os.wait4(process.pid, os.WNOHANG if abort else 0)
+                if pid:
+                    break
+                if abort():
+                    process.kill()
+                    pid, status, usage = os.wait4(process.pid, 0)
+                    cancelled = True
+                    break
+                exit_wait(POLL_INTERVAL)
+        finally:
+            exit_wait(None)
+        # Popen must not try to reap the pid again
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        if cancelled:
+            raise SynthesisCancelled(cpu_seconds=cpu_seconds)
+        stderr_file.seek(0)
+        return process.returncode, stderr_file.read(), cpu_seconds
+
+def _exit_waiter(pid):
+    """
+    Return wait(timeout) that sleeps until the process exits or timeout
+    passes (a pidfd wakes immediately on exit); wait(None) releases it
+    """
+    fd = None
+    if hasattr(os, 'pidfd_open'):
+        try:
+            fd = os.pidfd_open(pid)
+        except OSError:
+            fd = None
+
+    def wait(timeout):
+        nonlocal fd
+        if timeout is None:
+            if fd is not None:
+                os.close(fd)
+                fd = None
+        elif fd is not None:
+            select.select([fd], [], [], timeout)
+        else:
+            time.sleep(timeout)
+    return wait
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Chromecast Support for Read Aloud
+Flask blueprint with the cast setup page (/cast) and the /api/cast/*
+control endpoints. pychromecast (and its zeroconf stack) is only imported,
+and discovery only started, when the first cast request arrives.
+"""
+
+from flask import Blueprint, request, jsonify, send_file, render_template_string
+import importlib.util
+import io
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID
+
+from local_address import AddressResolver, url_host
+from cast_status import CastStatusCache
+from cast_group import CastGroup, MediaRing, MAX_GROUP_SIZE
+import tracing
+
+cast = Blueprint('cast', __name__)
+
+# Each chunk is published here once; every receiver fetches that copy
+media_ring = MediaRing()
+
+# Connected devices (one, or a multi-room group); the leader is current_cast
+cast_group = CastGroup()
+
+# Local address each device reaches us on, for media URLs
+address_resolver = AddressResolver()
+
+# Snapshot of the connected device's state, kept current by its listeners
+status_cache = CastStatusCache()
+
+# Default wait of a /api/cast/status?since= long-poll (seconds)
+STATUS_LONG_POLL_TIMEOUT = 25
+
+# Default wait for a control command's acknowledgement with "wait" (seconds)
+CONTROL_ACK_TIMEOUT = 5
+
+# Chromecast globals
+chromecasts = {}
+current_cast = None
+scan_thread = None
+scanning = False
+pychromecast = None
+cast_stack_lock = threading.Lock()
+PYCHROMECAST_AVAILABLE = importlib.util.find_spec('pychromecast') is not None
+
+CAST_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Cast Device Setup</title>
+    <style>
+        body { 
+            font-family: Arial, sans-serif; 
+            margin: 20px; 
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            padding-top: 40px;
+        }
+        .container {
+            background: white;
+            padding: 30px;
+            border-radius: 12px;
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+            max-width: 600px;
+            width: 100%;
+        }
+        h2 { 
+            color: #667eea; 
+            margin-top: 0;
+        }
+        .device { 
+            padding: 15px; 
+            margin: 10px 0; 
+            border: 2px solid #e0e0e0; 
+            border-radius: 8px;
+            cursor: pointer; 
+            transition: all 0.2s;
+            display: flex;
+            align-items: center;
+            gap: 10px;
+        }
+        .device:hover { 
+            background: #f5f5ff; 
+            border-color: #667eea;
+            transform: translateY(-2px);
+        }
+        .device-icon {
+            font-size: 24px;
+        }
+        .device-info {
+            flex: 1;
+        }
+        .device-name {
+            font-weight: 600;
+            color: #333;
+        }
+        .device-model {
+            font-size: 12px;
+            color: #999;
+        }
+        .status {
+            text-align: center;
+            padding: 10px;
+            border-radius: 6px;
+            margin-bottom: 20px;
+            font-size: 14px;
+        }
+        .status.info {
+            background: #e3f2fd;
+            color: #1976d2;
+        }
+        .status.success {
+            background: #c8e6c9;
+            color: #2e7d32;
+        }
+        .loading {
+            text-align: center;
+            color: #999;
+            padding: 20px;
+        }
+        .group-pick {
+            width: 18px;
+            height: 18px;
+        }
+        #group-btn {
+            display: none;
+            width: 100%;
+            padding: 12px;
+            border: none;
+            border-radius: 8px;
+            background: #667eea;
+            color: white;
+            font-size: 14px;
+            cursor: pointer;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h2>🔊 Cast Device Setup</h2>
+        <div id="status" class="status info">Scanning for devices...</div>
+        <div id="devices" class="loading">Looking for Chromecasts on your network...</div>
+        <button id="group-btn" onclick="connectGroup()">Play on selected devices</button>
+    </div>
+    <script>
+        // Devices ticked for multi-room playback
+        const selected = new Set();
+
+        // Fetch devices from backend
+        function updateDevices() {
+            fetch('/api/cast/devices')
+                .then(r => r.json())
+                .then(data => {
+                    const container = document.getElementById('devices');
+                    if (data.devices.length === 0) {
+                        container.innerHTML = '<div class="loading">No devices found. Make sure your Chromecast is on the same network.</div>';
+                    } else {
+                        container.innerHTML = data.devices.map(d => 
+                            `<div class="device" onclick="connect('${d.uuid}')">
+                                <input type="checkbox" class="group-pick" title="Add to group"
+                                       ${selected.has(d.uuid) ? 'checked' : ''}
+                                       onclick="event.stopPropagation(); pick('${d.uuid}', this.checked)">
+                                <div class="device-icon">📡</div>
+                                <div class="device-info">
+                                    <div class="device-name">${d.name}</div>
+                                    <div class="device-model">${d.model} - ${d.host}</div>
+                                </div>
+                            </div>`
+                        ).join('');
+                    }
+                });
+        }
+
+        function pick(uuid, checked) {
+            if (checked) {
+                selected.add(uuid);
+            } else {
+                selected.delete(uuid);
+            }
+            document.getElementById('group-btn').style.display = selected.size > 1 ? 'block' : 'none';
+        }
+
+        function connectGroup() {
+            document.getElementById('status').textContent = 'Connecting...';
+            fetch('/api/cast/group', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({uuids: Array.from(selected)})
+            }).then(r => r.json()).then(data => {
+                if (data.success) {
+                    document.getElementById('status').className = 'status success';
+                    document.getElementById('status').textContent = '✓ Playing on ' + data.devices.join(', ') + '! You can close this window.';
+                } else {
+                    document.getElementById('status').className = 'status info';
+                    document.getElementById('status').textContent = 'Connection failed. Try again.';
+                }
+            });
+        }
+
+        function connect(uuid) {
+            document.getElementById('status').textContent = 'Connecting...';
+            fetch('/api/cast/connect', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({uuid: uuid})
+            }).then(r => r.json()).then(data => {
+                if (data.success) {
+                    document.getElementById('status').className = 'status success';
+                    document.getElementById('status').textContent = '✓ Connected to ' + data.device + '! You can close this window.';
+                } else {
+                    document.getElementById('status').className = 'status info';
+                    document.getElementById('status').textContent = 'Connection failed. Try again.';
+                }
+            });
+        }
+
+        // Update devices every 5 seconds
+        updateDevices();
+        setInterval(updateDevices, 5000);
+    </script>
+</body>
+</html>
+"""
+
+# ============================================================================
+# CHROMECAST FUNCTIONS
+# ============================================================================
+
+def load_cast_stack():
+    """
+    Import pychromecast and start device discovery on the first cast
+    request. Returns False when casting is unavailable.
+    """
+    global pychromecast, scan_thread, PYCHROMECAST_AVAILABLE
+    if pychromecast is not None:
+        return True
+    if not PYCHROMECAST_AVAILABLE:
+        return False
+    with cast_stack_lock:
+        if pychromecast is None:
+            try:
+                import pychromecast
+            except ImportError as e:
+                print(f"Chromecast support disabled: {e}")
+                PYCHROMECAST_AVAILABLE = False
+                return False
+            print("Starting Chromecast discovery...")
+            scan_thread = threading.Thread(target=discover_chromecasts, daemon=True)
+            scan_thread.start()
+            address_resolver.start_watching()
+    return True
+
+def discover_chromecasts():
+    """Background thread to discover Chromecasts"""
+    global chromecasts, scanning
+    
+    if not PYCHROMECAST_AVAILABLE:
+        return
+    
+    scanning = True
+    while scanning:
+        try:
+            services, browser = pychromecast.discovery.discover_chromecasts()
+            pychromecast.discovery.stop_discovery(browser)
+            
+            chromecasts = {}
+            for service in services:
+                # cc = pychromecast.get_chromecast_from_service(service, browser)
+                chromecasts[service.uuid] = {
+                    # 'device': cc,
+                    'uuid': service.uuid,
+                    'name': service.friendly_name,
+                    'model': service.model_name,
+                    'host': service.host,
+                    'port': service.port
+                }
+            address_resolver.prime(info['host'] for info in chromecasts.values())
+            
+            time.sleep(10)  # Re-scan every 10 seconds
+        except Exception as e:
+            print(f"Discovery error: {e}")
+            time.sleep(5)
+
+def stop_discovery():
+    global scanning
+    scanning = False
+
+@cast.route('/cast')
+def cast_page():
+    """Serve the cast selection page"""
+    if not load_cast_stack():
+        return "Chromecast support not available. Install pychromecast: pip install pychromecast", 503
+    return render_template_string(CAST_PAGE)
+
+@cast.route('/api/cast/devices', methods=['GET'])
+def get_cast_devices():
+    """Return list of discovered Chromecasts"""
+    if not load_cast_stack():
+        return jsonify({'devices': [], 'error': 'pychromecast not installed'}), 503
+    
+    devices = [
+        {
+            'uuid': info['uuid'],
+            'name': info['name'],
+            'model': info['model'],
+            'host': info['host']
+        }
+        for info in chromecasts.values()
+    ]
+    return jsonify({'devices': devices})
+
+@cast.route('/api/cast/connect', methods=['POST'])
+def connect_cast_device():
+    """Connect to a specific Chromecast"""
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    
+    data = request.json
+    uuid_str = data.get('uuid')
+    uuid = UUID(uuid_str)
+
+    
+    if uuid not in chromecasts:
+        return jsonify({'error': 'Device not found'}), 404
+    
+    try:
+        use_devices([(connect_device(chromecasts[uuid]), chromecasts[uuid]['host'])])
+        return jsonify({'success': True, 'device': chromecasts[uuid]['name']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@cast.route('/api/cast/group', methods=['GET', 'POST'])
+def cast_group_devices():
+    """
+    Multi-room casting: connect to several Chromecasts and play every chunk
+    on all of them, roughly in sync
+    Body: {"uuids": ["...", ...]} (the first device leads: status and
+    acknowledgements follow it). GET lists the group with each device's
+    measured start latency.
+    """
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    if request.method == 'GET':
+        return jsonify({'devices': cast_group.describe()})
+    
+    uuids = [UUID(u) for u in (request.json or {}).get('uuids', [])]
+    missing = [str(u) for u in uuids if u not in chromecasts]
+    if not uuids or missing:
+        return jsonify({'error': 'Device not found', 'missing': missing}), 404
+    if len(uuids) > MAX_GROUP_SIZE:
+        return jsonify({'error': f'At most {MAX_GROUP_SIZE} devices can be grouped'}), 400
+    
+    # Connect in parallel; devices that fail are left out of the group
+    infos = [chromecasts[u] for u in uuids]
+    connected, failed = [], []
+    with ThreadPoolExecutor(max_workers=len(infos)) as pool:
+        futures = [pool.submit(connect_device, info) for info in infos]
+    for info, future in zip(infos, futures):
+        if future.exception() is None:
+            connected.append((future.result(), info['host']))
+        else:
+            failed.append({'device': info['name'], 'error': str(future.exception())})
+    if not connected:
+        return jsonify({'error': 'No device could be connected', 'failed': failed}), 500
+    use_devices(connected)
+    return jsonify({'success': True, 'devices': [device.name for device, _ in connected],
+                    'failed': failed})
+
+def connect_device(info):
+    """Connected pychromecast device for a discovered Chromecast"""
+    with tracing.span('cast.get_chromecast_from_host', device=info['name']):
+        device = pychromecast.get_chromecast_from_host((info['host'], info['port'], info['uuid'],
+                                                        info['model'], info['name']))
+    with tracing.span('cast.wait'):
+        device.wait()
+    return device
+
+def use_devices(members):
+    """Cast to these (device, host) pairs from now on; the first leads"""
+    global current_cast
+    cast_group.set_members(members)
+    current_cast = members[0][0]
+    status_cache.attach(current_cast)
+
+@cast.route('/api/cast/cast_data', methods=['POST'])
+def cast_audio_data():
+    """Cast audio data to the connected device"""
+    global current_cast
+    
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    
+    if not current_cast:
+        return jsonify({'error': 'No device connected'}), 400
+    
+    try:
+        # Get audio data from request
+        files = request.files
+        if 'audio' not in files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        
+        audio_file = files['audio']
+        
+        with tracing.span('cast.read_upload'):
+            audio_data = audio_file.read()
+        
+        # Serve the audio via this server, on the port this request came in on
+        # (5000, or 5001 for the cast relay)
+        play_audio(audio_data, request.environ.get('SERVER_PORT', '5000'))
+        
+        return jsonify({'success': True})
+    
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def play_audio(audio_data, port):
+    """
+    Publish WAV audio once and play it on every connected device, each
+    fetching it from this server (on `port`) at the address it reaches us on
+    """
+    filename = media_ring.publish(audio_data)
+    # Advertise the address each device reaches us on (cached per device)
+    cast_group.play(lambda host: f"http://{url_host(address_resolver.address_for(host))}:{port}"
+                                 f"/serve_cast_audio/{filename}", 'audio/wav')
+
+def cast_audio_bytes(audio_data, port):
+    """
+    Play audio rendered by this server on the connected devices, without it
+    travelling through the extension (used by /stream segments with "cast")
+    """
+    if not load_cast_stack() or not current_cast:
+        raise Exception('No cast device connected')
+    play_audio(audio_data, port)
+
+@cast.route('/api/cast/cast_url', methods=['POST'])
+def cast_audio_url():
+    """
+    Cast audio the device can fetch itself
+    Body: {"url": "http://...", "content_type": "audio/wav" (optional)}
+    """
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    
+    if not current_cast:
+        return jsonify({'error': 'No device connected'}), 400
+    
+    try:
+        data = request.json
+        audio_url = data.get('url')
+        if not audio_url:
+            return jsonify({'error': 'No audio URL provided'}), 400
+        
+        cast_group.play(lambda host: audio_url, data.get('content_type', 'audio/wav'))
+        
+        return jsonify({'success': True})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@cast.route('/serve_cast_audio/<filename>')
+def serve_cast_audio(filename):
+    """
+    Serve published audio to the receivers. Grouped devices fetch the same
+    chunk concurrently, with repeated range requests, all from one copy.
+    """
+    audio_data = media_ring.get(filename)
+    if audio_data is None:
+        return "File not found", 404
+    return send_file(io.BytesIO(audio_data), mimetype='audio/wav', conditional=True)
+
+@cast.route('/api/cast/status', methods=['GET'])
+def get_cast_status():
+    """
+    Get current casting status: connection, player state, position, current
+    item, volume and the last control command, with a "version".
+    ?since=<version> long-polls: the response waits until the status differs
+    from that version (at most ?timeout= seconds, default 25).
+    """
+    if not load_cast_stack():
+        return jsonify({'connected': False, 'error': 'pychromecast not installed'})
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(status_cache.snapshot())
+    timeout = request.args.get('timeout', STATUS_LONG_POLL_TIMEOUT, type=float)
+    return jsonify(status_cache.wait(since, timeout))
+
+@cast.route('/api/cast/control', methods=['POST'])
+def control_cast_playback():
+    """
+    Control playback
+    Body: {"action": "play" | "pause" | "stop", "wait": false}
+    The command is sent in the background and acknowledged once the device
+    reports the state it asked for; with "wait" the response waits for that
+    (up to CONTROL_ACK_TIMEOUT seconds). Returns the command's record.
+    """
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    
+    if not current_cast:
+        return jsonify({'error': 'No device connected'}), 400
+    
+    data = request.json
+    action = data.get('action')
+    try:
+        # Every device in the group follows the command
+        command = status_cache.send_command(
+            action, lambda: cast_group.each(lambda device: getattr(device.media_controller, action)()))
+    except ValueError:
+        return jsonify({'error': 'Invalid action'}), 400
+    
+    if data.get('wait'):
+        command = status_cache.wait_for_ack(command['id'], CONTROL_ACK_TIMEOUT) or command
+    return jsonify({'success': command['state'] != 'failed', 'command': command})
+
+@cast.route('/api/cast/disconnect', methods=['POST'])
+def disconnect_cast():
+    """Disconnect from current device"""
+    global current_cast
+    
+    if not load_cast_stack():
+        return jsonify({'error': 'pychromecast not installed'}), 503
+    
+    if current_cast:
+        for device in cast_group.clear():
+            try:
+                device.quit_app()
+            except:
+                pass
+        current_cast = None
+        status_cache.detach()
+    
+    return jsonify({'success': True})
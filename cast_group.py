@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Group Casting for Read Aloud
+Plays each chunk on every connected device from a single copy: the audio
+is published once into a ring of in-memory media slots that all receivers
+fetch from, and play_media goes out to the devices in parallel, staggered
+by each one's measured start latency so they begin at about the same time.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import tracing
+
+# Chunks kept for receivers still fetching (or re-requesting ranges of) them
+MEDIA_SLOTS = 16
+
+# Most devices in one group
+MAX_GROUP_SIZE = 8
+
+# Weight of the newest start-latency measurement in a device's average
+LATENCY_SMOOTHING = 0.3
+
+# Longest wait for a device to start a chunk (seconds)
+START_TIMEOUT = 10
+
+class MediaRing:
+    """Fixed number of media slots; publishing reuses the oldest"""
+
+    def __init__(self, slots=MEDIA_SLOTS):
+        self.slots = [None] * slots  # (name, audio_data)
+        self.index = {}  # name -> slot
+        self.next_slot = 0
+        # Names never repeat across restarts, so receivers can't replay stale audio
+        self.prefix = uuid.uuid4().hex[:8]
+        self.sequence = itertools.count(1)
+        self.lock = threading.Lock()
+        self.stats = {'published': 0, 'bytes_published': 0, 'requests': 0, 'misses': 0}
+
+    def publish(self, audio_data, extension='wav'):
+        """Store audio in the next slot; returns the name it is served under"""
+        with self.lock:
+            name = f'{self.prefix}-{next(self.sequence)}.{extension}'
+            previous = self.slots[self.next_slot]
+            if previous is not None:
+                del self.index[previous[0]]
+            self.slots[self.next_slot] = (name, audio_data)
+            self.index[name] = self.next_slot
+            self.next_slot = (self.next_slot + 1) % len(self.slots)
+            self.stats['published'] += 1
+            self.stats['bytes_published'] += len(audio_data)
+        return name
+
+    def get(self, name):
+        with self.lock:
+            slot = self.index.get(name)
+            if slot is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['requests'] += 1
+            return self.slots[slot][1]
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, slots=len(self.slots))
+
+class CastGroup:
+    """
+    The connected devices. The first is the leader: cast status follows it.
+    A single connected device is a group of one.
+    """
+
+    def __init__(self):
+        self.members = []  # {'name', 'host', 'device'}
+        self.latency = {}  # host -> smoothed start latency (seconds)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=MAX_GROUP_SIZE)
+        self.stats = {'plays': 0, 'device_plays': 0, 'failures': 0, 'last_start_spread_ms': None}
+
+    def set_members(self, members):
+        """members: [(device, host)], leader first"""
+        if len(members) > MAX_GROUP_SIZE:
+            raise ValueError(f'At most {MAX_GROUP_SIZE} devices can be grouped')
+        with self.lock:
+            self.members = [{'name': device.name, 'host': host, 'device': device}
+                            for device, host in members]
+
+    def clear(self):
+        with self.lock:
+            members, self.members = self.members, []
+        return [member['device'] for member in members]
+
+    def leader(self):
+        with self.lock:
+            return self.members[0]['device'] if self.members else None
+
+    def describe(self):
+        with self.lock:
+            return [{'name': member['name'], 'host': member['host'],
+                     'start_latency_ms': round(self.latency[member['host']] * 1000)
+                     if member['host'] in self.latency else None}
+                    for member in self.members]
+
+    # ------------------------------------------------------------------------
+    # Playback
+    # ------------------------------------------------------------------------
+
+    def play(self, url_for, content_type='audio/wav'):
+        """
+        Play media on every member; url_for(host) is the URL that device
+        fetches. Devices that start faster wait out the difference to the
+        slowest one. Raises only if no device started.
+        """
+        with self.lock:
+            members = list(self.members)
+            latencies = {member['host']: self.latency.get(member['host'], 0.0) for member in members}
+        if not members:
+            raise Exception('No cast device connected')
+
+        slowest = max(latencies.values())
+        now = time.time()
+        parent = tracing.current()
+        futures = [self.executor.submit(self._play_member, member, url_for(member['host']),
+                                        content_type, now + slowest - latencies[member['host']], parent)
+                   for member in members]
+        wait(futures)
+
+        started, errors = [], []
+        for member, future in zip(members, futures):
+            if future.exception() is not None:
+                errors.append(f"{member['name']}: {future.exception()}")
+            else:
+                started.append(future.result())
+        with self.lock:
+            self.stats['plays'] += 1
+            self.stats['device_plays'] += len(started)
+            self.stats['failures'] += len(errors)
+            if len(started) > 1:
+                self.stats['last_start_spread_ms'] = round((max(started) - min(started)) * 1000)
+        for error in errors:
+            print(f"Cast failed on {error}")
+        if not started:
+            raise Exception('; '.join(errors))
+
+    def _play_member(self, member, url, content_type, send_at, parent):
+        """Send play_media at send_at; returns when the device became active"""
+        delay = send_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        mc = member['device'].media_controller
+        sent = time.time()
+        with tracing.attach(parent):
+            with tracing.span('cast.play_media', device=member['name']):
+                mc.play_media(url, content_type)
+            with tracing.span('cast.block_until_active', device=member['name']):
+                mc.block_until_active(timeout=START_TIMEOUT)
+        active = time.time()
+        measured = active - sent
+        if measured < START_TIMEOUT:  # A timed-out start says nothing about latency
+            with self.lock:
+                previous = self.latency.get(member['host'])
+                self.latency[member['host']] = measured if previous is None else (
+                    LATENCY_SMOOTHING * measured + (1 - LATENCY_SMOOTHING) * previous)
+        return active
+
+    def each(self, command):
+        """Run command(device) on every member in parallel (playback controls)"""
+        with self.lock:
+            devices = [member['device'] for member in self.members]
+        for future in [self.executor.submit(command, device) for device in devices]:
+            future.result()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, devices=len(self.members))
+        stats['members'] = self.describe()
+        return stats
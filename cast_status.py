@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Cast Status Cache for Read Aloud
+Keeps a snapshot of the connected device (player state, position, current
+item, volume) up to date from pychromecast's status listeners, instead of
+reading the media controller on every poll. Every change bumps a version,
+so clients can long-poll for the next one. Playback commands are sent in
+the background and acknowledged when the device reports the state they
+asked for.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Player state that acknowledges each command
+EXPECTED_STATE = {'play': 'PLAYING', 'pause': 'PAUSED', 'stop': 'IDLE'}
+
+# Longest a long-poll or an acknowledgement wait may block (seconds)
+MAX_WAIT = 60
+
+# Recent commands kept for acknowledgement lookups
+COMMAND_HISTORY = 16
+
+class StatusListener:
+    """pychromecast status, media and connection listener for one connection"""
+
+    def __init__(self, cache, generation):
+        self.cache = cache
+        self.generation = generation
+
+    def new_cast_status(self, status):
+        self.cache.update(self.generation,
+                          volume=round(status.volume_level, 3),
+                          muted=status.volume_muted,
+                          app=status.display_name)
+
+    def new_media_status(self, status):
+        self.cache.update(self.generation, media=True,
+                          player_state=status.player_state,
+                          current_time=round(status.current_time or 0, 3),
+                          duration=status.duration,
+                          item=status.content_id,
+                          idle_reason=status.idle_reason,
+                          playback_rate=status.playback_rate,
+                          error=None)
+
+    def load_media_failed(self, item, error_code):
+        self.cache.update(self.generation, error=f'Loading media failed ({error_code})')
+
+    def new_connection_status(self, status):
+        self.cache.update(self.generation, connection=status.status)
+
+class CastStatusCache:
+    """Versioned snapshot of the connected device's state"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.generation = 0  # Bumped per connection; stale listeners are ignored
+        self.state = {'connected': False}
+        self.media_reported_at = 0.0
+        self.commands = deque(maxlen=COMMAND_HISTORY)
+        # One sender, so commands reach the device in the order they were given
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {'updates': 0, 'changes': 0, 'long_polls': 0,
+                      'commands': 0, 'acked': 0, 'failed': 0, 'ack_ms_total': 0}
+
+    def attach(self, device):
+        """Follow a newly connected device"""
+        with self.condition:
+            self.generation += 1
+            generation = self.generation
+            self.state = {'connected': True, 'device': device.name}
+            self.commands.clear()
+            self._changed()
+        listener = StatusListener(self, generation)
+        mc = device.media_controller
+        device.register_status_listener(listener)
+        mc.register_status_listener(listener)
+        if hasattr(device, 'register_connection_listener'):
+            device.register_connection_listener(listener)
+        # Start from what the device reported while connecting
+        if device.status is not None:
+            listener.new_cast_status(device.status)
+        if mc.status is not None:
+            listener.new_media_status(mc.status)
+
+    def detach(self):
+        with self.condition:
+            self.generation += 1
+            self.state = {'connected': False}
+            self.commands.clear()
+            self._changed()
+
+    def update(self, generation, media=False, **fields):
+        with self.condition:
+            self.stats['updates'] += 1
+            if generation != self.generation:
+                return
+            acked = False
+            if media:
+                self.media_reported_at = time.time()
+                acked = self._ack_locked(fields['player_state'])
+            changed = {k: v for k, v in fields.items() if self.state.get(k) != v}
+            self.state.update(changed)
+            if changed or acked:
+                self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self.stats['changes'] += 1
+        self.condition.notify_all()
+
+    # ------------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------------
+
+    def snapshot(self):
+        with self.condition:
+            return self._snapshot_locked()
+
+    def wait(self, since, timeout):
+        """The snapshot once its version differs from `since`, or after `timeout`"""
+        with self.condition:
+            self.stats['long_polls'] += 1
+            self.condition.wait_for(lambda: self.version != since, min(timeout, MAX_WAIT))
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self):
+        snapshot = dict(self.state, version=self.version)
+        player_state = self.state.get('player_state')
+        snapshot['playing'] = player_state == 'PLAYING'
+        snapshot['paused'] = player_state == 'PAUSED'
+        if snapshot['playing']:
+            # current_time is as of the last report; extrapolate to now
+            elapsed = time.time() - self.media_reported_at
+            snapshot['position'] = round(self.state['current_time']
+                                         + elapsed * (self.state.get('playback_rate') or 1), 3)
+        if self.commands:
+            snapshot['last_command'] = dict(self.commands[-1])
+        return snapshot
+
+    # ------------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------------
+
+    def send_command(self, action, send):
+        """
+        Queue a playback command; send() talks to the device. Returns the
+        command's record, acknowledged later by the device's status.
+        """
+        if action not in EXPECTED_STATE:
+            raise ValueError(f'Invalid action: {action}')
+        with self.condition:
+            for earlier in self.commands:
+                if earlier['state'] == 'pending':
+                    earlier['state'] = 'superseded'
+            self.stats['commands'] += 1
+            command = {'id': self.stats['commands'], 'action': action,
+                       'state': 'pending', 'sent_at': time.time()}
+            self.commands.append(command)
+            self._changed()
+        self.executor.submit(self._send, command, send)
+        return dict(command)
+
+    def _send(self, command, send):
+        try:
+            send()
+        except Exception as e:
+            with self.condition:
+                if command['state'] == 'pending':
+                    command['state'] = 'failed'
+                    command['error'] = str(e)
+                    self.stats['failed'] += 1
+                    self._changed()
+
+    def _ack_locked(self, player_state):
+        """Acknowledge pending commands asking for this state; True if any"""
+        acked = False
+        for command in self.commands:
+            if command['state'] == 'pending' and EXPECTED_STATE[command['action']] == player_state:
+                command['state'] = 'acked'
+                command['ack_ms'] = round((time.time() - command['sent_at']) * 1000)
+                self.stats['acked'] += 1
+                self.stats['ack_ms_total'] += command['ack_ms']
+                acked = True
+        return acked
+
+    def wait_for_ack(self, command_id, timeout):
+        """A command's record once it is no longer pending, or after `timeout`"""
+        with self.condition:
+            command = next((c for c in self.commands if c['id'] == command_id), None)
+            if command is None:
+                return None
+            self.condition.wait_for(lambda: command['state'] != 'pending', min(timeout, MAX_WAIT))
+            return dict(command)
+
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats, version=self.version)
+        ack_ms_total = stats.pop('ack_ms_total')
+        stats['ack_ms_avg'] = round(ack_ms_total / stats['acked']) if stats['acked'] else None
+        return stats
@@ -20,24 +20,30 @@ let isCasting = false;
 let stopRequested = false;
 let castTimeouts = [];
 let wordTrackingInterval = null;
-
-// Check if Cast relay server is available
-async function checkCastServer() {
+let docId = null; // Identifies the loaded text for server-side speculation
+let currentRequestId = null; // In-flight synthesis request, cancelled on stop/skip
+let fastStart = false; // Opt-in: quick eSpeak first sentence when playback starts
+let startingPlayback = false; // The next chunk starts playback (play or skip)
+let skipCount = 0; // Only the latest skip resumes playback
+// Words per chunk from where playback starts; the last size repeats. The
+// server recommends these from measured engine speed and load.
+let segmentSizes = [50];
+let segmentPlan = { start: 0, ends: [] }; // Planned chunk ends (word indices)
+const speculationLookahead = 2; // Upcoming chunks sent with each request
+
+// Check if Cast relay server is available. With `since` (the version of the
+// last status seen) the server answers when the status changes.
+async function checkCastServer(since = null) {
+  let status = { connected: false };
   try {
-    const response = await chrome.runtime.sendMessage({ action: "castStatus" });
-    if (response.connected) {
-      castConnected = true;
-      document.getElementById("cast-section").style.display = "block";
-      updateCastButton();
-      return true;
-    }
+    status = await chrome.runtime.sendMessage({ action: "castStatus", since });
   } catch (error) {
     console.log("Cast relay server not available");
   }
   document.getElementById("cast-section").style.display = "block";
-  castConnected = false;
+  castConnected = Boolean(status.connected);
   updateCastButton();
-  return false;
+  return status;
 }
 
 function updateCastButton() {
@@ -96,16 +102,24 @@ function openCastSetup() {
   // Open cast relay page in new tab
   window.open(`${castServerUrl}/cast`, "castsetup", "width=600,height=400");
 
-  // Poll for connection
-  const checkInterval = setInterval(async () => {
-    const connected = await checkCastServer();
-    if (connected) {
-      clearInterval(checkInterval);
-    }
-  }, 2000);
+  // Wait for the connection for up to 30 seconds; each status request
+  // returns as soon as the server's cast status changes
+  waitForCastConnection(Date.now() + 30000);
+}
 
-  // Stop checking after 30 seconds
-  setTimeout(() => clearInterval(checkInterval), 30000);
+async function waitForCastConnection(deadline) {
+  let since = null;
+  while (Date.now() < deadline) {
+    const status = await checkCastServer(since);
+    if (status.connected) {
+      return;
+    }
+    if (status.version === undefined) {
+      // Server unreachable or without cast support: retry later
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+    since = status.version;
+  }
 }
 
 // Create floating panel
@@ -153,6 +167,10 @@ function createFloatingPanel() {
             <input type="checkbox" id="highlight-toggle" />
             <span class="toggle-label">Highlight on page</span>
           </label>
+          <label title="Speak the first sentence with eSpeak while the server voice renders the rest">
+            <input type="checkbox" id="fast-start-toggle" />
+            <span class="toggle-label">Fast start</span>
+          </label>
         </div>
 
         <div class="text-display" id="text-display">
@@ -215,6 +233,7 @@ function setupEventListeners() {
   const speedValue = document.getElementById("speed-value");
   const voiceSelect = document.getElementById("voice-select");
   const highlightToggle = document.getElementById("highlight-toggle");
+  const fastStartToggle = document.getElementById("fast-start-toggle");
   const setupServerBtn = document.getElementById("setup-server-btn");
   const saveServerBtn = document.getElementById("save-server-btn");
   const cancelServerBtn = document.getElementById("cancel-server-btn");
@@ -269,6 +288,11 @@ function setupEventListeners() {
     }
   });
 
+  fastStartToggle.addEventListener("change", (e) => {
+    fastStart = e.target.checked;
+    chrome.storage.local.set({ fastStart });
+  });
+
   loadPageBtn.addEventListener("click", () => loadText(false));
   loadSelectionBtn.addEventListener("click", () => loadText(true));
   playPauseBtn.addEventListener("click", togglePlayPause);
@@ -325,11 +349,13 @@ function populateVoiceList() {
 
 async function checkTTSMode() {
   // Load saved server URL
-  const stored = await chrome.storage.local.get(["ttsServerUrl"]);
+  const stored = await chrome.storage.local.get(["ttsServerUrl", "fastStart"]);
   if (stored.ttsServerUrl) {
     ttsServerUrl = stored.ttsServerUrl;
     document.getElementById("server-url-input").value = ttsServerUrl;
   }
+  fastStart = Boolean(stored.fastStart);
+  document.getElementById("fast-start-toggle").checked = fastStart;
 
   // First check if Web Speech API is available
   if (window.speechSynthesis) {
@@ -558,6 +584,8 @@ function loadText(useSelection = false) {
 
   words = currentText.split(/\s+/).filter((w) => w.length > 0);
   currentWordIndex = 0;
+  docId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  refreshSegmentSizes();
   displayTextWithHighlight();
   updateButtons();
 
@@ -636,6 +664,7 @@ function togglePlayPause() {
     if (ttsMode === "web") {
       playWithWebSpeech();
     } else if (ttsMode === "server") {
+      startingPlayback = true;
       playWithServer();
     } else {
       updateStatus("Please configure TTS server");
@@ -707,6 +736,33 @@ function playWithWebSpeech() {
   updateButtons();
 }
 
+// End (word index) of the i-th planned chunk, planning further chunks
+// with the latest recommended sizes as needed
+function plannedEnd(i) {
+  const ends = segmentPlan.ends;
+  while (ends.length <= i) {
+    const last = ends.length ? ends[ends.length - 1] : segmentPlan.start;
+    const size = segmentSizes[Math.min(ends.length, segmentSizes.length - 1)];
+    ends.push(Math.min(last + size, words.length));
+  }
+  return ends[i];
+}
+
+// Ask the server how to size chunks; keeps the last sizes if it can't say
+async function refreshSegmentSizes() {
+  try {
+    const response = await chrome.runtime.sendMessage({
+      action: "segmentSizes",
+      rate: playbackRate,
+    });
+    if (response && response.sizes) {
+      segmentSizes = response.sizes;
+    }
+  } catch (error) {
+    console.log("Segment sizes not available");
+  }
+}
+
 async function playWithServer() {
   if (stopRequested || isPaused) {
     stopRequested = false;
@@ -721,10 +777,26 @@ async function playWithServer() {
     return;
   }
 
-  // Get chunk of words to synthesize (avoid too long chunks)
-  const chunkSize = 50;
-  const endIndex = Math.min(currentWordIndex + chunkSize, words.length);
+  // Time to first audio matters for the chunk that starts playback, so the
+  // chunks are planned afresh from there: small first, then growing
+  const first = startingPlayback;
+  startingPlayback = false;
+  if (first || currentWordIndex < segmentPlan.start) {
+    segmentPlan = { start: currentWordIndex, ends: [] };
+  }
+
+  // Get chunk of words to synthesize. Planned chunks never move, so the
+  // upcoming chunks sent for speculation are the text requested next.
+  let position = 0;
+  while (plannedEnd(position) <= currentWordIndex) position++;
+  const endIndex = plannedEnd(position);
   const textChunk = words.slice(currentWordIndex, endIndex).join(" ");
+  const upcoming = [];
+  for (let i = 1; i <= speculationLookahead; i++) {
+    const start = plannedEnd(position + i - 1);
+    if (start >= words.length) break;
+    upcoming.push(words.slice(start, plannedEnd(position + i)).join(" "));
+  }
 
   try {
     updateStatus("Generating speech...");
@@ -733,21 +805,45 @@ async function playWithServer() {
     playbackRate = parseFloat(speedSlider.value);
 
     // Request audio from background worker
+    const requestId = `${docId}-${Date.now().toString(36)}-${Math.random()
+      .toString(36)
+      .slice(2)}`;
+    currentRequestId = requestId;
     const response = await chrome.runtime.sendMessage({
       action: "synthesize",
       text: textChunk,
       rate: playbackRate,
+      docInfo: { docId, position, upcoming },
+      requestId,
+      cast: castConnected,
+      playback: { first, fastStart: first && fastStart },
     });
 
+    // Stopped or skipped while this chunk was being synthesized
+    if (response.cancelled || requestId !== currentRequestId) {
+      return;
+    }
+    currentRequestId = null;
+
     if (!response.success) {
       throw new Error(response.error);
     }
+    if (response.segmentSizes) {
+      segmentSizes = response.segmentSizes;
+    }
+
+    // A fast start speaks only the first sentence; the next request asks
+    // for the rest of the chunk, which the server is already rendering
+    const spokenEnd = response.spokenWords
+      ? currentWordIndex + response.spokenWords
+      : endIndex;
 
     // If casting, send to Chromecast instead of local playback
     console.log("Cast connected:", castConnected, "isCasting:", isCasting);
     if (castConnected) {
       console.log("Attempting to cast audio...");
-      const casted = await castAudio(response.audioData);
+      // Over /stream the server casts the audio itself; otherwise relay it
+      const casted = response.casted || (await castAudio(response.audioData));
       console.log("Cast result:", casted);
       if (casted) {
         isPlaying = true;
@@ -756,9 +852,10 @@ async function playWithServer() {
         updateButtons();
 
         // Estimate word duration for tracking
-        const wordCount = endIndex - currentWordIndex;
-        // Approximate 150 words per minute
-        const estimatedDuration = (wordCount / 150) * 60 * 1000;
+        const wordCount = spokenEnd - currentWordIndex;
+        // The stream reports the real duration; otherwise assume 150 words per minute
+        const estimatedDuration =
+          response.durationMs || (wordCount / 150) * 60 * 1000;
         const msPerWord = estimatedDuration / wordCount;
         startWordTracking(msPerWord, wordCount);
 
@@ -768,7 +865,7 @@ async function playWithServer() {
             stopRequested = false;
             return; // Don't continue if stop was requested
           }
-          currentWordIndex = endIndex;
+          currentWordIndex = spokenEnd;
           if (currentWordIndex < words.length) {
             playWithServer();
           } else {
@@ -789,7 +886,7 @@ async function playWithServer() {
     currentAudio.playbackRate = playbackRate;
 
     // Estimate word duration and update highlight
-    const wordCount = endIndex - currentWordIndex;
+    const wordCount = spokenEnd - currentWordIndex;
     currentAudio.addEventListener("loadedmetadata", () => {
       const duration = currentAudio.duration;
       const msPerWord = (duration * 1000) / wordCount;
@@ -797,7 +894,7 @@ async function playWithServer() {
     });
 
     currentAudio.addEventListener("ended", () => {
-      currentWordIndex = endIndex;
+      currentWordIndex = spokenEnd;
 
       if (currentWordIndex < words.length) {
         playWithServer();
@@ -859,7 +956,19 @@ function startWordTracking(msPerWord, wordCount) {
   }, msPerWord);
 }
 
+function cancelCurrentSynthesis() {
+  if (currentRequestId) {
+    chrome.runtime.sendMessage({
+      action: "cancelSynthesis",
+      requestId: currentRequestId,
+    });
+    currentRequestId = null;
+  }
+}
+
 function stopText() {
+  cancelCurrentSynthesis();
+
   // Clear word tracking interval
   if (wordTrackingInterval) {
     clearInterval(wordTrackingInterval);
@@ -879,6 +988,7 @@ function stopText() {
       currentAudio.pause();
       currentAudio = null;
     }
+    chrome.runtime.sendMessage({ action: "cancelSpeculation", docId });
 
     // Stop casting if active
     if (castConnected && isCasting) {
@@ -909,6 +1019,8 @@ function stopText() {
 }
 
 function restartText() {
+  cancelCurrentSynthesis();
+
   // Clear word tracking interval
   if (wordTrackingInterval) {
     clearInterval(wordTrackingInterval);
@@ -928,6 +1040,7 @@ function restartText() {
       currentAudio.pause();
       currentAudio = null;
     }
+    chrome.runtime.sendMessage({ action: "cancelSpeculation", docId });
 
     // Stop casting if active
     if (castConnected && isCasting) {
@@ -957,11 +1070,21 @@ function skipWords(count) {
       speechSynthesis.cancel();
       playWithWebSpeech();
     } else if (ttsMode === "server") {
+      cancelCurrentSynthesis();
       if (currentAudio) {
         currentAudio.pause();
         currentAudio = null;
       }
-      playWithServer();
+      startingPlayback = true;
+      // Drop speculation (and any fast-start render) for the old position
+      // first: segment positions restart at the skip target, so the server
+      // can't tell the skip from reading on
+      const skip = ++skipCount;
+      chrome.runtime.sendMessage({ action: "cancelSpeculation", docId }, () => {
+        if (skip === skipCount && isPlaying && !stopRequested) {
+          playWithServer();
+        }
+      });
     }
   } else {
     displayTextWithHighlight();
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+TTS Engines for Read Aloud
+Each engine is a plugin with the same interface: synthesize, stream,
+list_voices, warmup and capabilities. The servers and the audiobook
+exporter only talk to engines through it, so every deployment shares one
+synthesis path. Add an engine by subclassing Engine and calling register().
+"""
+
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import segment_sizing
+import tracing
+from cancellation import CancellationRegistry, SynthesisCancelled, run_engine
+
+NICE_AVAILABLE = shutil.which('nice')
+
+# Default Piper voice when the request doesn't name one
+DEFAULT_PIPER_VOICE = 'en_US-lessac-medium'
+
+# Voice catalogs are probed once and reused for this long (seconds)
+VOICE_CATALOG_TTL = 300
+
+# Utterance rendered to warm a voice up
+WARMUP_TEXT = 'Ready.'
+
+# Engine runs (and runs killed by cancellation) are accounted here;
+# /synthesize registers its cancel tokens here too
+cancellations = CancellationRegistry()
+
+# Registered engines by name, in order of preference for 'auto'
+ENGINES = {}
+
+# Model files mapped read-only by this process (path -> mmap). This only keeps
+# the files in the page cache, so Piper processes read them without touching
+# the disk; each Piper process still loads the model into its own memory.
+model_maps = {}
+model_maps_lock = threading.Lock()
+
+class Engine:
+    """
+    Base class for engine plugins. A subclass sets `name`, implements
+    available() and command(), and usually probe_voices(); the rest has
+    working defaults.
+    """
+
+    name = None
+    title = None  # For messages, e.g. 'eSpeak'
+    default_voice = None
+    # (trace attribute, regex) pairs read from the engine's stderr when tracing
+    timing_patterns = []
+
+    def __init__(self):
+        self.catalog = None  # (probed_at, voices)
+        self.catalog_lock = threading.Lock()
+
+    def available(self):
+        raise NotImplementedError
+
+    def command(self, text, output, rate, voice, speaker):
+        """Return (argv, stdin_text) rendering `text` into the WAV file `output`"""
+        raise NotImplementedError
+
+    def capabilities(self):
+        """What the engine supports (reported by /engines)"""
+        return {
+            'available': self.available(),
+            'default_voice': self.default_voice,
+            'speakers': False,
+            'streaming': False,
+        }
+
+    # ------------------------------------------------------------------------
+    # Synthesis
+    # ------------------------------------------------------------------------
+
+    def synthesize(self, text, rate=1.0, voice=None, speaker=None, low_priority=False, abort=None,
+                   measured=True):
+        """
+        Render text and return the WAV bytes. The engine process is killed
+        (SynthesisCancelled) as soon as abort() returns true. Runs that
+        readers wait for are measured for segment sizing; niced background
+        runs and warm-ups (measured=False) would skew the fit and the load.
+        """
+        if not self.available():
+            raise Exception(f'{self.title} not installed')
+        measured = measured and not low_priority
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
+        temp_file.close()
+        if measured:
+            segment_sizing.timings.started()
+        try:
+            started = time.time()
+            cmd, stdin_text = self.command(text, temp_file.name, rate, voice, speaker)
+            returncode, stderr = self.run(cmd, text, low_priority, abort, stdin_text)
+            if returncode != 0:
+                raise Exception(f'{self.title} failed: {stderr.decode()}')
+            audio_data = self.read_output(temp_file.name)
+            if measured:
+                # Real-time factor and overhead, for segment sizing
+                segment_sizing.timings.record(self.name, voice or self.default_voice,
+                                              len(text.split()), rate, time.time() - started,
+                                              segment_sizing.wav_seconds(audio_data))
+            return audio_data
+        finally:
+            if measured:
+                segment_sizing.timings.finished()
+            os.remove(temp_file.name)
+
+    def stream(self, text, rate=1.0, voice=None, speaker=None, low_priority=False, abort=None):
+        """
+        Yield the audio as WAV pieces as they become ready. Engines that
+        cannot render incrementally yield the whole utterance at once.
+        """
+        yield self.synthesize(text, rate, voice, speaker, low_priority, abort)
+
+    def run(self, cmd, text, low_priority=False, abort=None, stdin_text=None):
+        """
+        Run the engine process, killing it if abort() becomes true, and
+        account its CPU time. Returns (returncode, stderr_bytes).
+        """
+        with tracing.span('engine.process', engine=self.name, low_priority=low_priority) as trace_span:
+            try:
+                returncode, stderr, cpu_seconds = run_engine(niced(cmd, low_priority), stdin_text, abort)
+            except SynthesisCancelled as e:
+                cancellations.record_killed(self.name, len(text), e.cpu_seconds)
+                trace_span.set_attribute('cancelled', True)
+                raise
+            trace_span.set_attribute('returncode', returncode)
+            trace_span.set_attribute('cpu_seconds', round(cpu_seconds, 4))
+            if tracing.enabled() and self.timing_patterns:
+                log = stderr.decode('utf-8', 'replace')
+                for name, pattern in self.timing_patterns:
+                    match = pattern.search(log)
+                    if match:
+                        trace_span.set_attribute(name, float(match.group(1)))
+        cancellations.record_run(self.name, len(text), cpu_seconds)
+        return returncode, stderr
+
+    def read_output(self, path):
+        with tracing.span('disk.read_output'):
+            with open(path, 'rb') as f:
+                return f.read()
+
+    # ------------------------------------------------------------------------
+    # Voices
+    # ------------------------------------------------------------------------
+
+    def list_voices(self, refresh=False):
+        """Installed voices, probed at most once per VOICE_CATALOG_TTL"""
+        with self.catalog_lock:
+            if self.catalog and not refresh and time.time() - self.catalog[0] < VOICE_CATALOG_TTL:
+                return self.catalog[1]
+        voices = self.probe_voices() if self.available() else []
+        with self.catalog_lock:
+            self.catalog = (time.time(), voices)
+        return voices
+
+    def probe_voices(self):
+        return []
+
+    def warmup(self, voice=None):
+        """Load a voice and render a short utterance so the first request is fast"""
+        self.synthesize(WARMUP_TEXT, 1.0, voice, measured=False)
+
+def niced(cmd, low_priority):
+    """Prefix a command with `nice` so background work yields the CPU"""
+    if low_priority and NICE_AVAILABLE:
+        return [NICE_AVAILABLE, '-n', '10'] + cmd
+    return cmd
+
+# ============================================================================
+# ENGINES
+# ============================================================================
+
+class EspeakEngine(Engine):
+    name = 'espeak'
+    title = 'eSpeak'
+
+    def __init__(self):
+        super().__init__()
+        self.executable = shutil.which('espeak') or shutil.which('espeak-ng')
+
+    def available(self):
+        return self.executable is not None
+
+    def capabilities(self):
+        return dict(super().capabilities(), speakers=True)
+
+    def command(self, text, output, rate, voice, speaker):
+        cmd = [self.executable, '-w', output]
+
+        # Adjust speed (eSpeak uses words per minute, default ~175)
+        cmd.extend(['-s', str(int(175 * rate))])
+
+        # Set voice if provided; a speaker selects a voice variant (e.g. en+f3)
+        if speaker is not None:
+            cmd.extend(['-v', f'{voice or "en"}+{speaker}'])
+        elif voice:
+            cmd.extend(['-v', voice])
+
+        cmd.append(text)
+        return cmd, None
+
+    def probe_voices(self):
+        result = subprocess.run(
+            [self.executable, '--voices'],
+            capture_output=True,
+            text=True
+        )
+
+        voices = []
+        for line in result.stdout.split('\n')[1:]:  # Skip header
+            if line.strip():
+                parts = line.split()
+                if len(parts) >= 4:
+                    voices.append({
+                        'name': parts[3],
+                        'language': parts[1]
+                    })
+
+        return voices
+
+class PiperEngine(Engine):
+    name = 'piper'
+    title = 'Piper'
+    default_voice = DEFAULT_PIPER_VOICE
+    timing_patterns = [
+        ('piper.model_load_seconds', re.compile(r'Loaded voice in ([\d.]+) second')),
+        ('piper.infer_seconds', re.compile(r'infer=([\d.]+) sec')),
+        ('piper.audio_seconds', re.compile(r'audio=([\d.]+) sec')),
+    ]
+
+    # Where Piper models are looked for
+    model_dirs = [
+        Path.home() / '.local/share/piper/models',
+        Path('/usr/share/piper/models'),
+        Path('/usr/local/share/piper/models')
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self.executable = shutil.which('piper')
+
+    def available(self):
+        return self.executable is not None
+
+    def capabilities(self):
+        return dict(super().capabilities(), speakers=True)
+
+    def command(self, text, output, rate, voice, speaker):
+        cmd = [self.executable, '-f', output, '--model', voice or self.default_voice]
+
+        # Multi-speaker models pick the speaker by id
+        if speaker is not None:
+            cmd.extend(['--speaker', str(speaker)])
+
+        # Piper reads the text from stdin
+        return cmd, text
+
+    def probe_voices(self):
+        voices = []
+        for model_dir in self.model_dirs:
+            if model_dir.exists():
+                for model_file in model_dir.glob('**/*.onnx'):
+                    voices.append({
+                        'name': model_file.stem,
+                        'path': str(model_file)
+                    })
+        return voices
+
+    def warmup(self, voice=None):
+        self.preload_model_file(voice or self.default_voice)
+        super().warmup(voice)
+
+    def preload_model_file(self, voice):
+        """Map a model and its config so they stay in the page cache"""
+        for candidate in self.list_voices():
+            if voice in (candidate['name'], candidate['path']):
+                for path in (candidate['path'], candidate['path'] + '.json'):
+                    if os.path.exists(path):
+                        map_model_file(path)
+                return True
+        return False
+
+def map_model_file(path):
+    """
+    Map a model file read-only (once per process) and fault its pages in.
+    Returns the mapped size in bytes.
+    """
+    with model_maps_lock:
+        mapped = model_maps.get(path)
+        if mapped is None:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return 0
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_WILLNEED)
+            for offset in range(0, len(mapped), mmap.PAGESIZE):
+                mapped[offset]
+            model_maps[path] = mapped
+        return len(mapped)
+
+def mapped_models():
+    """Model files kept in the page cache and their sizes (reported by /health)"""
+    with model_maps_lock:
+        return {path: len(mapped) for path, mapped in model_maps.items()}
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+def register(engine):
+    """Make an engine available to every server by its name"""
+    ENGINES[engine.name] = engine
+    return engine
+
+def get_engine(name):
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise ValueError(f'Unknown engine: {name}')
+    return engine
+
+def default_engine():
+    """Name of the preferred installed engine (what 'auto' means)"""
+    for engine in ENGINES.values():
+        if engine.available():
+            return engine.name
+    return 'espeak'
+
+register(PiperEngine())
+register(EspeakEngine())
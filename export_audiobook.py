@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Offline Audiobook Export for Read Aloud
+Renders long documents to one chaptered audio file using the same engines
+as the server (engines.py), spread over a process pool.
+
+Usage:
+  python3 export_audiobook.py book/ notes.md saved_page.html -o out/book
+  python3 export_audiobook.py --urls reading_list.txt -o out/reading --engine piper
+
+Each input file (or URL) becomes a chapter. Work is kept in <output>.work/
+so an interrupted export resumes where it stopped.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html.parser import HTMLParser
+from pathlib import Path
+
+TEXT_SUFFIXES = {'.txt', '.md', '.markdown', '.rst'}
+HTML_SUFFIXES = {'.html', '.htm', '.xhtml'}
+
+# Segments are cut at sentence boundaries below this many characters
+MAX_SEGMENT_CHARS = 600
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+PARAGRAPH_RE = re.compile(r'\n\s*\n')
+
+# ============================================================================
+# INPUTS
+# ============================================================================
+
+class TextExtractor(HTMLParser):
+    """Visible text of an HTML page, paragraph-separated, plus its title"""
+
+    SKIP = {'script', 'style', 'nav', 'header', 'footer', 'aside', 'noscript', 'svg'}
+    BLOCKS = {'p', 'div', 'section', 'article', 'li', 'br', 'h1', 'h2', 'h3',
+              'h4', 'h5', 'h6', 'blockquote', 'pre', 'tr'}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.skipping = 0
+        self.title = ''
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag == 'title':
+            self.in_title = True
+        elif tag in self.BLOCKS:
+            self.parts.append('\n\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+        elif tag == 'title':
+            self.in_title = False
+        elif tag in self.BLOCKS:
+            self.parts.append('\n\n')
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        elif not self.skipping:
+            self.parts.append(data)
+
+    def text(self):
+        return ''.join(self.parts)
+
+def read_document(path):
+    """Return (title, text) for a text or HTML file"""
+    raw = Path(path).read_text(encoding='utf-8', errors='replace')
+    if Path(path).suffix.lower() in HTML_SUFFIXES:
+        extractor = TextExtractor()
+        extractor.feed(raw)
+        return extractor.title.strip() or Path(path).stem, extractor.text()
+    return Path(path).stem.replace('_', ' '), raw
+
+def fetch_urls(list_file, work_dir):
+    """Download each URL in list_file once into work_dir/pages; returns local paths"""
+    pages_dir = work_dir / 'pages'
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for line in Path(list_file).read_text().splitlines():
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        target = pages_dir / (hashlib.sha1(url.encode()).hexdigest()[:16] + '.html')
+        if not target.exists():
+            print(f"Fetching {url}")
+            with urllib.request.urlopen(url, timeout=30) as response:
+                target.write_bytes(response.read())
+        paths.append(target)
+    return paths
+
+def collect_inputs(inputs):
+    """Expand directories into the text and HTML files they contain, in order"""
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*')
+                                if p.suffix.lower() in TEXT_SUFFIXES | HTML_SUFFIXES))
+        elif path.exists():
+            files.append(path)
+        else:
+            raise SystemExit(f"Input not found: {item}")
+    return files
+
+def segment_text(text, max_chars=MAX_SEGMENT_CHARS):
+    """Split text into paragraph-aligned segments of at most max_chars (sentence cuts)"""
+    segments = []
+    for paragraph in PARAGRAPH_RE.split(text):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        current = ''
+        for sentence in SENTENCE_END_RE.split(paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                segments.append(current)
+                current = ''
+            current = f'{current} {sentence}' if current else sentence
+            # A single over-long sentence is cut at word boundaries
+            while len(current) > max_chars:
+                cut = current.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                segments.append(current[:cut])
+                current = current[cut:].lstrip()
+        if current:
+            segments.append(current)
+    return segments
+
+# ============================================================================
+# RENDERING (runs in worker processes)
+# ============================================================================
+
+def render_segment(job):
+    """Synthesize one segment to its WAV file; returns (index, seconds_of_audio, cpu_seconds)"""
+    import engines
+    from text_normalizer import normalize_text
+
+    index, text, target, engine, rate, voice = job
+    started = os.times()
+    spoken, _ = normalize_text(text, {'expand_numbers': True, 'expand_abbreviations': True})
+    if engine == 'auto':
+        engine = engines.default_engine()
+    audio_data = engines.get_engine(engine).synthesize(spoken or '.', rate, voice)
+
+    # Write then rename, so an interrupted export never leaves a partial segment
+    partial = target + '.part'
+    with open(partial, 'wb') as f:
+        f.write(audio_data)
+    os.replace(partial, target)
+
+    # CPU used by this worker plus the engine process it ran
+    finished = os.times()
+    cpu = sum(finished[:4]) - sum(started[:4])
+    return index, wav_duration(target), cpu
+
+def wav_duration(path):
+    with wave.open(path, 'rb') as wav:
+        return wav.getnframes() / wav.getframerate()
+
+# ============================================================================
+# ASSEMBLY
+# ============================================================================
+
+def assemble(plan, output, audio_format):
+    """Concatenate segment WAVs into one file and write the chapter/timing index"""
+    wav_path = output.with_suffix('.wav')
+    params = None
+    index = {'chapters': []}
+    position = 0.0
+    with wave.open(str(wav_path), 'wb') as out:
+        for chapter in plan['chapters']:
+            entry = {'title': chapter['title'], 'source': chapter['source'],
+                     'start': round(position, 3), 'segments': []}
+            for segment in chapter['segments']:
+                with wave.open(segment['file'], 'rb') as wav:
+                    if params is None:
+                        params = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+                        out.setnchannels(params[0])
+                        out.setsampwidth(params[1])
+                        out.setframerate(params[2])
+                    elif (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != params:
+                        raise SystemExit(f"Segment {segment['file']} has a different audio "
+                                         "format; export each voice separately")
+                    frames = wav.readframes(wav.getnframes())
+                    duration = wav.getnframes() / wav.getframerate()
+                out.writeframes(frames)
+                entry['segments'].append({'start': round(position, 3),
+                                          'end': round(position + duration, 3),
+                                          'text': segment['text']})
+                position += duration
+            entry['end'] = round(position, 3)
+            index['chapters'].append(entry)
+    index['duration'] = round(position, 3)
+
+    output.with_suffix('.index.json').write_text(json.dumps(index, indent=2))
+
+    # FFMETADATA chapters, usable with: ffmpeg -i book.wav -i book.chapters.txt -map_metadata 1 ...
+    lines = [';FFMETADATA1']
+    for chapter in index['chapters']:
+        lines += ['[CHAPTER]', 'TIMEBASE=1/1000',
+                  f"START={int(chapter['start'] * 1000)}", f"END={int(chapter['end'] * 1000)}",
+                  f"title={chapter['title']}"]
+    chapters_path = output.with_suffix('.chapters.txt')
+    chapters_path.write_text('\n'.join(lines) + '\n')
+
+    if audio_format == 'm4b':
+        ffmpeg = shutil.which('ffmpeg')
+        if not ffmpeg:
+            raise SystemExit("ffmpeg not found; the WAV and chapter file are in place")
+        m4b_path = output.with_suffix('.m4b')
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-i', str(wav_path),
+                        '-i', str(chapters_path), '-map_metadata', '1', '-c:a', 'aac',
+                        '-b:a', '64k', str(m4b_path)], check=True)
+        wav_path.unlink()
+        return m4b_path
+    return wav_path
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def build_plan(files, work_dir, engine, rate, voice, max_chars):
+    """Chapters and segments for this export, reused from work_dir when unchanged"""
+    settings = {'engine': engine, 'rate': rate, 'voice': voice, 'max_chars': max_chars}
+    plan_path = work_dir / 'plan.json'
+    chapters = []
+    for number, path in enumerate(files):
+        title, text = read_document(path)
+        segments = []
+        for i, segment in enumerate(segment_text(text, max_chars)):
+            digest = hashlib.sha1(json.dumps([settings, segment]).encode()).hexdigest()[:12]
+            # Name by content so a changed input re-renders only what changed
+            file = work_dir / 'segments' / f'{number:04d}-{i:05d}-{digest}.wav'
+            segments.append({'text': segment, 'file': str(file)})
+        chapters.append({'title': title, 'source': str(path), 'segments': segments})
+    plan = {'settings': settings, 'chapters': chapters}
+    plan_path.write_text(json.dumps(plan, indent=2))
+    return plan
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Export documents to a chaptered audiobook')
+    parser.add_argument('inputs', nargs='*', help='text/markdown/HTML files or directories')
+    parser.add_argument('--urls', help='file listing URLs (one per line) to fetch and include')
+    parser.add_argument('-o', '--output', required=True, help='output path without extension')
+    parser.add_argument('--engine', default='auto', choices=['auto', 'piper', 'espeak'])
+    parser.add_argument('--voice', default=None)
+    parser.add_argument('--rate', type=float, default=1.0)
+    parser.add_argument('--format', default='wav', choices=['wav', 'm4b'],
+                        help='m4b embeds chapters (needs ffmpeg)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--max-chars', type=int, default=MAX_SEGMENT_CHARS)
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(str(output) + '.work')
+    (work_dir / 'segments').mkdir(parents=True, exist_ok=True)
+
+    files = collect_inputs(args.inputs)
+    if args.urls:
+        files += fetch_urls(args.urls, work_dir)
+    if not files:
+        parser.error('no input documents')
+
+    plan = build_plan(files, work_dir, args.engine, args.rate, args.voice, args.max_chars)
+    segments = [s for chapter in plan['chapters'] for s in chapter['segments']]
+    pending = [(i, s['text'], s['file'], args.engine, args.rate, args.voice)
+               for i, s in enumerate(segments) if not os.path.exists(s['file'])]
+
+    total_chars = sum(len(s['text']) for s in segments)
+    print("Read Aloud - Audiobook Export")
+    print("=" * 50)
+    print(f"Chapters: {len(plan['chapters'])}  Segments: {len(segments)}  Characters: {total_chars}")
+    if len(pending) < len(segments):
+        print(f"Resuming: {len(segments) - len(pending)} segments already rendered")
+    print(f"Workers: {args.jobs}")
+    print("=" * 50)
+
+    started = time.time()
+    audio_seconds = 0.0
+    cpu_seconds = 0.0
+    chars_done = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(render_segment, job): job for job in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            job = futures[future]
+            try:
+                _, duration, cpu = future.result()
+            except Exception as e:
+                pool.shutdown(cancel_futures=True)
+                sys.exit(f"\nSegment {job[0]} failed: {e}\nRe-run the same command to resume.")
+            audio_seconds += duration
+            cpu_seconds += cpu
+            chars_done += len(job[1])
+            elapsed = time.time() - started
+            eta = elapsed / done * (len(pending) - done)
+            print(f"\r[{done}/{len(pending)}] {done * 100 // len(pending)}%  "
+                  f"{chars_done / elapsed:.0f} chars/s  "
+                  f"{audio_seconds / elapsed:.1f}x realtime  "
+                  f"ETA {format_seconds(eta)}", end='', flush=True)
+    if pending:
+        print()
+
+    result = assemble(plan, output, args.format)
+    elapsed = time.time() - started
+    print(f"\nWrote {result} ({output.with_suffix('.index.json').name}, "
+          f"{output.with_suffix('.chapters.txt').name})")
+    print(f"Rendered {len(pending)} segments in {format_seconds(elapsed)} "
+          f"({cpu_seconds:.0f} CPU seconds)")
+
+if __name__ == '__main__':
+    main()
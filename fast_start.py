@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Fast Start for Read Aloud TTS
+When a reader starts or seeks, the first chunk is the only one anybody
+waits for. With "fast_start" the server answers with just its first
+sentence - Piper audio if that is already cached, otherwise an eSpeak
+rendering, which takes milliseconds - and renders the rest with the
+requested engine in the background, so the client's follow-up request for
+the remaining words is ready (or joins the render) by the time the first
+sentence has been spoken. The voice changes at that sentence boundary.
+
+Time to first audio (request received -> audio ready, for chunks that
+start playback) is recorded here for /metrics.
+"""
+
+import re
+import threading
+from collections import deque
+
+# Engine for the first sentence when no cached audio exists
+FAST_START_ENGINE = 'espeak'
+
+# Shorter first "sentences" (abbreviations, list numbers) are read on
+FIRST_SENTENCE_MIN_WORDS = 3
+
+# Time-to-first-audio samples kept per mode for the percentiles
+FIRST_AUDIO_SAMPLES = 256
+
+# A word ending a sentence: terminal punctuation, then optional closing quotes/brackets
+SENTENCE_END_RE = re.compile(r'[.!?…]+["\'”’)\]]*$')
+
+def split_first_sentence(text):
+    """
+    (first_sentence, rest, first_word_count) split on whitespace, or None
+    when the text is a single sentence. Word counts follow str.split(), as
+    the extension counts them.
+    """
+    words = text.split()
+    for index, word in enumerate(words[:-1]):
+        if index + 1 >= FIRST_SENTENCE_MIN_WORDS and SENTENCE_END_RE.search(word):
+            return ' '.join(words[:index + 1]), ' '.join(words[index + 1:]), index + 1
+    return None
+
+class FirstAudioStats:
+    """Time to first audio, by how the first chunk was produced"""
+
+    # 'fast_start': first sentence only, 'cached': whole chunk was at hand,
+    # 'full': whole chunk rendered while the reader waited
+    MODES = ('fast_start', 'cached', 'full')
+
+    def __init__(self, samples=FIRST_AUDIO_SAMPLES):
+        self.samples = {mode: deque(maxlen=samples) for mode in self.MODES}
+        self.counts = dict.fromkeys(self.MODES, 0)
+        self.lock = threading.Lock()
+
+    def record(self, mode, seconds):
+        with self.lock:
+            self.samples[mode].append(seconds * 1000)
+            self.counts[mode] += 1
+
+    def get_stats(self):
+        with self.lock:
+            samples = {mode: sorted(values) for mode, values in self.samples.items()}
+            counts = dict(self.counts)
+        stats = {}
+        for mode in self.MODES:
+            values = samples[mode]
+            stats[mode] = {'count': counts[mode]}
+            if values:
+                stats[mode].update(
+                    avg_ms=round(sum(values) / len(values), 1),
+                    p50_ms=round(values[len(values) // 2], 1),
+                    p95_ms=round(values[min(len(values) - 1, int(len(values) * 0.95))], 1))
+        return stats
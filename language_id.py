@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Language Identification for Read Aloud TTS
+A small character n-gram model (built once from the seed texts below) and a
+language -> best installed voice index, so automatic engine selection can
+pick a voice that matches the page language
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Only the start of a text is needed to tell its language
+MAX_CHARS = 600
+MIN_CHARS = 20
+NGRAM_ORDERS = (1, 2, 3)
+
+# Average per-n-gram log-probability lead the winner needs over the runner-up
+MIN_MARGIN = 0.04
+
+# Seed texts: the opening articles of the Universal Declaration of Human
+# Rights plus one everyday sentence per language
+SEED_TEXTS = {
+    'en': "All human beings are born free and equal in dignity and rights. They are "
+          "endowed with reason and conscience and should act towards one another in a "
+          "spirit of brotherhood. Everyone is entitled to all the rights and freedoms set "
+          "forth in this Declaration, without distinction of any kind, such as race, "
+          "colour, sex, language, religion, political or other opinion, national or social "
+          "origin, property, birth or other status. Everyone has the right to life, liberty "
+          "and security of person. The weather was nice this morning, so we went for a walk "
+          "through the old town and had a coffee with our friends before going back to work.",
+    'de': "Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit "
+          "Vernunft und Gewissen begabt und sollen einander im Geist der Brüderlichkeit "
+          "begegnen. Jeder hat Anspruch auf alle in dieser Erklärung verkündeten Rechte und "
+          "Freiheiten, ohne irgendeinen Unterschied, etwa nach Rasse, Hautfarbe, Geschlecht, "
+          "Sprache, Religion, politischer oder sonstiger Überzeugung, nationaler oder "
+          "sozialer Herkunft, Vermögen, Geburt oder sonstigem Stand. Jeder hat das Recht auf "
+          "Leben, Freiheit und Sicherheit der Person. Das Wetter war heute Morgen schön, "
+          "deshalb sind wir durch die Altstadt spaziert und haben mit unseren Freunden einen "
+          "Kaffee getrunken, bevor wir wieder zur Arbeit gegangen sind.",
+    'fr': "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils "
+          "sont doués de raison et de conscience et doivent agir les uns envers les autres "
+          "dans un esprit de fraternité. Chacun peut se prévaloir de tous les droits et de "
+          "toutes les libertés proclamés dans la présente Déclaration, sans distinction "
+          "aucune, notamment de race, de couleur, de sexe, de langue, de religion, d'opinion "
+          "politique ou de toute autre opinion, d'origine nationale ou sociale, de fortune, "
+          "de naissance ou de toute autre situation. Tout individu a droit à la vie, à la "
+          "liberté et à la sûreté de sa personne. Il faisait beau ce matin, alors nous nous "
+          "sommes promenés dans la vieille ville et nous avons pris un café avec nos amis "
+          "avant de retourner au travail.",
+    'es': "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, "
+          "dotados como están de razón y conciencia, deben comportarse fraternalmente los "
+          "unos con los otros. Toda persona tiene todos los derechos y libertades "
+          "proclamados en esta Declaración, sin distinción alguna de raza, color, sexo, "
+          "idioma, religión, opinión política o de cualquier otra índole, origen nacional o "
+          "social, posición económica, nacimiento o cualquier otra condición. Todo individuo "
+          "tiene derecho a la vida, a la libertad y a la seguridad de su persona. Esta mañana "
+          "hacía buen tiempo, así que dimos un paseo por el casco antiguo y tomamos un café "
+          "con nuestros amigos antes de volver al trabajo.",
+    'it': "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono "
+          "dotati di ragione e di coscienza e devono agire gli uni verso gli altri in "
+          "spirito di fratellanza. Ad ogni individuo spettano tutti i diritti e tutte le "
+          "libertà enunciate nella presente Dichiarazione, senza distinzione alcuna, per "
+          "ragioni di razza, di colore, di sesso, di lingua, di religione, di opinione "
+          "politica o di altro genere, di origine nazionale o sociale, di ricchezza, di "
+          "nascita o di altra condizione. Ogni individuo ha diritto alla vita, alla libertà "
+          "ed alla sicurezza della propria persona. Stamattina il tempo era bello, così "
+          "abbiamo fatto una passeggiata nel centro storico e abbiamo preso un caffè con i "
+          "nostri amici prima di tornare al lavoro.",
+    'pt': "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. "
+          "Dotados de razão e de consciência, devem agir uns para com os outros em espírito "
+          "de fraternidade. Todos os seres humanos podem invocar os direitos e as liberdades "
+          "proclamados na presente Declaração, sem distinção alguma, nomeadamente de raça, "
+          "de cor, de sexo, de língua, de religião, de opinião política ou outra, de origem "
+          "nacional ou social, de fortuna, de nascimento ou de qualquer outra situação. Todo "
+          "o indivíduo tem direito à vida, à liberdade e à segurança pessoal. Hoje de manhã "
+          "o tempo estava bom, então fomos dar um passeio pela cidade velha e tomámos um "
+          "café com os nossos amigos antes de voltar ao trabalho.",
+    'nl': "Alle mensen worden vrij en gelijk in waardigheid en rechten geboren. Zij zijn "
+          "begiftigd met verstand en geweten, en behoren zich jegens elkander in een geest "
+          "van broederschap te gedragen. Een ieder heeft aanspraak op alle rechten en "
+          "vrijheden, in deze Verklaring opgesomd, zonder enig onderscheid van welke aard "
+          "ook, zoals ras, kleur, geslacht, taal, godsdienst, politieke of andere "
+          "overtuiging, nationale of maatschappelijke afkomst, eigendom, geboorte of andere "
+          "status. Een ieder heeft het recht op leven, vrijheid en onschendbaarheid van zijn "
+          "persoon. Vanochtend was het mooi weer, dus hebben we een wandeling door de oude "
+          "stad gemaakt en met onze vrienden koffie gedronken voordat we weer aan het werk "
+          "gingen.",
+    'sv': "Alla människor är födda fria och lika i värde och rättigheter. De är utrustade "
+          "med förnuft och samvete och bör handla gentemot varandra i en anda av "
+          "broderskap. Var och en är berättigad till alla de fri- och rättigheter som "
+          "uttalas i denna förklaring utan åtskillnad av något slag, såsom ras, hudfärg, "
+          "kön, språk, religion, politisk eller annan uppfattning, nationellt eller socialt "
+          "ursprung, egendom, börd eller ställning i övrigt. Var och en har rätt till liv, "
+          "frihet och personlig säkerhet. I morse var det fint väder, så vi tog en promenad "
+          "genom gamla stan och drack kaffe med våra vänner innan vi gick tillbaka till "
+          "jobbet.",
+    'pl': "Wszyscy ludzie rodzą się wolni i równi pod względem swej godności i swych praw. "
+          "Są oni obdarzeni rozumem i sumieniem i powinni postępować wobec innych w duchu "
+          "braterstwa. Każdy człowiek posiada wszystkie prawa i wolności zawarte w "
+          "niniejszej Deklaracji bez względu na jakiekolwiek różnice rasy, koloru skóry, "
+          "płci, języka, wyznania, poglądów politycznych i innych, narodowości, pochodzenia "
+          "społecznego, majątku, urodzenia lub jakiegokolwiek innego stanu. Każdy człowiek "
+          "ma prawo do życia, wolności i bezpieczeństwa swej osoby. Dziś rano była ładna "
+          "pogoda, więc poszliśmy na spacer po starym mieście i wypiliśmy kawę z "
+          "przyjaciółmi, zanim wróciliśmy do pracy.",
+    'fi': "Kaikki ihmiset syntyvät vapaina ja tasavertaisina arvoltaan ja oikeuksiltaan. "
+          "Heille on annettu järki ja omatunto, ja heidän on toimittava toisiaan kohtaan "
+          "veljeyden hengessä. Jokainen on oikeutettu kaikkiin tässä julistuksessa "
+          "esitettyihin oikeuksiin ja vapauksiin ilman minkäänlaista rotuun, väriin, "
+          "sukupuoleen, kieleen, uskontoon, poliittiseen tai muuhun mielipiteeseen, "
+          "kansalliseen tai yhteiskunnalliseen alkuperään, omaisuuteen, syntyperään tai "
+          "muuhun tekijään perustuvaa erotusta. Jokaisella on oikeus elämään, vapauteen ja "
+          "henkilökohtaiseen turvallisuuteen. Tänä aamuna oli kaunis sää, joten kävelimme "
+          "vanhassa kaupungissa ja joimme kahvia ystäviemme kanssa ennen kuin palasimme "
+          "töihin.",
+}
+
+# Frequent function words: in a short text they say more than its n-grams
+FUNCTION_WORDS = {
+    'en': "the of and to in is that it was for on are with as his they be at this "
+          "have from or by not but what all were we when your can there",
+    'de': "der die das und ist nicht ein eine zu den von mit sich des auf für im "
+          "dem sie es ich auch wir bei aus nach wie",
+    'fr': "le la les et est un une des du que qui dans pour pas sur au avec ce "
+          "je suis il elle nous vous ma mon sont mais",
+    'es': "el la los las y es un una que de en por para con no se del al lo "
+          "como pero su sus yo estoy fue muy",
+    'it': "il lo la gli le e è un una che di non per con del della sono ma "
+          "questo come nel alla io ho anche",
+    'pt': "o a os as e é um uma que de não para com do da em no na se por "
+          "mas eu estou foi muito",
+    'nl': "de het een en is van niet dat op te in met zijn voor ik je hij we "
+          "maar ook als er",
+    'sv': "och det att är en ett som på för med inte jag han hon vi av till "
+          "den de var men om",
+    'pl': "i w nie na się z do jest że to jak ale co po są tak jestem czy",
+    'fi': "ja on ei se että oli kun hän mutta myös ovat tämä minä olen ole",
+}
+FUNCTION_WORD_SETS = {lang: set(words.split()) for lang, words in FUNCTION_WORDS.items()}
+
+# Function-word hits that decide a text on their own (with twice the runner-up's)
+MIN_FUNCTION_WORDS = 3
+
+# Scripts used by one language (or told apart by a few letters)
+SCRIPT_RANGES = [
+    ('Ͱ', 'Ͽ', 'el'),
+    ('Ѐ', 'ӿ', 'ru'),
+    ('֐', '׿', 'he'),
+    ('؀', 'ۿ', 'ar'),
+    ('ऀ', 'ॿ', 'hi'),
+    ('฀', '๿', 'th'),
+    ('぀', 'ヿ', 'ja'),  # Kana
+    ('一', '鿿', 'zh'),  # Han (also used in Japanese)
+    ('가', '힯', 'ko'),
+]
+UKRAINIAN_LETTERS = set('іїєґ')
+PERSIAN_LETTERS = set('پچژگ')
+
+NON_LETTERS_RE = re.compile(r"[^\w']+|[\d_]+")
+
+# ============================================================================
+# MODEL
+# ============================================================================
+
+class NgramModel:
+    """Naive Bayes over character 1-3 grams with add-one smoothing"""
+
+    def __init__(self, texts):
+        self.languages = sorted(texts)
+        self.log_probs = {}  # ngram -> [log P(ngram | language) for each language]
+        self.unseen = []  # log P of an unseen n-gram, per language
+        counts = {lang: Counter(ngrams(text)) for lang, text in texts.items()}
+        vocabulary = set()
+        for counter in counts.values():
+            vocabulary.update(counter)
+        for lang in self.languages:
+            total = sum(counts[lang].values()) + len(vocabulary)
+            self.unseen.append(math.log(1.0 / total))
+        for gram in vocabulary:
+            self.log_probs[gram] = [math.log(counts[lang][gram] + 1.0) + unseen
+                                    for lang, unseen in zip(self.languages, self.unseen)]
+
+    def scores(self, text):
+        """Average log-probability per n-gram for each language"""
+        grams = ngrams(text)
+        totals = [0.0] * len(self.languages)
+        for gram in grams:
+            row = self.log_probs.get(gram)
+            if row is None:
+                continue  # Seen in no language: no evidence either way
+            for i, value in enumerate(row):
+                totals[i] += value
+        count = max(1, len(grams))
+        return {lang: total / count for lang, total in zip(self.languages, totals)}
+
+def clean(text):
+    text = unicodedata.normalize('NFC', text[:MAX_CHARS].lower())
+    return ' '.join(NON_LETTERS_RE.sub(' ', text).split())
+
+def ngrams(text):
+    text = f' {clean(text)} '
+    grams = []
+    for n in NGRAM_ORDERS:
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """The n-gram model, built on first use"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = NgramModel(SEED_TEXTS)
+        return _model
+
+def detect_script(text):
+    """Language implied by a non-Latin script, if most letters use one"""
+    counts = Counter()
+    letters = 0
+    for char in text[:MAX_CHARS]:
+        if not char.isalpha():
+            continue
+        letters += 1
+        for start, end, lang in SCRIPT_RANGES:
+            if start <= char <= end:
+                counts[lang] += 1
+                break
+    if not counts or sum(counts.values()) * 2 < letters:
+        return None
+    if counts['ja']:
+        return 'ja'  # Kana marks Japanese even when Han characters dominate
+    lang = counts.most_common(1)[0][0]
+    if lang == 'ru' and UKRAINIAN_LETTERS & set(text[:MAX_CHARS].lower()):
+        return 'uk'
+    if lang == 'ar' and PERSIAN_LETTERS & set(text[:MAX_CHARS]):
+        return 'fa'
+    return lang
+
+def detect_function_words(text):
+    """(language, confidence) from function words, or (None, 0.0)"""
+    words = clean(text).split()
+    hits = sorted(((sum(word in vocabulary for word in words), lang)
+                   for lang, vocabulary in FUNCTION_WORD_SETS.items()), reverse=True)
+    (best, lang), (runner_up, _) = hits[0], hits[1]
+    if best < MIN_FUNCTION_WORDS or best < 2 * runner_up:
+        return None, 0.0
+    return lang, round(min(1.0, (best - runner_up) / (2 * MIN_FUNCTION_WORDS)), 3)
+
+def detect_language(text):
+    """
+    Return (language, confidence) for text, or (None, 0.0) when it is too
+    short or too ambiguous to call
+    """
+    lang = detect_script(text)
+    if lang:
+        return lang, 1.0
+    if len(clean(text)) < MIN_CHARS:
+        return None, 0.0
+    ranked = sorted(get_model().scores(text).items(), key=lambda item: item[1], reverse=True)
+    margin = ranked[0][1] - ranked[1][1]
+    ngram_confidence = round(min(1.0, margin / (4 * MIN_MARGIN)), 3) if margin >= MIN_MARGIN else 0.0
+    # Function words overrule n-grams that disagree or can't tell
+    lang, confidence = detect_function_words(text)
+    if lang:
+        return lang, max(confidence, ngram_confidence) if lang == ranked[0][0] else confidence
+    if not ngram_confidence:
+        return None, 0.0
+    return ranked[0][0], ngram_confidence
+
+# ============================================================================
+# VOICE INDEX
+# ============================================================================
+
+# Piper model quality suffixes, best first
+PIPER_QUALITIES = ['high', 'medium', 'low', 'x_low']
+
+# eSpeak names some languages differently
+ESPEAK_ALIASES = {'zh': 'cmn'}
+
+class VoiceIndex:
+    """Best installed Piper model and eSpeak voice per language"""
+
+    def __init__(self, piper_voices=(), espeak_voices=(), preferred=()):
+        self.piper = {}  # 'de' / 'de-de' -> model name
+        self.espeak = {}  # 'de' / 'en-us' -> eSpeak voice
+        preferred = set(preferred)
+
+        def rank(name):
+            quality = name.rsplit('-', 1)[-1]
+            order = PIPER_QUALITIES.index(quality) if quality in PIPER_QUALITIES else len(PIPER_QUALITIES)
+            return (name not in preferred, order, name)
+
+        for name in sorted((v['name'] for v in piper_voices), key=rank):
+            locale = name.split('-')[0].replace('_', '-').lower()
+            for key in (locale, locale.split('-')[0]):
+                self.piper.setdefault(key, name)
+
+        for voice in espeak_voices:
+            code = voice['language'].lower()
+            for key in (code, code.split('-')[0]):
+                self.espeak.setdefault(key, code)
+        for lang, alias in ESPEAK_ALIASES.items():
+            if alias in self.espeak:
+                self.espeak.setdefault(lang, self.espeak[alias])
+
+    def lookup(self, lang, engine=None):
+        """
+        (engine, voice) for a language tag, preferring `engine` when it has a
+        voice for it; None when nothing installed speaks the language
+        """
+        lang = lang.replace('_', '-').lower()
+        candidates = [('piper', self.piper), ('espeak', self.espeak)]
+        if engine == 'espeak':
+            candidates.reverse()
+        for name, table in candidates:
+            for key in (lang, lang.split('-')[0]):
+                if key in table:
+                    return name, table[key]
+        return None
+
+    def languages(self):
+        return sorted(set(self.piper) | set(self.espeak))
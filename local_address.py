@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Advertised Addresses for Read Aloud casting
+Works out which local address a cast device can reach this server on, once
+per device, and remembers it until the host's interfaces or routes change.
+The answer is the source address the kernel would route from to that
+device, so multi-homed hosts (Wi-Fi plus Ethernet, VPNs, docker bridges)
+advertise the right interface and offline hosts still work on the LAN.
+"""
+
+import socket
+import threading
+import time
+
+# Without change notifications (non-Linux), cached addresses expire after this
+ADDRESS_TTL = 60
+
+# Used when the device is unreachable from every interface
+FALLBACK_ADDRESS = '127.0.0.1'
+
+# rtnetlink multicast groups: link up/down, address and route changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+class AddressResolver:
+    """Per-device cache of the local address to put in media URLs"""
+
+    def __init__(self, ttl=ADDRESS_TTL):
+        self.ttl = ttl
+        self.addresses = {}  # device host -> (resolved_at, local address)
+        self.lock = threading.Lock()
+        self.watching = False  # True while change notifications arrive
+        self.stats = {'resolved': 0, 'cached': 0, 'invalidated': 0}
+
+    def address_for(self, host):
+        """Local address the device at `host` reaches us on"""
+        with self.lock:
+            cached = self.addresses.get(host)
+            if cached and (self.watching or time.time() - cached[0] < self.ttl):
+                self.stats['cached'] += 1
+                return cached[1]
+        address = route_source(host)
+        with self.lock:
+            self.addresses[host] = (time.time(), address)
+            self.stats['resolved'] += 1
+        return address
+
+    def prime(self, hosts):
+        """Resolve newly discovered devices ahead of the first cast"""
+        for host in hosts:
+            with self.lock:
+                known = host in self.addresses
+            if not known:
+                self.address_for(host)
+
+    def invalidate(self):
+        with self.lock:
+            if self.addresses:
+                self.addresses.clear()
+                self.stats['invalidated'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['devices'] = {host: address for host, (_, address) in self.addresses.items()}
+            stats['watching'] = self.watching
+        return stats
+
+    # ------------------------------------------------------------------------
+    # Interface change events
+    # ------------------------------------------------------------------------
+
+    def start_watching(self):
+        """
+        Drop cached addresses whenever links, addresses or routes change
+        (rtnetlink, Linux only). Elsewhere entries expire after `ttl`.
+        """
+        if self.watching or not hasattr(socket, 'AF_NETLINK'):
+            return False
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE
+                          | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+        except OSError as e:
+            print(f"Interface change notifications unavailable: {e}")
+            return False
+        self.watching = True
+        threading.Thread(target=self._watch, args=(sock,), daemon=True).start()
+        return True
+
+    def _watch(self, sock):
+        try:
+            while True:
+                sock.recv(65536)
+                self.invalidate()
+        except OSError as e:
+            print(f"Interface watcher stopped: {e}")
+        finally:
+            self.watching = False
+            sock.close()
+
+def route_source(host):
+    """
+    Source address of the route to `host`. Connecting a UDP socket only
+    asks the kernel for a route; no packet is sent.
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as s:
+            s.connect((host, 9))
+            return s.getsockname()[0]
+    except OSError:
+        return FALLBACK_ADDRESS
+
+def url_host(address):
+    """An address as the host part of a URL: IPv6 in brackets, its zone escaped"""
+    if ':' in address:
+        return '[' + address.replace('%', '%25') + ']'
+    return address
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Multi-Voice Documents for Read Aloud TTS
+Parses an SSML subset or JSON spans into a flat list of spans, each with its
+own voice, language, speaker and rate, and joins the rendered audio into one
+WAV with a timing index
+"""
+
+import io
+import re
+import wave
+import xml.etree.ElementTree as ET
+
+# Keys a JSON span may carry besides its text
+SPAN_KEYS = ('text', 'voice', 'engine', 'lang', 'speaker', 'rate', 'break_ms')
+
+# Longest pause a <break> may request
+MAX_BREAK_MS = 10000
+
+BREAK_STRENGTHS = {
+    'none': 0, 'x-weak': 100, 'weak': 200, 'medium': 400,
+    'strong': 700, 'x-strong': 1200,
+}
+
+PROSODY_RATES = {
+    'x-slow': 0.5, 'slow': 0.75, 'medium': 1.0, 'fast': 1.25, 'x-fast': 1.5,
+}
+
+TIME_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s)\s*$')
+
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+# ============================================================================
+# PARSING
+# ============================================================================
+
+def parse_spans(spans):
+    """Validate JSON spans: [{"text": ..., "voice"/"lang"/"speaker"/...}, ...]"""
+    if not isinstance(spans, list) or not spans:
+        raise ValueError('spans must be a non-empty list')
+    result = []
+    for span in spans:
+        if not isinstance(span, dict):
+            raise ValueError('Each span must be an object')
+        unknown = set(span) - set(SPAN_KEYS)
+        if unknown:
+            raise ValueError(f'Unknown span field: {sorted(unknown)[0]}')
+        if 'break_ms' in span:
+            result.append({'break_ms': _clamp_break(span['break_ms'])})
+        elif span.get('text'):
+            result.append(dict(span))
+    return result
+
+def parse_ssml(markup):
+    """
+    Flatten an SSML subset into spans. Supported: <speak>, <voice name=...
+    speaker=...>, <lang xml:lang=...>, any element's xml:lang, <prosody
+    rate=...>, <break time=... strength=...>, <p>/<s> (sentence pauses)
+    """
+    try:
+        root = ET.fromstring(markup)
+    except ET.ParseError as e:
+        raise ValueError(f'Invalid SSML: {e}')
+    if _local_name(root.tag) != 'speak':
+        raise ValueError('SSML must have a <speak> root element')
+
+    spans = []
+    _walk(root, {}, spans)
+    return merge_spans(spans)
+
+def _walk(element, inherited, spans):
+    settings = dict(inherited)
+    tag = _local_name(element.tag)
+    if element.get(XML_LANG):
+        settings['lang'] = element.get(XML_LANG)
+    if tag == 'voice':
+        if element.get('name'):
+            settings['voice'] = element.get('name')
+            settings.pop('speaker', None)
+        if element.get('speaker'):
+            settings['speaker'] = element.get('speaker')
+        if element.get('engine'):
+            settings['engine'] = element.get('engine')
+    elif tag == 'prosody' and element.get('rate'):
+        settings['rate'] = _prosody_rate(element.get('rate'), settings.get('rate', 1.0))
+    elif tag == 'break':
+        if element.get('time'):
+            spans.append({'break_ms': _parse_time(element.get('time'))})
+        else:
+            spans.append({'break_ms': BREAK_STRENGTHS.get(element.get('strength', 'medium'), 400)})
+
+    _add_text(element.text, settings, spans)
+    for child in element:
+        _walk(child, settings, spans)
+        _add_text(child.tail, settings, spans)
+    if tag in ('p', 's'):
+        spans.append({'break_ms': BREAK_STRENGTHS['strong' if tag == 'p' else 'weak']})
+
+def _add_text(text, settings, spans):
+    if text and text.strip():
+        spans.append(dict(settings, text=' '.join(text.split())))
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _parse_time(value):
+    match = TIME_RE.match(value)
+    if not match:
+        raise ValueError(f'Invalid break time: {value}')
+    amount = float(match.group(1))
+    return _clamp_break(amount * 1000 if match.group(2) == 's' else amount)
+
+def _clamp_break(value):
+    return int(max(0, min(float(value), MAX_BREAK_MS)))
+
+def _prosody_rate(value, current):
+    value = value.strip()
+    if value in PROSODY_RATES:
+        return current * PROSODY_RATES[value]
+    if value.endswith('%'):
+        return current * float(value[:-1]) / 100.0
+    return current * float(value)
+
+def merge_spans(spans):
+    """Join neighbouring spans with identical settings (fewer engine runs)"""
+    merged = []
+    for span in spans:
+        previous = merged[-1] if merged else None
+        if previous is None:
+            merged.append(dict(span))
+        elif 'break_ms' in span and 'break_ms' in previous:
+            previous['break_ms'] = min(MAX_BREAK_MS, previous['break_ms'] + span['break_ms'])
+        elif ('text' in span and 'text' in previous
+              and _settings(span) == _settings(previous)):
+            previous['text'] += ' ' + span['text']
+        else:
+            merged.append(dict(span))
+    # Pauses at the very end are just dead air
+    while merged and 'break_ms' in merged[-1]:
+        merged.pop()
+    return merged
+
+def _settings(span):
+    return {k: v for k, v in span.items() if k != 'text'}
+
+# ============================================================================
+# ASSEMBLY
+# ============================================================================
+
+def concatenate(pieces):
+    """
+    Join rendered spans into one WAV. pieces is a list of (span, wav_bytes)
+    where wav_bytes is None for breaks. Returns (wav_bytes, timings) with
+    timings [{"text", "start_ms", "end_ms", "voice", ...}, ...] for text spans.
+    """
+    params = None
+    decoded = []
+    for span, data in pieces:
+        if data is None:
+            decoded.append((span, None))
+            continue
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            fmt = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+            frames = wav.readframes(wav.getnframes())
+        if params is None:
+            params = fmt
+        elif fmt != params:
+            frames = _convert(frames, fmt, params)
+        decoded.append((span, frames))
+    if params is None:
+        raise ValueError('No speakable text in spans')
+
+    channels, width, rate = params
+    frame_bytes = channels * width
+    out = io.BytesIO()
+    timings = []
+    position = 0  # In frames
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        for span, frames in decoded:
+            if frames is None:
+                frames = b'\x00' * (rate * span['break_ms'] // 1000 * frame_bytes)
+            wav.writeframes(frames)
+            count = len(frames) // frame_bytes
+            if 'text' in span:
+                timing = {k: v for k, v in span.items()
+                          if k in ('text', 'voice', 'engine', 'speaker', 'lang')}
+                timing['start_ms'] = round(position * 1000 / rate)
+                timing['end_ms'] = round((position + count) * 1000 / rate)
+                timings.append(timing)
+            position += count
+    return out.getvalue(), timings
+
+def _convert(frames, source, target):
+    """Convert PCM between formats (voices differ in sample rate); needs numpy"""
+    try:
+        import numpy as np
+        import audio_postprocess
+    except ImportError:
+        raise ValueError('Voices with different sample rates need numpy: pip install numpy')
+    channels, width, rate = source
+    if width != 2 or target[1] != 2:
+        raise ValueError('Only 16-bit PCM voices can be combined')
+    samples = audio_postprocess.to_float(np.frombuffer(frames, dtype='<i2').reshape(-1, channels))
+    samples = samples.mean(axis=1, keepdims=True).repeat(target[0], axis=1)
+    samples = audio_postprocess.resample(samples, rate, target[2])
+    return audio_postprocess.to_int16(samples).tobytes()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Profiling Hooks for Read Aloud TTS
+Profiles the running server for N seconds or N requests, either with a
+statistical stack sampler (flamegraph "collapsed stacks" output, feed it to
+flamegraph.pl or speedscope) or with cProfile (.prof for snakeviz/flameprof)
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+DEFAULT_SECONDS = 30
+DEFAULT_INTERVAL_MS = 5
+MODES = ('sample', 'cprofile')
+
+# Where sampled time goes: the innermost frame matching a rule names the
+# category (time inside C calls is charged to the Python frame calling them)
+CATEGORY_RULES = [
+    ('subprocess', lambda path, name: path.endswith(('subprocess.py', 'cancellation.py'))),
+    ('json', lambda path, name: f'{os.sep}json{os.sep}' in path),
+    ('file_io', lambda path, name: path.endswith('tempfile.py')
+        or name in ('read_output', 'save')),
+    ('text', lambda path, name: path.endswith(('text_normalizer.py', 'language_id.py'))),
+    ('audio', lambda path, name: path.endswith(('audio_postprocess.py', 'multivoice.py'))),
+    ('cache', lambda path, name: path.endswith(('synthesis_cache.py', 'speculation.py'))),
+    ('flask', lambda path, name: any(part in path for part in (
+        'werkzeug', 'flask', f'{os.sep}socketserver.py', f'{os.sep}http{os.sep}', f'{os.sep}socket.py'))),
+]
+
+_session = None
+_lock = threading.Lock()
+_last_result = None
+
+class ProfileSession:
+    """One profiling run, ended by time, request count or stop()"""
+
+    def __init__(self, mode='sample', seconds=None, requests=None,
+                 interval_ms=DEFAULT_INTERVAL_MS, all_threads=False, output_dir=None):
+        if mode not in MODES:
+            raise ValueError(f'Unknown profiling mode: {mode}')
+        self.mode = mode
+        self.seconds = float(seconds) if seconds else (None if requests else DEFAULT_SECONDS)
+        self.max_requests = int(requests) if requests else None
+        self.interval = max(0.001, float(interval_ms) / 1000.0)
+        self.all_threads = all_threads  # Sample idle threads too
+        self.output_dir = output_dir or os.environ.get(
+            'READ_ALOUD_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'read-aloud-profiles'))
+        self.started = time.time()
+        self.requests = 0
+        self.active = {}  # thread id -> cProfile.Profile (or None) for requests in progress
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.samples = Counter()
+        self.categories = Counter()
+        self.sample_count = 0
+        self.stats = None
+        self.skipped = 0  # Concurrent requests cProfile could not follow
+        self.sampler = None
+
+    def start(self):
+        if self.mode == 'sample':
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+        if self.seconds:
+            timer = threading.Timer(self.seconds, stop, args=(self,))
+            timer.daemon = True
+            timer.start()
+
+    # ------------------------------------------------------------------------
+    # Request hooks
+    # ------------------------------------------------------------------------
+
+    def request_started(self):
+        profile = None
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process
+                profile = None
+                with self.lock:
+                    self.skipped += 1
+        with self.lock:
+            self.active[threading.get_ident()] = profile
+
+    def request_finished(self):
+        """Returns True when this request completes the requested count"""
+        with self.lock:
+            if threading.get_ident() not in self.active:
+                return False
+            profile = self.active.pop(threading.get_ident())
+        if profile is not None:
+            profile.disable()
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+        with self.lock:
+            self.requests += 1
+            return self.max_requests is not None and self.requests >= self.max_requests
+
+    # ------------------------------------------------------------------------
+    # Sampler
+    # ------------------------------------------------------------------------
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            with self.lock:
+                wanted = None if self.all_threads else set(self.active)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (wanted is not None and thread_id not in wanted):
+                    continue
+                stack = []
+                category = None
+                while frame is not None:
+                    code = frame.f_code
+                    if category is None:
+                        category = categorize(code.co_filename, code.co_name)
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, 'thread') if self.all_threads else 'request')
+                self.samples[';'.join(reversed(stack))] += 1
+                self.categories[category or 'other'] += 1
+                self.sample_count += 1
+
+    # ------------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------------
+
+    def finish(self):
+        """Stop collecting and write the output files; returns a summary"""
+        self.stop_event.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+        base = os.path.join(self.output_dir, f'profile-{stamp}-{self.mode}')
+        result = {
+            'mode': self.mode,
+            'seconds': round(time.time() - self.started, 3),
+            'requests': self.requests,
+        }
+        if self.mode == 'sample':
+            result['output'] = base + '.collapsed'
+            result['samples'] = self.sample_count
+            with open(result['output'], 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write(f'{stack} {count}\n')
+            result['categories'] = {name: round(100.0 * count / self.sample_count, 1)
+                                    for name, count in self.categories.most_common()}
+            result['top'] = top_frames(self.samples)
+        else:
+            result['output'] = base + '.prof'
+            result['skipped_requests'] = self.skipped
+            if self.stats is not None:
+                self.stats.dump_stats(result['output'])
+                summary = io.StringIO()
+                self.stats.stream = summary
+                self.stats.sort_stats('cumulative').print_stats(25)
+                with open(base + '.txt', 'w', encoding='utf-8') as f:
+                    f.write(summary.getvalue())
+                result['summary'] = base + '.txt'
+            else:
+                result['output'] = None
+        return result
+
+def categorize(path, name):
+    for category, matches in CATEGORY_RULES:
+        if matches(path, name):
+            return category
+    return None
+
+def top_frames(samples, limit=15):
+    """Share of samples spent in each innermost frame (self time)"""
+    total = sum(samples.values())
+    leaves = Counter()
+    for stack, count in samples.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return [{'frame': frame, 'percent': round(100.0 * count / total, 1)}
+            for frame, count in leaves.most_common(limit)] if total else []
+
+# ============================================================================
+# CONTROL
+# ============================================================================
+
+def start(**options):
+    """Start a profiling session (raises if one is already running)"""
+    global _session
+    with _lock:
+        if _session is not None:
+            raise RuntimeError('A profiling session is already running')
+        _session = ProfileSession(**options)
+        _session.start()
+        print(f"Profiling started ({_session.mode})")
+        return describe(_session)
+
+def stop(expected=None):
+    """
+    End the running session (only if it is `expected`, when given) and write
+    its output; returns the summary
+    """
+    global _session, _last_result
+    with _lock:
+        session = _session
+        if session is None or (expected is not None and session is not expected):
+            return None
+        _session = None
+    _last_result = session.finish()
+    print(f"Profiling finished: {_last_result['output']}")
+    return _last_result
+
+def status():
+    with _lock:
+        session = _session
+    return {'running': describe(session) if session else None, 'last': _last_result}
+
+def describe(session):
+    return {
+        'mode': session.mode,
+        'seconds': session.seconds,
+        'max_requests': session.max_requests,
+        'elapsed': round(time.time() - session.started, 3),
+        'requests': session.requests,
+    }
+
+def request_started():
+    session = _session
+    if session is not None:
+        session.request_started()
+
+def request_finished():
+    session = _session
+    if session is not None and session.request_finished():
+        stop(session)
+
+def parse_spec(spec):
+    """Options from 'sample', 'cprofile:requests=50' or 'sample:seconds=60,interval_ms=2'"""
+    mode, _, rest = spec.partition(':')
+    options = {'mode': mode or 'sample'}
+    for item in filter(None, rest.split(',')):
+        key, _, value = item.partition('=')
+        if key not in ('seconds', 'requests', 'interval_ms', 'all_threads'):
+            raise ValueError(f'Unknown profiling option: {key}')
+        options[key] = value.lower() in ('1', 'true', 'yes') if key == 'all_threads' else value
+    return options
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Adaptive Segment Sizing for Read Aloud TTS
+Every engine run a reader waits for is measured (render time against
+words and audio produced), per engine and voice, together with the stream
+queue latency and those runs in flight; warm-ups and niced speculative
+renders are left out. From that the server recommends how many
+words each segment should have from the start of playback: few while the
+reader waits for the first audio, more as rendered audio builds up ahead
+of playback, and fewer again when the machine is loaded.
+"""
+
+import io
+import os
+import threading
+import wave
+
+# Render time allowed for the segment that starts playback (ms)
+FIRST_AUDIO_TARGET_MS = 700
+
+# Share of the audio ahead of playback a segment may spend rendering
+BUFFER_SHARE = 0.5
+
+MIN_SEGMENT_WORDS = 8
+MAX_SEGMENT_WORDS = 150
+
+# Segment size before an engine has been measured
+DEFAULT_SEGMENT_WORDS = 50
+
+# Weight kept by older measurements at each new one
+DECAY = 0.9
+
+# Most sizes in a recommended schedule (the last one repeats)
+SCHEDULE_LENGTH = 8
+
+CPU_COUNT = os.cpu_count() or 1
+
+def wav_seconds(audio_data):
+    """Duration of a WAV file, or None if it can't be read"""
+    try:
+        with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+class VoiceTimings:
+    """
+    Decayed least-squares fit of render time against words (startup
+    overhead + time per word), and audio time per word at rate 1.0
+    """
+
+    def __init__(self):
+        self.n = self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.audio_ms = 0.0
+        self.runs = 0
+
+    def record(self, words, render_ms, audio_ms):
+        self.n = DECAY * self.n + 1
+        self.sx = DECAY * self.sx + words
+        self.sy = DECAY * self.sy + render_ms
+        self.sxx = DECAY * self.sxx + words * words
+        self.sxy = DECAY * self.sxy + words * render_ms
+        self.audio_ms = DECAY * self.audio_ms + audio_ms
+        self.runs += 1
+
+    def estimate(self):
+        """(overhead_ms, render_ms_per_word, audio_ms_per_word)"""
+        spread = self.n * self.sxx - self.sx * self.sx
+        per_word = (self.n * self.sxy - self.sx * self.sy) / spread if spread > 1e-6 else 0.0
+        overhead = (self.sy - per_word * self.sx) / self.n
+        if per_word <= 0 or overhead < 0:
+            # All runs about the same length (or noise): no separate overhead
+            per_word, overhead = self.sy / self.sx, 0.0
+        return overhead, per_word, self.audio_ms / self.sx
+
+    def describe(self):
+        overhead, per_word, audio_per_word = self.estimate()
+        return {
+            'runs': self.runs,
+            'rtf': round(self.sy / self.audio_ms, 3) if self.audio_ms else None,
+            'overhead_ms': round(overhead, 1),
+            'render_ms_per_word': round(per_word, 2),
+            'audio_ms_per_word': round(audio_per_word, 1),
+        }
+
+class EngineTimings:
+    """Measurements of every engine and voice, and the segment sizes they allow"""
+
+    def __init__(self):
+        self.voices = {}  # 'engine:voice' -> VoiceTimings
+        self.queue_ms = None  # Smoothed wait before rendering started
+        self.running = 0  # Engine runs in flight
+        self.lock = threading.Lock()
+
+    def started(self):
+        with self.lock:
+            self.running += 1
+
+    def finished(self):
+        with self.lock:
+            self.running -= 1
+
+    def record(self, engine, voice, words, rate, render_seconds, audio_seconds):
+        """A finished engine run; audio time is normalized to rate 1.0"""
+        if not words or not audio_seconds:
+            return
+        with self.lock:
+            timings = self.voices.setdefault(f'{engine}:{voice or ""}', VoiceTimings())
+            timings.record(words, render_seconds * 1000, audio_seconds * 1000 * float(rate))
+
+    def record_queue(self, seconds):
+        """Time a segment waited behind others before it was rendered"""
+        with self.lock:
+            queue_ms = seconds * 1000
+            self.queue_ms = queue_ms if self.queue_ms is None else (
+                DECAY * self.queue_ms + (1 - DECAY) * queue_ms)
+
+    def estimate(self, engine, voice):
+        """(overhead_ms, render_ms_per_word, audio_ms_per_word) or None if never measured"""
+        with self.lock:
+            timings = self.voices.get(f'{engine}:{voice or ""}')
+            if timings is None:
+                # Another voice of the same engine is the next best guess
+                measured = [t for key, t in self.voices.items() if key.startswith(f'{engine}:')]
+                timings = max(measured, key=lambda t: t.runs, default=None)
+            return timings.estimate() if timings else None
+
+    def schedule(self, engine, voice, rate=1.0):
+        """
+        Segment sizes in words from the start of playback. The first must
+        render within FIRST_AUDIO_TARGET_MS. Later ones render one after
+        another while the earlier ones play, so each may use BUFFER_SHARE
+        of the audio then ahead of playback. Runs beyond one per CPU slow
+        every run down, so sizes shrink with the load.
+        """
+        estimate = self.estimate(engine, voice)
+        if estimate is None:
+            return [DEFAULT_SEGMENT_WORDS]
+        overhead, per_word, audio_per_word = estimate
+        audio_per_word /= float(rate)
+        with self.lock:
+            load = max(1.0, self.running / CPU_COUNT)
+            queue_ms = self.queue_ms or 0.0
+
+        sizes = []
+        budget_ms = FIRST_AUDIO_TARGET_MS
+        ahead_ms = 0.0  # Audio rendered but not yet played when the next render starts
+        while len(sizes) < SCHEDULE_LENGTH:
+            words = int((budget_ms - queue_ms - overhead * load) / (per_word * load))
+            words = max(MIN_SEGMENT_WORDS, min(MAX_SEGMENT_WORDS, words))
+            sizes.append(words)
+            if words == MAX_SEGMENT_WORDS:
+                break
+            if len(sizes) > 1:  # Playback starts once the first segment is ready
+                ahead_ms -= queue_ms + (overhead + words * per_word) * load
+            ahead_ms += words * audio_per_word
+            budget_ms = ahead_ms * BUFFER_SHARE
+        while len(sizes) > 1 and sizes[-1] == sizes[-2]:
+            sizes.pop()
+        return sizes
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'voices': {key: t.describe() for key, t in self.voices.items()},
+                'queue_ms': round(self.queue_ms, 1) if self.queue_ms is not None else None,
+                'running': self.running,
+                'cpus': CPU_COUNT,
+            }
+
+# Shared by the engines (runs), the stream (queue) and the API (schedules)
+timings = EngineTimings()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Read Aloud Server
+Builds the Flask app from the TTS and cast blueprints and runs it.
+combined_server.py, tts_server.py and cast_relay_server.py are launchers
+for the three deployments: create_app(tts=..., cast=...) then main(app, ...).
+"""
+
+from flask import Flask, Blueprint, request, jsonify, send_file, g, current_app
+from flask_cors import CORS
+import os
+import threading
+
+import tracing
+import profiling
+import workers
+
+# Endpoints every deployment has: health, metrics, profiling admin
+core = Blueprint('core', __name__)
+
+def create_app(tts=True, cast=True):
+    """Flask app with the TTS API and/or Chromecast support"""
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(core)
+    if tts:
+        from tts_api import tts as tts_blueprint
+        app.register_blueprint(tts_blueprint)
+    if cast:
+        from cast_api import cast as cast_blueprint
+        app.register_blueprint(cast_blueprint)
+    return app
+
+# ============================================================================
+# REQUEST HOOKS
+# ============================================================================
+
+@core.before_app_request
+def start_request_trace():
+    """Root span per request when tracing is on (--trace)"""
+    if tracing.enabled():
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace = tracing.start_trace(f'{request.method} {route}', request.headers.get('traceparent'),
+                                      **{'http.method': request.method, 'http.route': route})
+        g.trace.__enter__()
+
+@core.after_app_request
+def add_trace_header(response):
+    trace = g.get('trace')
+    if trace is not None and trace.trace_id:
+        trace.set_attribute('http.status_code', response.status_code)
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+@core.teardown_app_request
+def end_request_trace(error):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.__exit__(type(error) if error else None, error, None)
+
+@core.before_app_request
+def start_request_profile():
+    if not request.path.startswith('/admin/'):
+        profiling.request_started()
+
+@core.teardown_app_request
+def end_request_profile(error):
+    profiling.request_finished()
+
+# ============================================================================
+# HEALTH AND METRICS
+# ============================================================================
+
+@core.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint, with this worker's memory use"""
+    engines = {}
+    memory = workers.memory_report()
+    if 'tts' in current_app.blueprints:
+        import tts_api
+        from engines import ENGINES, mapped_models
+        engines = {name: engine.available() for name, engine in ENGINES.items()}
+        engines['postprocess'] = tts_api.POSTPROCESS_AVAILABLE
+        memory['mapped_models'] = mapped_models()
+    if 'cast' in current_app.blueprints:
+        import cast_api
+        engines['chromecast'] = cast_api.PYCHROMECAST_AVAILABLE
+    return jsonify({'status': 'ok', 'engines': engines, 'memory': memory})
+
+@core.route('/metrics', methods=['GET'])
+def metrics():
+    """Server counters: coalescing, speculation, cancellation, streaming and casting"""
+    result = {'coalescing': {}}
+    if 'tts' in current_app.blueprints:
+        import tts_api
+        import streaming
+        import segment_sizing
+        from engines import cancellations
+        result['coalescing']['synthesis'] = tts_api.synthesis_flights.get_stats()
+        result['speculation'] = tts_api.speculator.get_stats()
+        result['cancellation'] = cancellations.get_stats()
+        result['streaming'] = streaming.get_stats()
+        result['time_to_first_audio'] = tts_api.first_audio.get_stats()
+        result['segment_sizing'] = segment_sizing.timings.get_stats()
+    if 'cast' in current_app.blueprints:
+        import cast_api
+        result['cast_media'] = cast_api.media_ring.get_stats()
+        result['cast_group'] = cast_api.cast_group.get_stats()
+        result['cast_addresses'] = cast_api.address_resolver.get_stats()
+        result['cast_status'] = cast_api.status_cache.get_stats()
+    return jsonify(result)
+
+# ============================================================================
+# ADMIN: PROFILING
+# ============================================================================
+
+def is_local_request():
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@core.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Profile the running server (local requests only)
+    POST body: {"mode": "sample" | "cprofile", "seconds": 30, "requests": 100,
+                "interval_ms": 5, "all_threads": false}
+    GET: status of the running session and the last result
+    """
+    if not is_local_request():
+        return jsonify({'error': 'Admin endpoints are only available from localhost'}), 403
+    if request.method == 'GET':
+        return jsonify(profiling.status())
+
+    data = request.get_json(silent=True) or {}
+    try:
+        session = profiling.start(**{k: v for k, v in data.items()
+                                     if k in ('mode', 'seconds', 'requests', 'interval_ms', 'all_threads')})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'success': True, 'running': session})
+
+@core.route('/admin/profile/stop', methods=['POST'])
+def admin_profile_stop():
+    """End the running profiling session now and return its summary"""
+    if not is_local_request():
+        return jsonify({'error': 'Admin endpoints are only available from localhost'}), 403
+    result = profiling.stop()
+    if result is None:
+        return jsonify({'error': 'No profiling session running'}), 404
+    return jsonify(result)
+
+@core.route('/admin/profile/output', methods=['GET'])
+def admin_profile_output():
+    """Download the last profile (.collapsed stacks or .prof)"""
+    if not is_local_request():
+        return jsonify({'error': 'Admin endpoints are only available from localhost'}), 403
+    last = profiling.status()['last']
+    if not last or not last.get('output') or not os.path.exists(last['output']):
+        return jsonify({'error': 'No profile output yet'}), 404
+    return send_file(last['output'], as_attachment=True)
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main(app, title, port=5000):
+    """Parse the command line, print the banner and serve `app`"""
+    import argparse
+
+    tts = 'tts' in app.blueprints
+    cast = 'cast' in app.blueprints
+
+    parser = argparse.ArgumentParser(description=title)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=port)
+    if tts:
+        parser.add_argument('--preload', nargs='*', metavar='ENGINE:VOICE',
+                            default=os.environ.get('READ_ALOUD_PRELOAD', '').split(),
+                            help='voices to load and warm up at startup, e.g. '
+                                 'piper:en_US-lessac-medium espeak:en (default: $READ_ALOUD_PRELOAD)')
+        parser.add_argument('--cache', default=os.environ.get('READ_ALOUD_CACHE'),
+                            help='synthesis cache: dir:///path, redis://host:port/db or memory:// '
+                                 '(default: $READ_ALOUD_CACHE)')
+    if tts and not cast:
+        parser.add_argument('--workers', type=int, default=int(os.environ.get('READ_ALOUD_WORKERS', '1')),
+                            help='worker processes forked after warm-up, on ports PORT to PORT+N-1 '
+                                 '(put tts_router.py in front; default: $READ_ALOUD_WORKERS or 1)')
+    parser.add_argument('--trace', default=os.environ.get('READ_ALOUD_TRACE'),
+                        help='export request traces (OTLP/JSON) to a file or an '
+                             'http://collector:4318 (default: $READ_ALOUD_TRACE)')
+    parser.add_argument('--profile', default=os.environ.get('READ_ALOUD_PROFILE'),
+                        help='profile from startup, e.g. sample:seconds=60 or '
+                             'cprofile:requests=100 (default: $READ_ALOUD_PROFILE)')
+    args = parser.parse_args()
+    forked = getattr(args, 'workers', 1) > 1
+    trace_export = tracing.configure(args.trace)
+
+    print(title)
+    print("=" * 50)
+    if tts:
+        import tts_api
+        from engines import ENGINES
+        from language_id import get_model
+        synthesis_cache = tts_api.configure(args.cache)
+        for engine in ENGINES.values():
+            print(f"{engine.title} available: {engine.available()}")
+        print(f"Synthesis cache: {synthesis_cache.describe() if synthesis_cache else 'disabled'}")
+    if cast:
+        import cast_api
+        print(f"Chromecast available: {cast_api.PYCHROMECAST_AVAILABLE}")
+    print(f"Tracing: {trace_export or 'disabled'}")
+
+    if cast:
+        if cast_api.PYCHROMECAST_AVAILABLE:
+            print("\nChromecast discovery starts with the first cast request")
+        else:
+            print("\nChromecast support disabled (pychromecast not installed)")
+            print("Install with: pip install pychromecast")
+
+    if tts and forked:
+        # Load everything once in this process; the workers share it copy-on-write
+        if args.preload:
+            print(f"\nWarming up voices: {', '.join(args.preload)}")
+            tts_api.warm_up_voices(args.preload)
+        get_model()
+        tts_api.get_voice_index()
+    elif tts:
+        if args.preload:
+            print(f"\nWarming up voices: {', '.join(args.preload)}")
+            tts_api.start_warmup(args.preload)
+
+        # Build the language model and voice index before the first request needs them
+        threading.Thread(target=lambda: (get_model(), tts_api.get_voice_index()), daemon=True).start()
+
+    if forked:
+        print(f"\nWorkers starting on http://localhost:{args.port}-{args.port + args.workers - 1}")
+    else:
+        print(f"\nServer starting on http://localhost:{args.port}")
+    if tts:
+        print(f"TTS API: http://localhost:{args.port}/synthesize")
+        print(f"Readiness: http://localhost:{args.port}/ready")
+    if cast and cast_api.PYCHROMECAST_AVAILABLE:
+        print(f"Cast Setup: http://localhost:{args.port}/cast")
+    print("=" * 50)
+
+    if forked:
+        args.port = workers.fork_workers(args.workers, args.port)
+        # Threads don't survive fork(): each worker starts its own exporter
+        tracing.configure(args.trace)
+    if args.profile:
+        profiling.start(**profiling.parse_spec(args.profile))
+
+    try:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+    finally:
+        if cast:
+            cast_api.stop_discovery()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Speculative Synthesis for Read Aloud TTS
+When a /synthesize request is tagged with a document id and position, the
+following segments are rendered in the background at low priority so the
+next request can be served straight from the store
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from cancellation import CancelToken, SynthesisCancelled
+from synthesis_cache import MemoryCache
+
+# How long a request waits for a speculative render that is still running
+PENDING_WAIT_SECONDS = 30
+
+class SpeculativeJob:
+    """One segment queued for background synthesis"""
+
+    def __init__(self, key, doc_id, generation, position, args):
+        self.key = key
+        self.doc_id = doc_id
+        self.generation = generation
+        self.position = position  # Segment index within the document
+        self.args = args  # (text, engine, rate, voice)
+        self.done = threading.Event()
+        self.ok = False
+        self.started = False  # Picked up by the worker thread
+        self.claimed = False  # A request is waiting for this render
+
+class Speculator:
+    """
+    Background renderer for upcoming segments.
+    render(text, engine, rate, voice, low_priority=True, token=None, speaker=None) must
+    return WAV bytes, and should give up once token.is_cancelled().
+    """
+
+    def __init__(self, render, store=None, lookahead=2, max_documents=64):
+        self.render = render
+        self.store = store or MemoryCache()
+        self.lookahead = lookahead
+        self.max_documents = max_documents
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.queue = []  # heap of (distance, seq, job)
+        self.sequence = itertools.count()
+        self.jobs = {}  # key -> SpeculativeJob (queued, running or finished)
+        self.documents = {}  # doc_id -> {'generation', 'position', 'seen'}
+        self.thread = None
+        self.stats = {
+            'scheduled': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'hits': 0,
+            'pending_hits': 0,
+            'misses': 0,
+            'promoted': 0,
+        }
+
+    # ------------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------------
+
+    def observe(self, doc_id, position, upcoming, make_key, engine, rate, voice, speaker=None):
+        """
+        Record a request at `position` of `doc_id` and queue `upcoming`
+        (the texts of the next segments, in order) for speculation.
+        make_key(text) must give the same key the request path uses.
+        """
+        with self.lock:
+            document = self.documents.get(doc_id)
+            if document is None:
+                if len(self.documents) >= self.max_documents:
+                    # Forget the least recently seen document
+                    oldest = min(self.documents, key=lambda d: self.documents[d]['seen'])
+                    self._cancel_locked(oldest)
+                    del self.documents[oldest]
+                document = {'generation': 0, 'position': position}
+                self.documents[doc_id] = document
+            elif position not in (document['position'], document['position'] + 1):
+                # The reader seeked; whatever was queued is now the wrong text
+                self._cancel_locked(doc_id)
+            document['position'] = position
+            document['seen'] = time.time()
+
+            # Finished renders the reader has already moved past won't be claimed
+            for key, job in list(self.jobs.items()):
+                if job.doc_id == doc_id and job.position < position and job.done.is_set():
+                    del self.jobs[key]
+
+            for distance, text in enumerate(upcoming[:self.lookahead], start=1):
+                key = make_key(text)
+                if key in self.jobs:
+                    continue
+                job = SpeculativeJob(key, doc_id, document['generation'], position + distance,
+                                     (text, engine, rate, voice, speaker))
+                self.jobs[key] = job
+                heapq.heappush(self.queue, (distance, next(self.sequence), job))
+                self.stats['scheduled'] += 1
+            self.wakeup.notify()
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def cancel(self, doc_id=None):
+        """Drop queued speculation for one document (or all of them)"""
+        with self.lock:
+            for target in ([doc_id] if doc_id is not None else list(self.documents)):
+                self._cancel_locked(target)
+
+    def _cancel_locked(self, doc_id):
+        document = self.documents.get(doc_id)
+        if document is None:
+            return
+        # Bumping the generation invalidates queued and running jobs
+        document['generation'] += 1
+        for key, job in list(self.jobs.items()):
+            if job.doc_id == doc_id:
+                del self.jobs[key]
+                if not job.done.is_set():
+                    job.done.set()
+                    self.stats['cancelled'] += 1
+
+    def cancelled_check(self, doc_id):
+        """
+        Predicate telling whether speculation for `doc_id` has been cancelled
+        (the reader stopped or seeked) since this call, for other background
+        work on the document
+        """
+        with self.lock:
+            document = self.documents.get(doc_id)
+            generation = document['generation'] if document is not None else None
+
+        def check():
+            with self.lock:
+                document = self.documents.get(doc_id)
+                return generation is not None and (
+                    document is None or document['generation'] != generation)
+        return check
+
+    def _is_current(self, job):
+        document = self.documents.get(job.doc_id)
+        return document is not None and document['generation'] == job.generation
+
+    # ------------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------------
+
+    def claim(self, key, tagged=True, token=None):
+        """
+        Return speculated audio for `key`, waiting if it is being rendered.
+        Returns None when the key wasn't speculated (counted as a miss for
+        requests tagged with a document id), or when its render hasn't
+        started: the worker may be busy with another document, so the caller
+        renders the text itself at normal priority. Waiting stops with
+        SynthesisCancelled if the caller's token is cancelled.
+        """
+        with self.lock:
+            job = self.jobs.pop(key, None)
+            if job is not None and not job.started:
+                self.queue = [entry for entry in self.queue if entry[2] is not job]
+                heapq.heapify(self.queue)
+                job.done.set()
+                self.stats['promoted'] += 1
+                return None
+            if job is not None:
+                job.claimed = True
+        if job is None:
+            if tagged:
+                self._count('misses')
+            return None
+
+        pending = not job.done.is_set()
+        deadline = time.time() + PENDING_WAIT_SECONDS
+        while not job.done.wait(0.05 if token is not None else PENDING_WAIT_SECONDS):
+            if token is not None and token.is_cancelled():
+                job.claimed = False  # Nobody is waiting any more
+                raise SynthesisCancelled(token.reason)
+            if time.time() >= deadline:
+                break
+        audio_data = self.store.get(key) if job.ok else None
+        if audio_data is None:
+            self._count('misses')
+            return None
+        self._count('pending_hits' if pending else 'hits')
+        return audio_data
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['queued'] = len(self.queue)
+        served = stats['hits'] + stats['pending_hits']
+        total = served + stats['misses']
+        stats['hit_rate'] = round(served / total, 3) if total else None
+        return stats
+
+    # ------------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.queue:
+                    self.wakeup.wait()
+                _, _, job = heapq.heappop(self.queue)
+                if job.done.is_set() or not self._is_current(job):
+                    continue
+                job.started = True
+
+            # Killed when the reader seeks or stops, unless a request claimed it
+            token = CancelToken(check=lambda: not job.claimed and not self._is_current(job))
+            try:
+                text, engine, rate, voice, speaker = job.args
+                audio_data = self.render(text, engine, rate, voice, low_priority=True, token=token,
+                                         speaker=speaker)
+                with self.lock:
+                    current = self._is_current(job)
+                if current or job.claimed:
+                    self.store.put(job.key, audio_data)
+                    job.ok = True
+                    self._count('completed')
+            except SynthesisCancelled:
+                pass  # Already counted by _cancel_locked()
+            except Exception as e:
+                print(f"Speculative synthesis failed: {e}")
+                self._count('failed')
+            finally:
+                job.done.set()
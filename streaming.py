@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Streaming Synthesis for Read Aloud TTS
+A persistent WebSocket (/stream) carrying text segments and control
+messages up, and binary audio frames plus JSON events back, so a reader
+pays no HTTP setup, base64 or JSON array encoding per chunk.
+
+Client -> server (JSON text messages):
+  {"type": "config", "engine", "voice", "rate", "speaker", "lang",
+   "normalize", "postprocess", "format": "pcm" | "wav", "doc_id"}
+                                    session defaults for later segments
+  {"type": "segment", "id": "s1", "text": "...", "position": 3,
+   "upcoming": [...], "cast": false, "first": false, "fast_start": false,
+   ...any config key}               queue a segment (rendered in order;
+                                    "first" and "fast_start" as for
+                                    /synthesize)
+  {"type": "cancel", "id": "s1"}    drop one segment (all without "id")
+  {"type": "seek", "doc_id": ...}   drop everything queued or rendering,
+                                    and the document's speculation
+  {"type": "rate", "rate": 1.25}    default rate for segments not started
+
+Server -> client:
+  {"type": "hello", "protocol": 1, "formats": [...], "cast": true}
+  {"type": "start", "id", "format", "sample_rate", "channels",
+   "sample_width", "bytes", "duration_ms", "cache", "queued_ms", "render_ms",
+   "fast_start", "spoken_words",    (only for a fast start)
+   "segment_sizes"}                 recommended segment sizes, see
+                                    segment_sizing.py
+  binary frames with the segment's audio (raw little-endian PCM, or the
+  WAV file for "format": "wav"), at most FRAME_BYTES each
+  {"type": "end", "id", "elapsed_ms"}
+  {"type": "cast", "id", "duration_ms", ...}   played on the cast device
+  {"type": "cancelled", "id", "reason"} / {"type": "error", "id", "error"}
+                                    (a rejected message's own id, if any)
+
+The WebSocket runs on werkzeug's socket (RFC 6455, no extensions), the
+same way cancellation.py watches it for disconnects.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import socket
+import struct
+import threading
+import time
+import wave
+from collections import deque
+
+from flask import Response
+
+from cancellation import CancelToken, SynthesisCancelled
+import segment_sizing
+import tracing
+
+PROTOCOL_VERSION = 1
+FORMATS = ('pcm', 'wav')
+
+# Speaking rates a session accepts
+MIN_RATE = 0.1
+MAX_RATE = 10.0
+
+# Audio is sent in binary frames of at most this many bytes
+FRAME_BYTES = 32 * 1024
+
+# Largest message a client may send
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+# Segment and config keys a client may set
+SETTING_KEYS = ('engine', 'voice', 'rate', 'speaker', 'lang', 'normalize',
+                'postprocess', 'format', 'doc_id', 'cast')
+SEGMENT_KEYS = SETTING_KEYS + ('text', 'position', 'upcoming', 'first', 'fast_start')
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+stats_lock = threading.Lock()
+stats = {
+    'sessions': 0,
+    'open_sessions': 0,
+    'segments': 0,
+    'segments_cancelled': 0,
+    'segments_failed': 0,
+    'segments_cast': 0,
+    'audio_bytes_sent': 0,
+}
+
+def count(name, amount=1):
+    with stats_lock:
+        stats[name] += amount
+
+def get_stats():
+    with stats_lock:
+        return dict(stats)
+
+# ============================================================================
+# WEBSOCKET
+# ============================================================================
+
+class ConnectionClosed(Exception):
+    """The WebSocket is closed (by either side)"""
+
+def accept(environ):
+    """
+    Complete the WebSocket handshake for a WSGI request and return the
+    connection. Raises ValueError if the request is not a usable upgrade.
+    """
+    sock = environ.get('werkzeug.socket')
+    if sock is None:
+        raise ValueError('WebSocket streaming needs the built-in server')
+    if environ.get('HTTP_UPGRADE', '').lower() != 'websocket':
+        raise ValueError('Expected a WebSocket upgrade request')
+    key = environ.get('HTTP_SEC_WEBSOCKET_KEY')
+    if not key or environ.get('HTTP_SEC_WEBSOCKET_VERSION') != '13':
+        raise ValueError('Unsupported WebSocket handshake')
+
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()
+    sock.sendall((
+        'HTTP/1.1 101 Switching Protocols\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        f'Sec-WebSocket-Accept: {base64.b64encode(digest).decode("ascii")}\r\n'
+        '\r\n'
+    ).encode('ascii'))
+    # Events are small; don't let Nagle hold them back behind audio
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return WebSocket(sock)
+
+class ClosedResponse(Response):
+    """
+    What the view returns once the WebSocket is finished: the connection no
+    longer speaks HTTP, so werkzeug is told it was dropped instead of
+    writing a response on it
+    """
+
+    def __call__(self, environ, start_response):
+        raise ConnectionError('WebSocket closed')
+
+class WebSocket:
+    """Server side of one WebSocket; send_* may be called from any thread"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def send_json(self, message):
+        self._send(OP_TEXT, json.dumps(message, separators=(',', ':')).encode('utf-8'))
+
+    def send_binary(self, data):
+        self._send(OP_BINARY, data)
+
+    def _send(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        with self.send_lock:
+            if self.closed and opcode != OP_CLOSE:
+                raise ConnectionClosed()
+            try:
+                self.sock.sendall(header)
+                self.sock.sendall(payload)
+            except OSError:
+                self.closed = True
+                raise ConnectionClosed()
+
+    def receive(self):
+        """Next message (str for text, bytes for binary); None once closed"""
+        opcode = None
+        fragments = []
+        size = 0
+        while True:
+            try:
+                fin, frame_opcode, payload = self._read_frame()
+            except (OSError, ValueError, ConnectionClosed):
+                self.closed = True
+                return None
+            if frame_opcode == OP_PING:
+                self._send(OP_PONG, payload)
+                continue
+            if frame_opcode == OP_PONG:
+                continue
+            if frame_opcode == OP_CLOSE:
+                self.close(struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else 1000)
+                return None
+            if frame_opcode != OP_CONTINUATION:
+                opcode, fragments, size = frame_opcode, [], 0
+            fragments.append(payload)
+            size += len(payload)
+            if size > MAX_MESSAGE_BYTES:
+                self.close(1009, 'Message too big')
+                return None
+            if fin:
+                data = b''.join(fragments)
+                return data.decode('utf-8') if opcode == OP_TEXT else data
+
+    def _read_frame(self):
+        first, second = self._read_exact(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._read_exact(8))[0]
+        if length > MAX_MESSAGE_BYTES:
+            raise ValueError('Frame too big')
+        mask = self._read_exact(4) if second & 0x80 else None
+        payload = self._read_exact(length)
+        if mask and length:
+            # XOR the whole payload at once with the repeated 4-byte mask
+            key = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')).to_bytes(length, 'little')
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def _read_exact(self, count):
+        data = self.reader.read(count)
+        if len(data) < count:
+            raise ConnectionClosed()
+        return data
+
+    def close(self, code=1000, reason=''):
+        if self.closed:
+            return
+        try:
+            self._send(OP_CLOSE, struct.pack('!H', code) + reason.encode('utf-8'))
+        except ConnectionClosed:
+            pass
+        self.closed = True
+
+# ============================================================================
+# SESSION
+# ============================================================================
+
+class StreamSession:
+    """
+    One /stream connection: this thread reads control messages while a
+    worker renders queued segments in order and sends them.
+    render(options, token) -> (wav_bytes, info) does the synthesis and must
+    give up once token.is_cancelled(); cast(wav_bytes) plays audio on the
+    cast device (None without cast support); seek(doc_id) drops the
+    document's speculative synthesis.
+    """
+
+    def __init__(self, ws, render, cast=None, seek=None):
+        self.ws = ws
+        self.render = render
+        self.cast = cast
+        self.seek = seek
+        self.settings = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.queue = deque()  # (segment, received_at)
+        self.current = None  # (segment id, CancelToken) being rendered or sent
+        self.done = False
+
+    def run(self):
+        count('sessions')
+        count('open_sessions')
+        worker = threading.Thread(target=self._work, daemon=True)
+        try:
+            self.ws.send_json({'type': 'hello', 'protocol': PROTOCOL_VERSION,
+                               'formats': list(FORMATS), 'cast': self.cast is not None})
+            worker.start()
+            while True:
+                message = self.ws.receive()
+                if message is None:
+                    break
+                message_id = None  # A rejected segment fails by its id on the client
+                try:
+                    if isinstance(message, bytes):
+                        raise ValueError('Binary messages are not accepted')
+                    message = json.loads(message)
+                    if isinstance(message, dict):
+                        message_id = message.get('id')
+                    self.handle(message)
+                except (ValueError, TypeError, AttributeError, KeyError) as e:
+                    self._send({'type': 'error', 'id': message_id, 'error': str(e)})
+        except ConnectionClosed:
+            pass
+        finally:
+            self.ws.closed = True
+            with self.lock:
+                self.done = True
+                self.wakeup.notify()
+            self._cancel(None, 'disconnected')
+            if worker.is_alive():
+                worker.join()
+            count('open_sessions', -1)
+
+    def handle(self, message):
+        kind = message.get('type')
+        if kind == 'config':
+            check_settings(message)
+            self.settings.update({k: v for k, v in message.items() if k in SETTING_KEYS})
+        elif kind == 'segment':
+            if message.get('id') is None or not message.get('text'):
+                raise ValueError('A segment needs an "id" and "text"')
+            check_settings(message)
+            with self.lock:
+                self.queue.append((message, time.time()))
+                self.wakeup.notify()
+        elif kind == 'cancel':
+            self._cancel(message.get('id'), 'cancelled')
+        elif kind == 'seek':
+            self._cancel(None, 'seek')
+            doc_id = message.get('doc_id', self.settings.get('doc_id'))
+            if self.seek is not None and doc_id is not None:
+                self.seek(doc_id)
+        elif kind == 'rate':
+            if message.get('rate') is None:
+                raise ValueError('A rate message needs a "rate"')
+            check_settings(message)
+            self.settings['rate'] = float(message['rate'])
+        else:
+            raise ValueError(f'Unknown message type: {kind}')
+
+    def _cancel(self, segment_id, reason):
+        """Drop a queued segment and stop it if it is rendering (all when id is None)"""
+        with self.lock:
+            dropped = [segment for segment, _ in self.queue
+                       if segment_id is None or segment['id'] == segment_id]
+            self.queue = deque(item for item in self.queue
+                               if not (segment_id is None or item[0]['id'] == segment_id))
+            current = self.current
+        if current is not None and (segment_id is None or current[0] == segment_id):
+            current[1].cancel(reason)
+        for segment in dropped:
+            count('segments_cancelled')
+            self._send({'type': 'cancelled', 'id': segment['id'], 'reason': reason})
+
+    def _send(self, message):
+        try:
+            self.ws.send_json(message)
+        except ConnectionClosed:
+            pass
+
+    # ------------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------------
+
+    def _work(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.done:
+                    self.wakeup.wait()
+                if self.done:
+                    return
+                segment, received = self.queue.popleft()
+                token = CancelToken(segment['id'], check=lambda: self.ws.closed)
+                self.current = (segment['id'], token)
+            try:
+                self._play(segment, received, token)
+            except ConnectionClosed:
+                return
+            finally:
+                with self.lock:
+                    self.current = None
+
+    def _play(self, segment, received, token):
+        options = dict(self.settings, **{k: v for k, v in segment.items() if k in SEGMENT_KEYS})
+        segment_id = segment['id']
+        started = time.time()
+        count('segments')
+        segment_sizing.timings.record_queue(started - received)
+        with tracing.start_trace('stream.segment', None, chars=len(segment['text'])):
+            try:
+                audio_data, info = self.render(options, token)
+                if options.get('cast'):
+                    if self.cast is None:
+                        raise ValueError('Casting is not available on this server')
+                    self.cast(audio_data)
+            except SynthesisCancelled as e:
+                count('segments_cancelled')
+                self._send({'type': 'cancelled', 'id': segment_id, 'reason': e.reason})
+                return
+            except Exception as e:
+                count('segments_failed')
+                self._send({'type': 'error', 'id': segment_id, 'error': str(e)})
+                return
+
+            channels, width, rate, frames = read_pcm(audio_data)
+            event = dict(info, id=segment_id,
+                         duration_ms=round(len(frames) / (channels * width) * 1000 / rate),
+                         queued_ms=round((started - received) * 1000),
+                         render_ms=round((time.time() - started) * 1000))
+            if options.get('cast'):
+                count('segments_cast')
+                self.ws.send_json(dict(event, type='cast'))
+                return
+
+            fmt = options.get('format', 'pcm')
+            payload = memoryview(audio_data if fmt == 'wav' else frames)
+            self.ws.send_json(dict(event, type='start', format=fmt, sample_rate=rate,
+                                   channels=channels, sample_width=width, bytes=len(payload)))
+            for offset in range(0, len(payload), FRAME_BYTES):
+                if token.is_cancelled():
+                    count('segments_cancelled')
+                    self._send({'type': 'cancelled', 'id': segment_id, 'reason': token.reason})
+                    return
+                self.ws.send_binary(payload[offset:offset + FRAME_BYTES])
+            count('audio_bytes_sent', len(payload))
+            self.ws.send_json({'type': 'end', 'id': segment_id,
+                               'elapsed_ms': round((time.time() - received) * 1000)})
+
+def check_settings(message):
+    """Raise ValueError for a format or rate a session can't use"""
+    if 'format' in message and message['format'] not in FORMATS:
+        raise ValueError(f"Unknown format: {message['format']} (use {' or '.join(FORMATS)})")
+    rate = message.get('rate')
+    if rate is not None and (isinstance(rate, bool) or not isinstance(rate, (int, float))
+                             or not MIN_RATE <= rate <= MAX_RATE):
+        raise ValueError(f'Rate must be a number from {MIN_RATE} to {MAX_RATE}')
+
+def read_pcm(audio_data):
+    """(channels, sample_width, sample_rate, frames) of a WAV file"""
+    with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+        return (wav.getnchannels(), wav.getsampwidth(), wav.getframerate(),
+                wav.readframes(wav.getnframes()))
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Shared Synthesis Cache for Read Aloud TTS workers
+Pluggable backends so several stateless workers can share rendered audio:
+  dir:///path/to/cache  - local (or network-mounted) directory
+                          (?max_mb=N caps its size, default 1024)
+  redis://host:port/db  - any Redis-compatible server
+  memory://             - in-process dict (single worker, testing)
+
+Run a local Redis stand-in with:  python3 synthesis_cache.py serve --port 6379
+"""
+
+import hashlib
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+# Size cap of a directory cache; the oldest files go first beyond it
+DEFAULT_DIR_CACHE_MB = 1024
+
+# Eviction frees space down to this share of the cap, so it runs rarely
+DIR_CACHE_LOW_WATER = 0.9
+
+def cache_key(text, engine, voice, rate, speaker=None):
+    """Stable key for a synthesis request (same on every node)"""
+    parts = [engine or '', voice or '', f'{float(rate):.3f}', text]
+    if speaker is not None:
+        parts.insert(2, f'speaker={speaker}')
+    raw = '\x1f'.join(parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def text_hash(text):
+    """Routing hash of the text alone, used by the router's hash ring"""
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:16], 16)
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class MemoryCache:
+    """In-process LRU cache (not shared between workers)"""
+
+    def __init__(self, max_items=256):
+        self.items = OrderedDict()
+        self.max_items = max_items
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self.lock:
+            self.items[key] = data
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def describe(self):
+        return f'memory ({len(self.items)} items)'
+
+class LocalDirCache:
+    """
+    Cache stored as one file per key in a directory, capped at max_bytes.
+    Other nodes' writes are only seen when the directory is rescanned (on
+    eviction), so a shared directory can briefly overshoot the cap.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_DIR_CACHE_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._scan())  # Bytes as far as we know
+
+    def _scan(self):
+        """(mtime, size, path) of every cached file"""
+        files = []
+        for fan_out in os.scandir(self.path):
+            if not fan_out.is_dir():
+                continue
+            for entry in os.scandir(fan_out.path):
+                if entry.name.endswith('.wav'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted by another node meanwhile
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        """Delete the oldest files until the directory is below the low-water mark"""
+        files = sorted(self._scan())
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes * DIR_CACHE_LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self.size = size
+
+    def _file(self, key):
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.path, key[:2], key + '.wav')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        target = self._file(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write then rename so readers on other nodes never see partial files
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, target)
+        with self.lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def describe(self):
+        return f'dir {self.path} ({self.size // (1024 * 1024)} of {self.max_bytes // (1024 * 1024)} MB)'
+
+class RedisCache:
+    """Cache in a Redis-compatible server, spoken to with a minimal RESP client"""
+
+    def __init__(self, host='localhost', port=6379, db=0, ttl=7 * 24 * 3600, prefix='readaloud:'):
+        self.address = (host, port)
+        self.db = db
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local = threading.local()  # One connection per worker thread
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=5)
+            conn = (sock, sock.makefile('rb'))
+            self.local.conn = conn
+            if self.db:
+                self._command('SELECT', str(self.db))
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            parts.append(f'${len(arg)}\r\n'.encode() + arg + b'\r\n')
+        try:
+            sock.sendall(b''.join(parts))
+            return read_resp(reader)
+        except OSError:
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        """Drop this thread's connection (the next command reconnects)"""
+        conn, self.local.conn = getattr(self.local, 'conn', None), None
+        if conn is not None:
+            sock, reader = conn
+            reader.close()
+            sock.close()
+
+    def get(self, key):
+        try:
+            return self._command('GET', self.prefix + key)
+        except OSError as e:
+            print(f"Cache get failed: {e}")
+            return None
+
+    def put(self, key, data):
+        try:
+            self._command('SET', self.prefix + key, data, 'EX', str(self.ttl))
+        except OSError as e:
+            print(f"Cache put failed: {e}")
+
+    def describe(self):
+        return f'redis {self.address[0]}:{self.address[1]}/{self.db}'
+
+def read_resp(reader):
+    """Read one RESP reply"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('Connection closed')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        raise Exception(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(payload)
+        if count < 0:
+            return None
+        return [read_resp(reader) for _ in range(count)]
+    raise Exception(f'Bad RESP reply: {line!r}')
+
+def get_cache(url):
+    """Create a cache backend from a URL (None disables caching)"""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        return MemoryCache()
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisCache(parsed.hostname or 'localhost', parsed.port or 6379, db)
+    if parsed.scheme in ('dir', 'file', ''):
+        max_mb = float(parse_qs(parsed.query).get('max_mb', [DEFAULT_DIR_CACHE_MB])[0])
+        return LocalDirCache(parsed.path, int(max_mb * 1024 * 1024))
+    raise ValueError(f'Unknown cache backend: {url}')
+
+# ============================================================================
+# REQUEST COALESCING
+# ============================================================================
+
+# How often a waiting caller checks its cancellation token
+WAIT_POLL_SECONDS = 0.05
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.tokens = []  # Cancellation tokens of the callers waiting on this call
+        self.cancellable = True  # False once a caller without a token joins
+
+    def join(self, token):
+        if token is None:
+            self.cancellable = False
+        else:
+            self.tokens.append(token)
+
+    def abandoned(self):
+        return self.cancellable and all(t.is_cancelled() for t in self.tokens)
+
+class SingleFlight:
+    """
+    Run a function once per key at a time: concurrent callers with the same
+    key wait for the first caller's result instead of repeating the work
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key, fn, token=None):
+        """
+        Returns (result, shared); shared is True for callers that waited.
+        A caller passing a cancellation token stops waiting once it is
+        cancelled; see abandoned() for stopping the work itself.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.stats['executed'] += 1
+            else:
+                self.stats['coalesced'] += 1
+            call.join(token)
+
+        if not leader:
+            while not call.done.wait(WAIT_POLL_SECONDS if token is not None else None):
+                token.raise_if_cancelled()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+    def abandoned(self, key):
+        """True when every caller waiting on `key` has been cancelled"""
+        with self.lock:
+            call = self.calls.get(key)
+        return call is not None and call.abandoned()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, in_flight=len(self.calls))
+
+# ============================================================================
+# LOCAL REDIS STAND-IN
+# ============================================================================
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    """Handles the RESP subset used by RedisCache (GET, SET [EX], DEL, PING, SELECT)"""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                command = read_resp(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not isinstance(command, list) or not command:
+                self.wfile.write(b'-ERR protocol error\r\n')
+                continue
+            name = command[0].upper()
+            if name == b'GET':
+                value = store.get(command[1])
+                if value is None:
+                    self.wfile.write(b'$-1\r\n')
+                else:
+                    self.wfile.write(b'$%d\r\n' % len(value) + value + b'\r\n')
+            elif name == b'SET':
+                # Expiry is accepted but not enforced; the stand-in is for local use
+                store[command[1]] = command[2]
+                self.wfile.write(b'+OK\r\n')
+            elif name == b'DEL':
+                removed = sum(1 for key in command[1:] if store.pop(key, None) is not None)
+                self.wfile.write(b':%d\r\n' % removed)
+            elif name in (b'PING', b'SELECT'):
+                self.wfile.write(b'+PONG\r\n' if name == b'PING' else b'+OK\r\n')
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, StandInHandler)
+        self.store = {}
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Synthesis cache tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='run a local Redis-compatible stand-in')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    print(f"Redis stand-in listening on {args.host}:{args.port}")
+    StandInServer((args.host, args.port)).serve_forever()
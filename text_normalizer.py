@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Text Normalization for Read Aloud TTS
+Cleans web text before it reaches eSpeak/Piper and keeps an offset map
+so word highlighting still lines up with the original text
+"""
+
+import re
+
+# ============================================================================
+# RULE TABLES (compiled once at import)
+# ============================================================================
+
+URL_RE = re.compile(r'(?i:https?://|ftp://|www\.)[^\s<>"\')\]]+')
+EMAIL_RE = re.compile(r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b')
+
+# [1], [12], [a], [note 3], [citation needed], superscript digits
+FOOTNOTE_RE = re.compile(
+    r'\[(?i:\d{1,3}|[a-z]|note \d+|citation needed|clarification needed)\]'
+    r'|[¹²³⁰⁴-⁹]+'
+)
+
+# Runs of 3+ symbols such as "-----", "*****", "=>=>=>", "|||"
+SYMBOL_RUN_RE = re.compile(r'[^\w\s.,;:!?\'"()]{3,}')
+
+# Repeated punctuation such as "!!!", "??", ",,"  (ellipsis collapses to ".")
+PUNCT_RUN_RE = re.compile(r'(?P<mark>[.,;:!?])(?P=mark)+|…')
+
+# Whitespace that isn't already a single space; plain single spaces are left
+# inside copied text so the common case costs no Python-level work
+WHITESPACE_RE = re.compile(r'\s{2,}|[^\S ]')
+
+ABBREVIATIONS = {
+    'Dr.': 'Doctor',
+    'Mr.': 'Mister',
+    'Mrs.': 'Missus',
+    'Ms.': 'Miz',
+    'Prof.': 'Professor',
+    'Sr.': 'Senior',
+    'Jr.': 'Junior',
+    'St.': 'Saint',
+    'Mt.': 'Mount',
+    'vs.': 'versus',
+    'etc.': 'et cetera',
+    'e.g.': 'for example',
+    'i.e.': 'that is',
+    'approx.': 'approximately',
+    'No.': 'number',
+    'Fig.': 'figure',
+}
+ABBREVIATION_RE = re.compile(
+    r'(?<![\w.])(?:' + '|'.join(re.escape(a) for a in ABBREVIATIONS) + r')(?!\w)'
+)
+
+NUMBER_RE = re.compile(
+    r'(?<![\w.])(?P<integer>\d{1,3}(?:,\d{3})+|\d+)(?:\.(?P<fraction>\d+))?'
+    r'(?P<suffix>st|nd|rd|th|%)?(?!\w)'
+)
+
+ONES = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight',
+        'nine', 'ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen',
+        'sixteen', 'seventeen', 'eighteen', 'nineteen']
+TENS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy',
+        'eighty', 'ninety']
+SCALES = [(10 ** 12, 'trillion'), (10 ** 9, 'billion'), (10 ** 6, 'million'),
+          (1000, 'thousand')]
+ORDINAL_SUFFIXES = {'one': 'first', 'two': 'second', 'three': 'third',
+                    'five': 'fifth', 'eight': 'eighth', 'nine': 'ninth',
+                    'twelve': 'twelfth'}
+
+# Numbers longer than this are read digit by digit (phone numbers, ids)
+MAX_NUMBER_DIGITS = 15
+
+DEFAULT_OPTIONS = {
+    'strip_urls': True,
+    'strip_footnotes': True,
+    'collapse_symbols': True,
+    'expand_abbreviations': False,
+    'expand_numbers': False,
+}
+
+# ============================================================================
+# NUMBER EXPANSION
+# ============================================================================
+
+def number_to_words(n):
+    """Spell out a non-negative integer in English"""
+    if n < 20:
+        return ONES[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return TENS[tens] + ('-' + ONES[ones] if ones else '')
+    if n < 1000:
+        hundreds, rest = divmod(n, 100)
+        words = ONES[hundreds] + ' hundred'
+        return words + (' ' + number_to_words(rest) if rest else '')
+    for scale, name in SCALES:
+        if n >= scale:
+            high, rest = divmod(n, scale)
+            words = number_to_words(high) + ' ' + name
+            return words + (' ' + number_to_words(rest) if rest else '')
+    return str(n)
+
+def ordinal_to_words(n):
+    """Spell out an ordinal (1 -> first, 22 -> twenty-second)"""
+    words = number_to_words(n)
+    head, sep, last = words.rpartition('-' if '-' in words.split(' ')[-1] else ' ')
+    if last in ORDINAL_SUFFIXES:
+        last = ORDINAL_SUFFIXES[last]
+    elif last.endswith('y'):
+        last = last[:-1] + 'ieth'
+    else:
+        last = last + 'th'
+    return head + sep + last
+
+def _expand_number(match):
+    integer, fraction, suffix = match.group('integer', 'fraction', 'suffix')
+    digits = integer.replace(',', '')
+    if len(digits) > MAX_NUMBER_DIGITS:
+        return ' '.join(ONES[int(d)] for d in digits)
+    if suffix in ('st', 'nd', 'rd', 'th') and not fraction:
+        return ordinal_to_words(int(digits))
+    words = number_to_words(int(digits))
+    if fraction:
+        words += ' point ' + ' '.join(ONES[int(d)] for d in fraction)
+    if suffix == '%':
+        words += ' percent'
+    return words
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+# Rules in precedence order: (option, group name, pattern)
+RULES = [
+    ('strip_urls', 'url', URL_RE),
+    ('strip_urls', 'email', EMAIL_RE),
+    ('strip_footnotes', 'footnote', FOOTNOTE_RE),
+    ('expand_abbreviations', 'abbreviation', ABBREVIATION_RE),
+    ('expand_numbers', 'number', NUMBER_RE),
+    ('collapse_symbols', 'symbols', SYMBOL_RUN_RE),
+    ('collapse_symbols', 'punctuation', PUNCT_RUN_RE),
+]
+
+_compiled_rules = {}
+
+def _get_master_pattern(enabled):
+    """
+    Combine the enabled rules plus whitespace into one alternation so the
+    whole document is normalized in a single regex pass.
+    Compiled once per distinct option set.
+    """
+    pattern = _compiled_rules.get(enabled)
+    if pattern is None:
+        parts = []
+        for option, name, rule in RULES:
+            if option in enabled:
+                parts.append(f'(?P<{name}>{rule.pattern})')
+        parts.append(f'(?P<space>{WHITESPACE_RE.pattern})')
+        pattern = re.compile('|'.join(parts))
+        _compiled_rules[enabled] = pattern
+    return pattern
+
+def _replacement(match):
+    kind = match.lastgroup
+    if kind == 'abbreviation':
+        return ABBREVIATIONS[match.group(kind)]
+    if kind == 'number':
+        return _expand_number(match)
+    if kind == 'punctuation':
+        text = match.group(kind)
+        return '.' if text == '…' else text[0]
+    # Removed spans become a space so neighbouring words don't merge
+    return ' '
+
+def normalize_text(text, options=None):
+    """
+    Normalize text for synthesis.
+    Returns (normalized_text, offsets) where offsets[i] is the index in the
+    original text of normalized character i; the extra final entry marks
+    where the normalized text ends in the original.
+    """
+    opts = dict(DEFAULT_OPTIONS)
+    if options:
+        opts.update({k: v for k, v in options.items() if k in DEFAULT_OPTIONS})
+    enabled = frozenset(k for k, v in opts.items() if v)
+
+    pieces = []
+    offsets = []
+    pos = 0
+    last_was_space = True  # Drops leading whitespace
+
+    def copy(start, end):
+        nonlocal last_was_space
+        if last_was_space and text[start] == ' ':
+            start += 1
+            if start == end:
+                return
+        pieces.append(text[start:end])
+        offsets.extend(range(start, end))
+        last_was_space = text[end - 1] == ' '
+
+    for match in _get_master_pattern(enabled).finditer(text):
+        start, end = match.span()
+        if start > pos:
+            copy(start=pos, end=start)
+        replacement = _replacement(match)
+        if replacement == ' ':
+            if not last_was_space:
+                pieces.append(' ')
+                offsets.append(start)
+                last_was_space = True
+        else:
+            pieces.append(replacement)
+            offsets.extend([start] * len(replacement))
+            last_was_space = replacement.endswith(' ')
+        pos = end
+    if pos < len(text):
+        copy(start=pos, end=len(text))
+
+    normalized = ''.join(pieces)
+    if last_was_space and normalized:
+        # Trailing space becomes the end-of-text sentinel
+        normalized = normalized[:-1]
+    else:
+        offsets.append(pos if last_was_space else len(text))
+    return normalized, offsets
+
+def compress_offsets(offsets):
+    """
+    Run-length encode an offset map as [[normalized_index, original_index], ...]
+    Each pair starts a run where both indexes advance together.
+    """
+    runs = []
+    previous = None
+    for i, original in enumerate(offsets):
+        if previous is None or original != previous + 1:
+            runs.append([i, original])
+        previous = original
+    return runs
+
+def original_span(offsets, start, end):
+    """Map a [start, end) span of normalized text back to the original text"""
+    start = min(max(start, 0), len(offsets) - 1)
+    end = min(max(end, start), len(offsets) - 1)
+    return offsets[start], offsets[end]
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Request Tracing for Read Aloud TTS
+Optional timing spans around each stage of a request, exported as
+OpenTelemetry (OTLP/JSON) to a file or an OTLP/HTTP collector.
+When tracing is off every span() call returns a shared no-op object.
+
+Collector stand-in:  python3 tracing.py collect --port 4318 --out traces.jsonl
+Show traces:         python3 tracing.py show traces.jsonl
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+
+SERVICE_NAME = 'read-aloud'
+
+# Spans are exported in batches from a background thread
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL = 1.0
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_exporter = None
+_local = threading.local()
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class Span:
+    """A timed operation within a trace; use as a context manager"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes',
+                 'start_ns', 'end_ns', 'error', 'kind')
+
+    def __init__(self, trace_id, parent_id, name, attributes, kind=1):
+        self.kind = kind  # OTLP SpanKind: 1 internal, 2 server
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = None
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if _exporter is not None:
+            _exporter.add(self)
+        return False
+
+class _NoopSpan:
+    trace_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def enabled():
+    return _exporter is not None
+
+def start_trace(name, traceparent=None, **attributes):
+    """
+    Root span of a traced request, continuing the caller's trace when a
+    W3C traceparent header is given (an unsampled one turns tracing off)
+    """
+    if _exporter is None:
+        return NOOP_SPAN
+    trace_id, parent_id = os.urandom(16).hex(), None
+    match = TRACEPARENT_RE.match((traceparent or '').strip().lower())
+    if match:
+        if not int(match.group(3), 16) & 1:
+            return NOOP_SPAN
+        trace_id, parent_id = match.group(1), match.group(2)
+    return Span(trace_id, parent_id, name, attributes, kind=2)
+
+def span(name, **attributes):
+    """Child span of the current span; a no-op outside a traced request"""
+    if _exporter is None:
+        return NOOP_SPAN
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return NOOP_SPAN
+    parent = stack[-1]
+    return Span(parent.trace_id, parent.span_id, name, attributes)
+
+def current():
+    """The innermost open span of this thread (None outside traces)"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+class attach:
+    """Continue `parent` (from current()) in another thread"""
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    def __enter__(self):
+        if self.parent is not None:
+            _stack().append(self.parent)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.parent is not None:
+            stack = _stack()
+            if stack and stack[-1] is self.parent:
+                stack.pop()
+        return False
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+def to_otlp(spans):
+    """OTLP/JSON ExportTraceServiceRequest for a batch of finished spans"""
+    encoded = []
+    for s in spans:
+        item = {
+            'traceId': s.trace_id,
+            'spanId': s.span_id,
+            'name': s.name,
+            'kind': s.kind,
+            'startTimeUnixNano': str(s.start_ns),
+            'endTimeUnixNano': str(s.end_ns),
+            'attributes': [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+            'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+        }
+        if s.parent_id:
+            item['parentSpanId'] = s.parent_id
+        encoded.append(item)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', SERVICE_NAME),
+                                    _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': 'read-aloud.tracing'}, 'spans': encoded}],
+    }]}
+
+class BatchExporter:
+    """Queues finished spans and ships them to a sink in the background"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=100000)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, finished):
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                self.sink(to_otlp(batch))
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+
+def file_sink(path):
+    """Append one OTLP/JSON request per line"""
+    lock = threading.Lock()
+
+    def write(payload):
+        line = json.dumps(payload, separators=(',', ':')) + '\n'
+        with lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+    return write
+
+def http_sink(url):
+    """POST OTLP/JSON to a collector (e.g. http://localhost:4318)"""
+    if not url.rstrip('/').endswith('/v1/traces'):
+        url = url.rstrip('/') + '/v1/traces'
+
+    def post(payload):
+        body = json.dumps(payload).encode('utf-8')
+        req = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=5) as response:
+            response.read()
+    return post
+
+def configure(spec):
+    """
+    Turn tracing on: spec is http(s)://collector:4318 or a file path
+    (optionally file://...). Returns a description, or None if spec is empty.
+    """
+    global _exporter
+    if not spec:
+        return None
+    if spec.startswith(('http://', 'https://')):
+        sink, description = http_sink(spec), f'OTLP/HTTP {spec}'
+    else:
+        path = spec[len('file://'):] if spec.startswith('file://') else spec
+        sink, description = file_sink(path), f'OTLP/JSON file {path}'
+    _exporter = BatchExporter(sink)
+    return description
+
+# ============================================================================
+# COLLECTOR STAND-IN AND VIEWER
+# ============================================================================
+
+def format_traces(payloads):
+    """Render OTLP payloads as indented span trees with durations"""
+    spans = []
+    for payload in payloads:
+        for resource in payload.get('resourceSpans', []):
+            for scope in resource.get('scopeSpans', []):
+                spans.extend(scope.get('spans', []))
+    by_trace = {}
+    for s in spans:
+        by_trace.setdefault(s['traceId'], []).append(s)
+
+    lines = []
+    for trace_id, trace_spans in by_trace.items():
+        ids = {s['spanId'] for s in trace_spans}
+        children = {}
+        for s in trace_spans:
+            parent = s.get('parentSpanId') if s.get('parentSpanId') in ids else None
+            children.setdefault(parent, []).append(s)
+        lines.append(f'trace {trace_id}')
+
+        def walk(parent, depth):
+            for s in sorted(children.get(parent, []), key=lambda s: int(s['startTimeUnixNano'])):
+                ms = (int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6
+                attrs = ' '.join(f"{a['key']}={list(a['value'].values())[0]}"
+                                 for a in s.get('attributes', []))
+                error = ' ERROR' if s.get('status', {}).get('code') == 2 else ''
+                lines.append(f"{'  ' * (depth + 1)}{s['name']:<{40 - 2 * depth}} {ms:>9.2f} ms{error}  {attrs}")
+                walk(s['spanId'], depth + 1)
+        walk(None, 0)
+    return '\n'.join(lines)
+
+def collect(port, out):
+    """Minimal OTLP/HTTP JSON receiver: prints span trees, optionally saves them"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip('/') != '/v1/traces':
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_error(400, 'Expected OTLP/JSON')
+                return
+            with lock:
+                print(format_traces([payload]), flush=True)
+                if out:
+                    with open(out, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Trace collector listening on http://localhost:{port}/v1/traces")
+    ThreadingHTTPServer(('0.0.0.0', port), CollectorHandler).serve_forever()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Read Aloud trace collector and viewer')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    collect_parser = subparsers.add_parser('collect', help='run a local OTLP/HTTP collector stand-in')
+    collect_parser.add_argument('--port', type=int, default=4318)
+    collect_parser.add_argument('--out', help='also append received payloads to this file')
+    show_parser = subparsers.add_parser('show', help='print span trees from an exported file')
+    show_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        collect(args.port, args.out)
+    else:
+        with open(args.path, encoding='utf-8') as f:
+            print(format_traces(json.loads(line) for line in f if line.strip()))
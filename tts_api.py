@@ -0,0 +1,735 @@
+#!/usr/bin/env python3
+"""
+TTS API for Read Aloud
+Flask blueprint with /synthesize, the /stream WebSocket and their companions:
+voice and language listings, normalization preview, speculation control
+and readiness.
+Synthesis goes through the engine plugins in engines.py.
+"""
+
+from flask import Blueprint, request, jsonify, send_file, current_app
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from text_normalizer import normalize_text, compress_offsets
+from synthesis_cache import cache_key, get_cache, MemoryCache, SingleFlight
+from speculation import Speculator
+from cancellation import CancelToken, SynthesisCancelled, client_disconnected
+from multivoice import parse_ssml, parse_spans, concatenate
+from language_id import detect_language, VoiceIndex
+from engines import ENGINES, DEFAULT_PIPER_VOICE, cancellations, default_engine, get_engine
+from fast_start import FAST_START_ENGINE, FirstAudioStats, split_first_sentence
+import segment_sizing
+import tracing
+
+tts = Blueprint('tts', __name__)
+
+# Shared synthesis cache (set with configure())
+synthesis_cache = None
+
+# Identical concurrent requests share one engine run
+synthesis_flights = SingleFlight()
+
+# The rest of fast-start requests, rendered ahead of their follow-up requests
+fast_start_renders = MemoryCache(max_items=32)
+
+# Time to first audio of chunks that start playback (see fast_start.py)
+first_audio = FirstAudioStats()
+
+# Language of the default voice (no re-routing needed for it)
+DEFAULT_LANGUAGE = DEFAULT_PIPER_VOICE.split('_')[0]
+
+# Language -> installed voice index for automatic routing (see get_voice_index)
+voice_index = None
+voice_index_lock = threading.Lock()
+
+# Language settled for each document (doc_id), so one misread chunk (a list
+# of headings, a name) doesn't change the voice partway through
+document_languages = MemoryCache(max_items=256)
+
+# A chunk leaves the document's language (or the default voice) only when
+# detected at least this confidently, with at least this many words
+LANGUAGE_SWITCH_CONFIDENCE = 0.5
+LANGUAGE_SWITCH_MIN_WORDS = 8
+
+# Spans of a multi-voice request rendered at once
+MULTIVOICE_WORKERS = max(2, os.cpu_count() or 2)
+
+# Voice warm-up state (reported by /ready)
+warmup_status = {}  # 'engine:voice' -> 'pending', 'ready' or 'failed: <error>'
+warmup_done = threading.Event()
+warmup_done.set()  # Nothing to warm up unless --preload is given
+
+# Optional audio post-processing (needs numpy). Checking for numpy without
+# importing it keeps startup fast; audio_postprocess is imported on first use.
+POSTPROCESS_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+def configure(cache=None):
+    """
+    Use a shared synthesis cache (dir:///path, redis://host:port/db or
+    memory://) for requests and speculation; returns it, or None
+    """
+    global synthesis_cache
+    synthesis_cache = get_cache(cache)
+    if synthesis_cache:
+        speculator.store = synthesis_cache
+    return synthesis_cache
+
+@tts.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness check endpoint
+    Returns 503 until the voices listed with --preload are warmed up, so load
+    balancers only route traffic to warm instances (/health is liveness only)
+    """
+    is_ready = warmup_done.is_set() and all(
+        state == 'ready' for state in warmup_status.values())
+    return jsonify({
+        'ready': is_ready,
+        'voices': dict(warmup_status)
+    }), 200 if is_ready else 503
+
+@tts.route('/synthesize', methods=['POST'])
+def synthesize():
+    """
+    Synthesize text to speech
+    Body: {
+        "text": "text to speak",
+        "engine": "espeak" or "piper" (optional, defaults to best available),
+        "rate": 1.0 (speed multiplier, optional),
+        "voice": "voice name" (optional),
+        "speaker": Piper speaker id or eSpeak variant (optional),
+        "lang": "de" (optional; with engine "auto" and no voice the language
+                is otherwise detected from the text),
+        "normalize": true, false or {options} (optional, see text_normalizer),
+        "doc_id": "document id" (optional, enables speculative synthesis),
+        "position": segment index of this text within the document,
+        "upcoming": ["text of segment position+1", ...] (optional),
+        "postprocess": {"trim": true, "loudness_db": -20, "sample_rate": 48000}
+                       (optional, see audio_postprocess),
+        "request_id": "client-chosen id" (optional, or X-Request-Id header;
+                      lets /synthesize/cancel stop this request),
+        "ssml": "<speak>...</speak>" or "spans": [{"text", "voice", "lang",
+                "speaker", "engine", "rate"} or {"break_ms"}, ...]
+                (optional, instead of "text"; see synthesize_multivoice),
+        "first": true (optional, this chunk starts playback; timed as time
+                 to first audio),
+        "fast_start": true (optional, return only the first sentence, fast;
+                      see fast_start.py)
+    }
+    Engine work is killed when the request is cancelled or the client
+    disconnects, unless another request is waiting for the same audio.
+    A fast start sets X-Fast-Start (engine used) and X-Spoken-Words (words
+    of "text" covered); the client then requests the remaining words.
+    X-Segment-Sizes holds the current /segment-size recommendation.
+    """
+    started = time.time()
+    with tracing.span('request.parse_json'):
+        data = request.json
+    engine = data.get('engine', 'auto')
+    rate = data.get('rate', 1.0)
+    voice = data.get('voice', None)
+    speaker = data.get('speaker', None)
+    normalize = data.get('normalize', True)
+    doc_id = data.get('doc_id', None)
+    postprocess = data.get('postprocess', None)
+    request_id = data.get('request_id') or request.headers.get('X-Request-Id')
+    
+    try:
+        check_postprocess(postprocess)
+        if data.get('ssml') or data.get('spans'):
+            return synthesize_multivoice(data, engine, rate, voice, normalize, postprocess, request_id)
+        text, engine, voice, language = prepare_segment(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    token = cancellations.register(request_id, client_disconnected(request.environ))
+    try:
+        fast = data.get('fast_start') and render_fast_start(data, text, engine, voice,
+                                                            language, rate, token)
+        if fast:
+            audio_data, cache_status, fast_engine, spoken_words = fast
+        else:
+            audio_data, cache_status = synthesize_cached(text, engine, rate, voice,
+                                                         tagged=doc_id is not None, token=token,
+                                                         speaker=speaker)
+            spoken_words = None
+        # The cache holds raw engine output; post-processing is applied per request
+        if postprocess:
+            with tracing.span('postprocess'):
+                import audio_postprocess
+                audio_data = audio_postprocess.process_wav(audio_data, postprocess)
+        with tracing.span('response.build', bytes=len(audio_data)):
+            response = send_file(io.BytesIO(audio_data), mimetype='audio/wav')
+        response.headers['X-Cache'] = cache_status
+        if language:
+            response.headers['X-Language'] = language
+        if spoken_words is not None:
+            response.headers['X-Fast-Start'] = fast_engine
+            response.headers['X-Spoken-Words'] = str(spoken_words)
+        response.headers['X-Segment-Sizes'] = ','.join(map(str, segment_sizes(engine, voice, rate)))
+        response.headers['Access-Control-Expose-Headers'] = \
+            'X-Cache, X-Language, X-Fast-Start, X-Spoken-Words, X-Segment-Sizes'
+        if data.get('first'):
+            record_first_audio(started, cache_status, spoken_words)
+        return response
+    
+    except SynthesisCancelled as e:
+        # 499: client closed request (nobody is usually left to read this)
+        return jsonify({'error': 'Synthesis cancelled', 'reason': e.reason}), 499
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cancellations.unregister(token)
+
+def check_postprocess(postprocess):
+    """Raise ValueError unless post-processing options are usable"""
+    if not postprocess:
+        return
+    if not POSTPROCESS_AVAILABLE:
+        raise ValueError('Audio post-processing requires numpy: pip install numpy')
+    import audio_postprocess
+    audio_postprocess.parse_options(postprocess)
+
+def prepare_segment(data, rate=None, speculate=True):
+    """
+    Resolve a single-text request (a /synthesize body or a /stream segment):
+    normalize the text, pick the engine and voice, and queue speculation of
+    the document's upcoming segments (unless speculate is False). Returns
+    (text, engine, voice, language); raises ValueError for unusable input.
+    """
+    text = data.get('text', '')
+    engine = data.get('engine', 'auto')
+    voice = data.get('voice', None)
+    rate = data.get('rate', 1.0) if rate is None else rate
+    normalize = data.get('normalize', True)
+    doc_id = data.get('doc_id', None)
+    
+    if not text:
+        raise ValueError('No text provided')
+    
+    # Strip URLs, footnote markers and symbol runs before the engine sees them
+    normalize_options = normalize if isinstance(normalize, dict) else None
+    if normalize:
+        with tracing.span('normalize', chars=len(text)):
+            text, _ = normalize_text(text, normalize_options)
+        if not text:
+            raise ValueError('No speakable text after normalization')
+    
+    # Auto-select engine and voice for the text's language
+    language = None
+    if engine == 'auto' and not voice:
+        with tracing.span('route_language') as trace_span:
+            engine, voice, language = route_by_language(text, data.get('lang'), doc_id)
+            trace_span.set_attribute('language', language)
+    elif engine == 'auto':
+        engine = default_engine()
+    
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine: {engine}')
+    
+    # Render the following segments in the background while this one plays
+    if doc_id is not None and speculate:
+        upcoming = data.get('upcoming', [])
+        if normalize:
+            upcoming = [normalize_text(t, normalize_options)[0] for t in upcoming]
+        with tracing.span('speculation.observe', upcoming=len(upcoming)):
+            speaker = data.get('speaker')
+            speculator.observe(doc_id, int(data.get('position', 0)), [t for t in upcoming if t],
+                               lambda t: cache_key(t, engine, voice, rate, speaker),
+                               engine, rate, voice, speaker)
+    
+    return text, engine, voice, language
+
+def synthesize_multivoice(data, engine, rate, voice, normalize, postprocess, request_id):
+    """
+    /synthesize for documents mixing voices, languages or speakers.
+    Each span is rendered in parallel through the cache like a single-voice
+    request (span rates multiply the request rate; a span "lang" without a
+    "voice" picks an installed voice for that language). The response is one
+    WAV; X-Span-Timings holds [{"text", "start_ms", "end_ms", "voice", ...}].
+    """
+    try:
+        spans = parse_ssml(data['ssml']) if data.get('ssml') else parse_spans(data['spans'])
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    normalize_options = normalize if isinstance(normalize, dict) else None
+    jobs = []  # (span, (text, engine, rate, voice, speaker) or None for breaks)
+    for span in spans:
+        if 'text' not in span:
+            jobs.append((span, None))
+            continue
+        span_engine = span.get('engine', engine)
+        span_voice = span.get('voice', voice if span_engine == engine else None)
+        if span_engine == 'auto':
+            span_engine = default_engine()
+        if span_engine not in ENGINES:
+            return jsonify({'error': f'Unknown engine: {span_engine}'}), 400
+        if span.get('lang') and not span.get('voice'):
+            span_engine, span_voice = voice_for_language(span['lang'], span_engine)
+        text = normalize_text(span['text'], normalize_options)[0] if normalize else span['text']
+        if not text:
+            continue
+        span = dict(span, engine=span_engine, voice=span_voice)
+        jobs.append((span, (text, span_engine, rate * float(span.get('rate', 1.0)),
+                            span_voice, span.get('speaker'))))
+    if not any(args for _, args in jobs):
+        return jsonify({'error': 'No speakable text after normalization'}), 400
+    
+    token = cancellations.register(request_id, client_disconnected(request.environ))
+    parent = tracing.current()
+    
+    def render(args):
+        text, span_engine, span_rate, span_voice, speaker = args
+        try:
+            with tracing.attach(parent), tracing.span('span.render', engine=span_engine,
+                                                      voice=span_voice, chars=len(text)):
+                return synthesize_cached(text, span_engine, span_rate, span_voice,
+                                         token=token, speaker=speaker)
+        except Exception:
+            token.cancel('failed')  # Stop the other spans too
+            raise
+    
+    try:
+        rendered = [args for _, args in jobs if args]
+        with ThreadPoolExecutor(max_workers=min(MULTIVOICE_WORKERS, len(rendered))) as pool:
+            results = list(pool.map(render, rendered))
+        audio = iter(audio_data for audio_data, _ in results)
+        pieces = [(span, next(audio) if args else None) for span, args in jobs]
+        with tracing.span('concatenate', spans=len(pieces)):
+            audio_data, timings = concatenate(pieces)
+        if postprocess:
+            with tracing.span('postprocess'):
+                import audio_postprocess
+                audio_data = audio_postprocess.process_wav(audio_data, postprocess)
+        response = send_file(io.BytesIO(audio_data), mimetype='audio/wav')
+        response.headers['X-Cache'] = ','.join(status for _, status in results)
+        response.headers['X-Span-Timings'] = json.dumps(timings, separators=(',', ':'))
+        response.headers['Access-Control-Expose-Headers'] = 'X-Span-Timings, X-Cache'
+        return response
+    
+    except SynthesisCancelled as e:
+        return jsonify({'error': 'Synthesis cancelled', 'reason': e.reason}), 499
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cancellations.unregister(token)
+
+@tts.route('/synthesize/cancel', methods=['POST'])
+def cancel_synthesis():
+    """
+    Cancel an in-flight /synthesize request
+    Body: {"request_id": "id sent with the request"}
+    """
+    data = request.get_json(silent=True) or {}
+    request_id = data.get('request_id')
+    if not request_id:
+        return jsonify({'error': 'No request_id provided'}), 400
+    return jsonify({'success': True, 'cancelled': cancellations.cancel(request_id)})
+
+@tts.route('/stream', websocket=True)
+def stream():
+    """
+    Streaming synthesis over a WebSocket: segments and control messages
+    (cancel, seek, rate) go up, binary PCM frames and timing events come
+    back. See streaming.py for the protocol.
+    """
+    import streaming
+    try:
+        ws = streaming.accept(request.environ)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cast = None
+    if 'cast' in current_app.blueprints:
+        import cast_api
+        if cast_api.PYCHROMECAST_AVAILABLE:
+            port = request.environ.get('SERVER_PORT', '5000')
+            cast = lambda audio_data: cast_api.cast_audio_bytes(audio_data, port)
+    streaming.StreamSession(ws, render_stream_segment, cast, speculator.cancel).run()
+    return streaming.ClosedResponse()
+
+def render_stream_segment(options, token):
+    """Audio for one /stream segment; returns (wav_bytes, event fields)"""
+    started = time.time()
+    check_postprocess(options.get('postprocess'))
+    rate = float(options.get('rate', 1.0))
+    text, engine, voice, language = prepare_segment(options, rate)
+    info = {'engine': engine, 'language': language}
+    try:
+        fast = options.get('fast_start') and render_fast_start(options, text, engine, voice,
+                                                               language, rate, token)
+        if fast:
+            audio_data, cache_status, fast_engine, spoken_words = fast
+        else:
+            audio_data, cache_status = synthesize_cached(text, engine, rate, voice,
+                                                         tagged=options.get('doc_id') is not None,
+                                                         token=token, speaker=options.get('speaker'))
+            spoken_words = None
+    finally:
+        cancellations.unregister(token)  # Accounts the cancellation, if any
+    if options.get('postprocess'):
+        with tracing.span('postprocess'):
+            import audio_postprocess
+            audio_data = audio_postprocess.process_wav(audio_data, options['postprocess'])
+    if spoken_words is not None:
+        info.update(fast_start=fast_engine, spoken_words=spoken_words)
+    info['segment_sizes'] = segment_sizes(engine, voice, rate)
+    if options.get('first'):
+        record_first_audio(started, cache_status, spoken_words)
+    return audio_data, dict(info, cache=cache_status)
+
+def synthesize_cached(text, engine, rate=1.0, voice=None, tagged=False, token=None, speaker=None):
+    """
+    Synthesize through the speculation store and the shared cache
+    Returns (wav_bytes, 'speculated' | 'hit' | 'coalesced' | 'miss' | 'off')
+    """
+    key = cache_key(text, engine, voice, rate, speaker)
+    audio_data, cache_status = cached_audio(key, tagged, token)
+    if audio_data is not None:
+        return audio_data, cache_status
+    
+    with tracing.span('synthesis', engine=engine, voice=voice, chars=len(text)) as trace_span:
+        audio_data, shared = render_coalesced(text, engine, rate, voice, token=token, speaker=speaker)
+        trace_span.set_attribute('coalesced', shared)
+    if shared:
+        return audio_data, 'coalesced'
+    
+    if synthesis_cache:
+        with tracing.span('cache.put', bytes=len(audio_data)):
+            synthesis_cache.put(key, audio_data)
+        return audio_data, 'miss'
+    return audio_data, 'off'
+
+def cached_audio(key, tagged=False, token=None):
+    """
+    Audio for key that needs no engine run: speculated (or being speculated),
+    in the shared cache or rendered ahead by a fast start.
+    Returns (wav_bytes, 'speculated' | 'hit') or (None, None)
+    """
+    with tracing.span('speculation.claim'):
+        audio_data = speculator.claim(key, tagged, token)
+    if audio_data is not None:
+        return audio_data, 'speculated'
+    if synthesis_cache:
+        with tracing.span('cache.get', backend=type(synthesis_cache).__name__):
+            audio_data = synthesis_cache.get(key)
+        if audio_data is not None:
+            return audio_data, 'hit'
+    audio_data = fast_start_renders.get(key)
+    if audio_data is not None:
+        return audio_data, 'hit'
+    return None, None
+
+def render_coalesced(text, engine, rate=1.0, voice=None, low_priority=False, token=None,
+                     speaker=None):
+    """
+    render_audio() with single-flight deduplication on (text, engine, voice, rate, speaker)
+    Returns (wav_bytes, shared) where shared means another caller did the work.
+    The engine is killed once every caller sharing the work has been cancelled.
+    """
+    key = cache_key(text, engine, voice, rate, speaker)
+    return synthesis_flights.do(
+        key,
+        lambda: render_audio(text, engine, rate, voice, low_priority,
+                             abort=lambda: synthesis_flights.abandoned(key), speaker=speaker),
+        token)
+
+def render_audio(text, engine, rate=1.0, voice=None, low_priority=False, abort=None,
+                 speaker=None):
+    """Run an engine and return the WAV bytes"""
+    return get_engine(engine).synthesize(text, rate, voice, speaker, low_priority, abort)
+
+@tts.route('/speculation/cancel', methods=['POST'])
+def cancel_speculation():
+    """
+    Drop background synthesis when the reader stops or seeks
+    Body: {"doc_id": "document id"} (optional, all documents if omitted)
+    """
+    data = request.get_json(silent=True) or {}
+    speculator.cancel(data.get('doc_id'))
+    return jsonify({'success': True})
+
+@tts.route('/speculation/stats', methods=['GET'])
+def speculation_stats():
+    """Speculative synthesis counters and hit rate"""
+    return jsonify(speculator.get_stats())
+
+@tts.route('/normalize', methods=['POST'])
+def normalize():
+    """
+    Preview text normalization
+    Body: {"text": "text to clean", "options": {...} (optional)}
+    Returns the normalized text plus a run-length encoded offset map
+    ([[normalized_index, original_index], ...]) for re-aligning highlights
+    """
+    data = request.json
+    text = data.get('text', '')
+    options = data.get('options', None)
+    
+    normalized, offsets = normalize_text(text, options)
+    return jsonify({'text': normalized, 'offsets': compress_offsets(offsets)})
+
+@tts.route('/voices', methods=['GET'])
+def list_voices():
+    """List available voices"""
+    engine = request.args.get('engine', 'auto')
+    refresh = request.args.get('refresh') == '1'
+    
+    if engine == 'auto':
+        engine = default_engine()
+    
+    if engine not in ENGINES:
+        return jsonify({'error': f'Unknown engine: {engine}'}), 400
+    
+    try:
+        voices = get_engine(engine).list_voices(refresh)
+        return jsonify({'engine': engine, 'voices': voices})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tts.route('/engines', methods=['GET'])
+def list_engines():
+    """Registered engines and what each supports"""
+    return jsonify({
+        'default': default_engine(),
+        'engines': {name: engine.capabilities() for name, engine in ENGINES.items()}
+    })
+
+@tts.route('/segment-size', methods=['GET'])
+def segment_size():
+    """
+    Recommended segment sizes (see segment_sizing)
+    Query: engine (default auto), voice, rate
+    Returns {"sizes": [words, ...]}: the segment that starts playback, then
+    the ones after it; the last size repeats
+    """
+    engine = request.args.get('engine', 'auto')
+    if engine == 'auto':
+        engine = default_engine()
+    if engine not in ENGINES:
+        return jsonify({'error': f'Unknown engine: {engine}'}), 400
+    try:
+        rate = float(request.args.get('rate', 1.0))
+    except ValueError:
+        return jsonify({'error': 'Invalid rate'}), 400
+    voice = request.args.get('voice') or get_engine(engine).default_voice
+    return jsonify({
+        'engine': engine,
+        'voice': voice,
+        'rate': rate,
+        'sizes': segment_sizes(engine, voice, rate),
+        'measured': segment_sizing.timings.estimate(engine, voice) is not None
+    })
+
+def segment_sizes(engine, voice, rate):
+    """Recommended segment sizes for a resolved engine and voice"""
+    return segment_sizing.timings.schedule(engine, voice or get_engine(engine).default_voice, rate)
+
+# ============================================================================
+# LANGUAGE ROUTING
+# ============================================================================
+
+def get_voice_index(refresh=False):
+    """The language -> voice index, built from the voice catalogs once"""
+    global voice_index
+    with voice_index_lock:
+        if voice_index is None or refresh:
+            piper_voices = get_engine('piper').list_voices(refresh)
+            espeak_voices = get_engine('espeak').list_voices(refresh)
+            voice_index = VoiceIndex(piper_voices, espeak_voices, preferred=[DEFAULT_PIPER_VOICE])
+        return voice_index
+
+def voice_for_language(lang, engine):
+    """
+    Pick (engine, voice) for a language tag such as 'de' or 'pt-BR',
+    preferring `engine`; falls back to the engine's default voice
+    """
+    if lang.split('-')[0].lower() == DEFAULT_LANGUAGE and engine == 'piper':
+        return 'piper', None
+    choice = get_voice_index().lookup(lang, engine)
+    if choice is None:
+        return engine, None
+    return choice
+
+def route_by_language(text, lang=None, doc_id=None):
+    """
+    Engine, voice and language for an 'auto' request without a voice:
+    the language comes from the request or is detected from the text. A
+    detection that is unsure, or from a short chunk, keeps the document's
+    language (the default voice before one is settled).
+    """
+    engine = default_engine()
+    if not lang:
+        lang, confidence = detect_language(text)
+        if confidence < LANGUAGE_SWITCH_CONFIDENCE or len(text.split()) < LANGUAGE_SWITCH_MIN_WORDS:
+            lang = document_languages.get(doc_id) if doc_id is not None else None
+    if lang and doc_id is not None:
+        document_languages.put(doc_id, lang)
+    if not lang:
+        return engine, None, None
+    engine, voice = voice_for_language(lang, engine)
+    return engine, voice, lang
+
+@tts.route('/languages', methods=['GET'])
+def list_languages():
+    """Languages with an installed voice, and the voice auto mode picks for each"""
+    index = get_voice_index(refresh=request.args.get('refresh') == '1')
+    engine = default_engine()
+    languages = {}
+    for lang in index.languages():
+        choice = index.lookup(lang, engine)
+        languages[lang] = {'engine': choice[0], 'voice': choice[1]}
+    return jsonify({'languages': languages})
+
+def render_speculative(text, engine, rate=1.0, voice=None, low_priority=True, token=None,
+                       speaker=None):
+    """Speculative renders share in-flight work with foreground requests"""
+    return render_coalesced(text, engine, rate, voice, low_priority, token, speaker)[0]
+
+# Background renderer for the segments after the one being requested
+speculator = Speculator(render_speculative)
+
+# ============================================================================
+# FAST START
+# ============================================================================
+
+def render_fast_start(data, text, engine, voice, language, rate, token):
+    """
+    Just the first sentence of a request, with the rest rendered in the
+    background for the follow-up request (see fast_start.py). text, engine,
+    voice and language are data as resolved by prepare_segment().
+    Returns (wav_bytes, cache_status, engine_used, spoken_words), where
+    spoken_words is None if the whole text was already rendered; or None
+    to render the whole text as usual.
+    """
+    speaker = data.get('speaker')
+    if engine == FAST_START_ENGINE or not get_engine(FAST_START_ENGINE).available():
+        return None
+    split = split_first_sentence(data['text'])
+    if split is None:
+        return None
+    first, rest, first_words = split
+    
+    audio_data, cache_status = cached_audio(cache_key(text, engine, voice, rate, speaker),
+                                            data.get('doc_id') is not None, token)
+    if audio_data is not None:
+        return audio_data, cache_status, engine, None
+    
+    # eSpeak voice for the text's language: as routed, requested or detected
+    # (voice names don't reliably carry it: model paths, eSpeak voices)
+    if not language:
+        doc_id = data.get('doc_id')
+        language = (data.get('lang') or detect_language(data['text'])[0]
+                    or (document_languages.get(doc_id) if doc_id is not None else None)
+                    or DEFAULT_LANGUAGE)
+    fast_engine, fast_voice = voice_for_language(language, FAST_START_ENGINE)
+    if fast_engine != FAST_START_ENGINE:
+        return None
+    
+    # The follow-up request asks for the rest with this request's settings
+    rest_data = dict(data, text=rest)
+    try:
+        first_text = prepare_segment(dict(rest_data, text=first, engine=engine, voice=voice), rate,
+                                     speculate=False)[0]
+        rest_text, rest_engine, rest_voice, _ = prepare_segment(rest_data, rate, speculate=False)
+    except ValueError:
+        return None
+    # Killed with this request, or when the reader stops or seeks in the document
+    # (after this request, stop and skip only cancel the document's speculation).
+    # Only explicit cancellation counts: the connection closing once the first
+    # sentence is sent is no reason to drop the rest.
+    doc_id = data.get('doc_id')
+    doc_cancelled = speculator.cancelled_check(doc_id) if doc_id is not None else (lambda: False)
+    rest_token = CancelToken(
+        check=lambda: (token is not None and token.event.is_set()) or doc_cancelled())
+    threading.Thread(target=prerender,
+                     args=(rest_text, rest_engine, rate, rest_voice, speaker, rest_token),
+                     daemon=True).start()
+    
+    audio_data, cache_status = cached_audio(cache_key(first_text, engine, voice, rate, speaker))
+    if audio_data is not None:
+        return audio_data, cache_status, engine, first_words
+    with tracing.span('fast_start', engine=FAST_START_ENGINE, words=first_words):
+        audio_data, cache_status = synthesize_cached(first_text, FAST_START_ENGINE, rate, fast_voice,
+                                                     token=token)
+    return audio_data, cache_status, FAST_START_ENGINE, first_words
+
+def prerender(text, engine, rate, voice, speaker, token):
+    """
+    Render the rest of a fast-start request; its follow-up joins or finds it.
+    The engine is killed once the token and every joined request are cancelled.
+    """
+    key = cache_key(text, engine, voice, rate, speaker)
+    if synthesis_cache and synthesis_cache.get(key) is not None:
+        return
+    
+    def render():
+        audio_data = render_audio(text, engine, rate, voice, speaker=speaker,
+                                  abort=lambda: synthesis_flights.abandoned(key))
+        fast_start_renders.put(key, audio_data)
+        if synthesis_cache:
+            synthesis_cache.put(key, audio_data)
+        return audio_data
+    
+    try:
+        synthesis_flights.do(key, render, token)
+    except SynthesisCancelled:
+        pass
+    except Exception as e:
+        print(f"Fast-start render failed: {e}")
+
+def record_first_audio(started, cache_status, spoken_words):
+    """Time to first audio of a chunk that started playback"""
+    if spoken_words is not None:
+        mode = 'fast_start'
+    elif cache_status in ('speculated', 'hit'):
+        mode = 'cached'
+    else:
+        mode = 'full'
+    first_audio.record(mode, time.time() - started)
+
+# ============================================================================
+# VOICE WARM-UP
+# ============================================================================
+
+def parse_voice_spec(spec):
+    """Split 'engine:voice' into (engine, voice); a bare name is a Piper voice"""
+    if spec in ENGINES:
+        return spec, None
+    engine, sep, voice = spec.partition(':')
+    if not sep:
+        return 'piper', spec
+    return engine, voice or None
+
+def warm_up_voices(specs):
+    """Load each voice and synthesize a dummy utterance, then mark the server ready"""
+    for spec in specs:
+        engine, voice = parse_voice_spec(spec)
+        key = f"{engine}:{voice or 'default'}"
+        started = time.time()
+        try:
+            get_engine(engine).warmup(voice)
+            warmup_status[key] = 'ready'
+            print(f"Warmed up {key} in {time.time() - started:.2f}s")
+        except Exception as e:
+            warmup_status[key] = f'failed: {e}'
+            print(f"Warm-up failed for {key}: {e}")
+    warmup_done.set()
+
+def start_warmup(specs):
+    """Warm up voices in the background; /ready reports 503 until done"""
+    if not specs:
+        return
+    warmup_done.clear()
+    for spec in specs:
+        engine, voice = parse_voice_spec(spec)
+        warmup_status[f"{engine}:{voice or 'default'}"] = 'pending'
+    threading.Thread(target=warm_up_voices, args=(specs,), daemon=True).start()
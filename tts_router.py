@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+TTS Router for Read Aloud workers
+Routes /synthesize to stateless TTS workers (tts_server.py) by consistent
+hashing of the text, so repeated text always lands on the same node and
+is synthesized once across the cluster
+"""
+
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+import bisect
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from fast_start import split_first_sentence
+from synthesis_cache import text_hash
+
+app = Flask(__name__)
+CORS(app)
+
+# Seconds a worker is skipped after a failed request
+WORKER_RETRY_DELAY = 10
+WORKER_TIMEOUT = 120
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self.ring = []  # Sorted (hash, node)
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            bisect.insort(self.ring, (text_hash(f'{node}#{i}'), node))
+
+    def nodes_for(self, key_hash):
+        """Distinct nodes in ring order starting at key_hash (first is the owner)"""
+        if not self.ring:
+            return []
+        start = bisect.bisect(self.ring, (key_hash, ''))
+        seen = []
+        for i in range(len(self.ring)):
+            node = self.ring[(start + i) % len(self.ring)][1]
+            if node not in seen:
+                seen.append(node)
+        return seen
+
+ring = HashRing([])
+workers = []
+down_until = {}  # worker -> time it may be retried
+down_lock = threading.Lock()
+
+# request_id -> worker running it, so /synthesize/cancel reaches that worker
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+def forward(worker, path, method='GET', body=None, headers=None):
+    """Send a request to a worker and return (status, headers, body)"""
+    req = urllib.request.Request(worker + path, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=WORKER_TIMEOUT) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def is_up(worker):
+    with down_lock:
+        return down_until.get(worker, 0) <= time.time()
+
+def mark_down(worker):
+    with down_lock:
+        down_until[worker] = time.time() + WORKER_RETRY_DELAY
+    print(f"Worker {worker} unreachable, skipping for {WORKER_RETRY_DELAY}s")
+
+@app.route('/synthesize', methods=['POST'])
+def synthesize():
+    """Route a synthesis request to the worker that owns its text"""
+    body = request.get_data()
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        return jsonify({'error': 'Invalid JSON'}), 400
+    text = data.get('text', '')
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    request_id = data.get('request_id') or request.headers.get('X-Request-Id')
+    forward_headers = {'Content-Type': 'application/json'}
+    if request_id:
+        forward_headers['X-Request-Id'] = request_id
+
+    # A fast-start request is routed by the rest of its text: the worker
+    # renders that in the background, and the client's follow-up request,
+    # which asks for just the rest, hashes to the same worker and joins it
+    split = split_first_sentence(text) if data.get('fast_start') else None
+    candidates = ring.nodes_for(text_hash(split[1] if split else text))
+    # Fall back to the next nodes on the ring when the owner is down
+    for worker in [w for w in candidates if is_up(w)] or candidates:
+        if request_id:
+            with in_flight_lock:
+                in_flight[request_id] = worker
+        try:
+            status, headers, content = forward(worker, '/synthesize', 'POST', body, forward_headers)
+        except OSError:
+            mark_down(worker)
+            continue
+        finally:
+            if request_id:
+                with in_flight_lock:
+                    in_flight.pop(request_id, None)
+        response = Response(content, status=status,
+                            mimetype=headers.get('Content-Type', 'application/octet-stream'))
+        # Pass on what the worker reports (X-Cache, X-Language, X-Fast-Start, ...)
+        for name, value in headers.items():
+            if name.startswith('X-') or name == 'Access-Control-Expose-Headers':
+                response.headers[name] = value
+        response.headers['X-Worker'] = worker
+        return response
+
+    return jsonify({'error': 'No TTS workers available'}), 503
+
+@app.route('/synthesize/cancel', methods=['POST'])
+def cancel_synthesis():
+    """
+    Cancel an in-flight /synthesize request on the worker running it
+    (on every worker if the router doesn't know the request)
+    Body: {"request_id": "id sent with the request"}
+    """
+    data = request.get_json(silent=True) or {}
+    request_id = data.get('request_id')
+    if not request_id:
+        return jsonify({'error': 'No request_id provided'}), 400
+    with in_flight_lock:
+        worker = in_flight.get(request_id)
+    body = json.dumps({'request_id': request_id}).encode()
+    cancelled = False
+    for target in [worker] if worker else [w for w in workers if is_up(w)]:
+        try:
+            status, _, content = forward(target, '/synthesize/cancel', 'POST', body,
+                                         {'Content-Type': 'application/json'})
+            cancelled = cancelled or (status == 200 and json.loads(content).get('cancelled', False))
+        except OSError:
+            mark_down(target)
+        except ValueError:
+            pass
+    return jsonify({'success': True, 'cancelled': cancelled})
+
+@app.route('/voices', methods=['GET'])
+def list_voices():
+    """Voices are the same on every worker; ask the first one that answers"""
+    for worker in workers:
+        if not is_up(worker):
+            continue
+        try:
+            status, headers, content = forward(worker, '/voices?' + request.query_string.decode())
+            return Response(content, status=status, mimetype='application/json')
+        except OSError:
+            mark_down(worker)
+    return jsonify({'error': 'No TTS workers available'}), 503
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint, with per-worker reachability"""
+    status = {}
+    for worker in workers:
+        try:
+            code, _, _ = forward(worker, '/health')
+            status[worker] = code == 200
+        except OSError:
+            status[worker] = False
+    return jsonify({
+        'status': 'ok' if any(status.values()) else 'degraded',
+        'workers': status
+    })
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Read Aloud TTS Router')
+    parser.add_argument('workers', nargs='+', help='worker base URLs, e.g. http://10.0.0.2:5000')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    workers = [w.rstrip('/') for w in args.workers]
+    ring = HashRing(workers)
+
+    print("Read Aloud TTS Router")
+    print("=" * 50)
+    for worker in workers:
+        print(f"Worker: {worker}")
+    print(f"\nRouter starting on http://localhost:{args.port}")
+    print("=" * 50)
+
+    app.run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Worker Processes for Read Aloud TTS
+Forks several TTS workers from one loader process after the voices are
+warmed up, so what was loaded before the fork (imports, language model,
+voice index) is shared copy-on-write instead of paid again by every
+worker. Mapped model files only stay in the page cache; Piper loads the
+model into each of its own processes. Each worker's real memory cost (PSS, from
+/proc/<pid>/smaps_rollup) is reported by /health.
+"""
+
+import gc
+import os
+import signal
+import sys
+
+def fork_workers(count, port):
+    """
+    Fork `count` workers on ports port .. port+count-1 and return the port
+    in each of them. The loader stays here, restarting workers that die,
+    and exits once they have all been stopped.
+    """
+    # Never collect what is loaded now: the collector would write to (and
+    # so un-share) those pages in every worker
+    gc.freeze()
+    children = {}  # pid -> port
+    stopping = []
+
+    def spawn(worker_port):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            return True
+        children[pid] = worker_port
+        return False
+
+    for worker_port in range(port, port + count):
+        if spawn(worker_port):
+            return worker_port
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Loader {os.getpid()} forked {count} workers on ports {port}-{port + count - 1}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_port = children.pop(pid, None)
+        if worker_port is None or stopping:
+            continue
+        print(f"Worker on port {worker_port} exited (status {status}), restarting")
+        if spawn(worker_port):
+            return worker_port
+    sys.exit(0)
+
+# ============================================================================
+# MEMORY ACCOUNTING
+# ============================================================================
+
+def smaps_rollup(pid='self'):
+    """Memory of a process in kB: rss, pss, shared, private and swap (Linux only)"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == 'kB':
+                    fields[name] = int(parts[0])
+    except OSError:
+        return None
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        # Proportional: shared pages are split between the processes using them
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'swap_kb': fields.get('Swap', 0),
+    }
+
+def child_pids():
+    """Running child processes of this process (engine runs)"""
+    pids = []
+    try:
+        for thread_id in os.listdir('/proc/self/task'):
+            try:
+                with open(f'/proc/self/task/{thread_id}/children') as f:
+                    pids.extend(f.read().split())
+            except OSError:
+                pass
+    except OSError:
+        pass
+    return pids
+
+def memory_report():
+    """This worker's memory and that of its running engine processes"""
+    report = {'pid': os.getpid(), 'worker': smaps_rollup()}
+    if report['worker'] is not None:
+        engines = [usage for usage in map(smaps_rollup, child_pids()) if usage]
+        report['engine_processes'] = len(engines)
+        report['engines_pss_kb'] = sum(usage['pss_kb'] for usage in engines)
+    return report